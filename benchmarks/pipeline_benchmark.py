@@ -0,0 +1,208 @@
+"""
+Benchmarks the routing hot path on synthetic responses.
+
+    python -m benchmarks.pipeline_benchmark --responses 2000 --tokens 256 --top-k 5
+    python -m benchmarks.pipeline_benchmark --save-baseline main
+    python -m benchmarks.pipeline_benchmark --compare main
+
+Each stage reports throughput, p50/p95/p99 latency per call and peak RSS. Baselines
+are JSON files in benchmarks/baselines/; --compare exits non-zero on a regression.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from src.completion import Completion
+from src.feature_extraction.entropy_extractor import EntropyExtractor
+from src.feature_extraction.tool_intent_extractor import ToolIntentExtractor
+from src.feature_extraction.registry import FEATURES, FeaturePlan
+from src.neural_generator import NeuralGenerator
+from src.scheduler import build_scheduler
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines")
+
+def synthetic_response(rng: random.Random, n_tokens: int, top_k: int, spread: float, tool_call: bool = False) -> dict:
+    """
+    A chat completion shaped like the API's, with top_k alternatives per token.
+    Logits are N(0, spread): a small spread gives flat (high entropy) distributions,
+    a large one peaked (low entropy) ones.
+    """
+    content = []
+    for position in range(n_tokens):
+        logits = sorted((rng.gauss(0, spread) for _ in range(max(top_k, 1))), reverse=True)
+        log_norm = logits[0] + math.log(sum(math.exp(logit - logits[0]) for logit in logits))
+        alternatives = [{"token": f" t{position}_{j}", "logprob": logit - log_norm, "bytes": None} for j, logit in enumerate(logits)]
+        content.append({**alternatives[0], "top_logprobs": alternatives[:top_k]})
+    message = {"role": "assistant", "content": "".join(token_data["token"] for token_data in content)}
+    if tool_call:
+        message["tool_calls"] = [{"id": "call_0", "type": "function", "function": {"name": "search", "arguments": "{}"}}]
+    return {
+        "model": "synthetic",
+        "choices": [{"index": 0, "message": message, "logprobs": {"content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 16, "completion_tokens": n_tokens, "total_tokens": 16 + n_tokens}
+    }
+
+def build_workload(n_responses: int, tokens: int, token_jitter: float, top_k: int, spread_min: float, spread_max: float, tool_call_rate: float, seed: int) -> List[dict]:
+    rng = random.Random(seed)
+    workload = []
+    for i in range(n_responses):
+        n_tokens = max(1, int(rng.uniform(1 - token_jitter, 1 + token_jitter) * tokens))
+        raw_response = synthetic_response(rng, n_tokens, top_k, rng.uniform(spread_min, spread_max), tool_call=rng.random() < tool_call_rate)
+        workload.append({"messages": [{"role": "user", "content": f"Synthetic question {i}?"}], "raw": raw_response})
+    return workload
+
+class InProcessClient:
+    """Stands in for LangDBClient and returns pre-built Completions, so only in-process work is timed."""
+    def __init__(self, workload: List[dict]):
+        self.responses = {item["messages"][0]["content"]: Completion.from_dict(item["raw"]) for item in workload}
+        self.cache = None
+
+    def create_chat_completion(self, model: str, messages: list, **kwargs):
+        return self.responses[messages[0]["content"]]
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1 << 20) if sys.platform == "darwin" else peak / 1024
+
+def measure(name: str, calls: List[Callable[[], Any]], items: List[int] = None) -> Dict[str, Any]:
+    """Runs each call once, timing every call; throughput counts items[i] items for call i (one each by default)."""
+    n_items = len(calls) if items is None else sum(items)
+    timings = np.empty(len(calls))
+    start = time.perf_counter()
+    for i, call in enumerate(calls):
+        call_start = time.perf_counter()
+        call()
+        timings[i] = time.perf_counter() - call_start
+    total = time.perf_counter() - start
+    return {
+        "stage": name,
+        "calls": len(calls),
+        "items": n_items,
+        "throughput_per_s": n_items / total if total else float("inf"),
+        "p50_ms": float(np.percentile(timings, 50) * 1000),
+        "p95_ms": float(np.percentile(timings, 95) * 1000),
+        "p99_ms": float(np.percentile(timings, 99) * 1000),
+        "peak_rss_mb": _peak_rss_mb()
+    }
+
+def run_suite(workload: List[dict], threshold: float = 1.0, batch_size: int = 64, nli_validator=None) -> List[Dict[str, Any]]:
+    entropy_extractor = EntropyExtractor()
+    tool_intent_extractor = ToolIntentExtractor()
+    scheduler = build_scheduler({"HighEntropyStrategy": {"threshold": threshold}})
+    generator = NeuralGenerator(langdb_client=InProcessClient(workload))
+    raw_responses = [item["raw"] for item in workload]
+    batches = [raw_responses[start:start + batch_size] for start in range(0, len(raw_responses), batch_size)]
+
+    results = []
+    # Lightest stages first, so peak RSS growth can be attributed to the stage that caused it.
+    results.append(measure("tool_intent", [lambda raw_response=raw_response: tool_intent_extractor.extract_tool_flag(raw_response) for raw_response in raw_responses]))
+    results.append(measure("entropy", [lambda raw_response=raw_response: entropy_extractor.compute_entropy(raw_response) for raw_response in raw_responses]))
+    results.append(measure(f"entropy_batch[{batch_size}]", [lambda batch=batch: entropy_extractor.compute_entropy_batch(batch) for batch in batches], items=[len(batch) for batch in batches]))
+
+    completions = []
+    results.append(measure("completion.from_dict", [lambda raw_response=raw_response: completions.append(Completion.from_dict(raw_response)) for raw_response in raw_responses]))
+    completion_batches = [completions[start:start + batch_size] for start in range(0, len(completions), batch_size)]
+    results.append(measure("entropy[completion]", [lambda completion=completion: entropy_extractor.compute_entropy(completion) for completion in completions]))
+    results.append(measure(f"entropy_batch[{batch_size},completion]", [lambda batch=batch: entropy_extractor.compute_entropy_batch(batch) for batch in completion_batches], items=[len(batch) for batch in completion_batches]))
+    all_features = FeaturePlan(FEATURES)
+    results.append(measure("feature_plan[all,completion]", [lambda completion=completion: all_features.extract(completion) for completion in completions]))
+
+    outputs = []
+    generate = lambda item: outputs.append(generator.generate(model="synthetic", messages=item["messages"], temperature=0.8, max_tokens=256))
+    results.append(measure("neural_generator", [lambda item=item: generate(item) for item in workload]))
+    results.append(measure("scheduler.route", [lambda output=output: scheduler.route(output) for output in outputs]))
+    features = {"entropy": np.array([np.nan if output["entropy"] is None else output["entropy"] for output in outputs])}
+    results.append(measure("scheduler.route_batch", [lambda: scheduler.route_batch(features)], items=[len(outputs)]))
+
+    routed = [output for output in outputs if scheduler.route(output)["routing_decision"] == "fallback_validation"]
+    if nli_validator is not None and routed:
+        nli_batches = [routed[start:start + batch_size] for start in range(0, len(routed), batch_size)]
+        results.append(measure(f"nli.validate_batch[{batch_size}]", [lambda batch=batch: nli_validator.validate_batch(batch) for batch in nli_batches], items=[len(batch) for batch in nli_batches]))
+
+    def end_to_end(item):
+        output = generator.generate(model="synthetic", messages=item["messages"], temperature=0.8, max_tokens=256)
+        decision = scheduler.route(output)
+        if nli_validator is not None and decision["routing_decision"] == "fallback_validation":
+            nli_validator.validate(output)
+    results.append(measure("end_to_end" + ("+nli" if nli_validator is not None else ""), [lambda item=item: end_to_end(item) for item in workload]))
+    for result in results:
+        result["fallback_share"] = len(routed) / len(outputs) if outputs else 0.0
+    return results
+
+def print_results(results: List[Dict[str, Any]], baseline: Dict[str, Dict[str, Any]] = None):
+    header = f"{'stage':<28} {'items/s':>12} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'peak RSS MB':>12}"
+    print(header + ("  vs baseline" if baseline else ""))
+    for result in results:
+        line = f"{result['stage']:<28} {result['throughput_per_s']:>12.1f} {result['p50_ms']:>9.3f} {result['p95_ms']:>9.3f} {result['p99_ms']:>9.3f} {result['peak_rss_mb']:>12.1f}"
+        previous = (baseline or {}).get(result["stage"])
+        if previous:
+            line += f"  throughput x{result['throughput_per_s'] / previous['throughput_per_s']:.2f}, p95 x{result['p95_ms'] / max(previous['p95_ms'], 1e-9):.2f}"
+        print(line)
+
+def regressions(results: List[Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    found = []
+    for result in results:
+        previous = baseline.get(result["stage"])
+        if previous and result["throughput_per_s"] < previous["throughput_per_s"] * (1 - tolerance):
+            found.append(f"{result['stage']}: throughput {result['throughput_per_s']:.1f}/s vs baseline {previous['throughput_per_s']:.1f}/s")
+    return found
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Benchmark the routing pipeline on synthetic responses.")
+    parser.add_argument("--responses", type=int, default=1000)
+    parser.add_argument("--tokens", type=int, default=256, help="Mean generated tokens per response.")
+    parser.add_argument("--token-jitter", type=float, default=0.5, help="Token counts vary uniformly within +/- this fraction of --tokens.")
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--spread", nargs=2, type=float, default=[0.5, 3.0], metavar=("MIN", "MAX"),
+                        help="Per-response logit spread range; lower means higher entropy.")
+    parser.add_argument("--tool-call-rate", type=float, default=0.05)
+    parser.add_argument("--threshold", type=float, default=0.3, help="HighEntropyStrategy threshold.")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--nli", action="store_true", help="Include NLIContradictionValidator (loads the model).")
+    parser.add_argument("--nli-backend", default="transformers")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save-baseline", metavar="NAME")
+    parser.add_argument("--compare", metavar="NAME")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed throughput drop vs baseline before --compare fails.")
+    args = parser.parse_args(argv)
+
+    workload = build_workload(args.responses, args.tokens, args.token_jitter, args.top_k, args.spread[0], args.spread[1], args.tool_call_rate, args.seed)
+    nli_validator = None
+    if args.nli:
+        from src.validators.nli_contradiction_validator import NLIContradictionValidator
+        nli_validator = NLIContradictionValidator(backend=args.nli_backend, batch_size=args.batch_size)
+
+    results = run_suite(workload, threshold=args.threshold, batch_size=args.batch_size, nli_validator=nli_validator)
+
+    baseline = None
+    if args.compare:
+        with open(os.path.join(BASELINE_DIR, f"{args.compare}.json")) as f:
+            baseline = {result["stage"]: result for result in json.load(f)["results"]}
+    print_results(results, baseline)
+
+    if args.save_baseline:
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, "w") as f:
+            json.dump({"config": vars(args), "python": platform.python_version(), "machine": platform.machine(), "results": results}, f, indent=2)
+        print(f"Baseline saved to {path}")
+
+    if baseline:
+        found = regressions(results, baseline, args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        if found:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+import hashlib
+import os
+from typing import Dict, Iterator, List, Tuple
+
+import pyarrow as pa
+
+DEFAULT_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", ".cache/datasets")
+
+# name -> source file and the column holding the prompt text
+DATASETS: Dict[str, Dict[str, str]] = {
+    "TruthfulQA": {"source": "eval/TruthfulQA.csv", "prompt_column": "Question"}
+}
+
+def register_dataset(name: str, source: str, prompt_column: str = "Question", id_column: str = None):
+    DATASETS[name] = {"source": source, "prompt_column": prompt_column, "id_column": id_column}
+
+def prompt_id(prompt: str) -> str:
+    """Content hash of the prompt text, so IDs survive reordering or appending rows to the source."""
+    return hashlib.sha1(prompt.encode()).hexdigest()[:16]
+
+def _read_source(source_path: str) -> pa.Table:
+    if source_path.endswith(".csv"):
+        import pyarrow.csv as pa_csv
+        return pa_csv.read_csv(source_path, parse_options=pa_csv.ParseOptions(newlines_in_values=True))
+    if source_path.endswith((".jsonl", ".json")):
+        import pyarrow.json as pa_json
+        return pa_json.read_json(source_path)
+    raise ValueError(f"Unsupported dataset source format: {source_path}")
+
+def _cache_path(source_path: str, cache_dir: str) -> str:
+    # Keyed on path, size and mtime, so an edited source is converted again.
+    stat = os.stat(source_path)
+    fingerprint = hashlib.sha1(f"{os.path.abspath(source_path)}:{stat.st_size}:{stat.st_mtime_ns}".encode()).hexdigest()[:12]
+    return os.path.join(cache_dir, f"{os.path.splitext(os.path.basename(source_path))[0]}-{fingerprint}.arrow")
+
+def convert_source(source_path: str, prompt_column: str = "Question", id_column: str = None, cache_dir: str = DEFAULT_CACHE_DIR) -> str:
+    """Converts a CSV/JSONL source into an uncompressed Arrow IPC file once and returns its path."""
+    arrow_path = _cache_path(source_path, cache_dir)
+    if os.path.exists(arrow_path):
+        return arrow_path
+    table = _read_source(source_path)
+    if prompt_column not in table.column_names:
+        raise ValueError(f"{source_path} must contain a '{prompt_column}' column for prompts.")
+    if "prompt_id" not in table.column_names:
+        ids = table.column(id_column).cast(pa.string()) if id_column else pa.array([prompt_id(prompt or "") for prompt in table.column(prompt_column).to_pylist()])
+        table = table.append_column("prompt_id", ids)
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_path = f"{arrow_path}.{os.getpid()}.tmp"
+    with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(tmp_path, arrow_path) # concurrent converters race harmlessly; readers never see a partial file
+    return arrow_path
+
+class Dataset:
+    """
+    A dataset backed by a memory-mapped Arrow file. Column buffers are shared
+    page cache, so any number of worker processes can open the same dataset
+    and read disjoint shards without each holding a parsed copy.
+    """
+    def __init__(self, name: str, arrow_path: str, prompt_column: str = "Question"):
+        self.name = name
+        self.arrow_path = arrow_path
+        self.prompt_column = prompt_column
+        self.table = pa.ipc.open_file(pa.memory_map(arrow_path, "r")).read_all()
+
+    def __len__(self) -> int:
+        return self.table.num_rows
+
+    def shard_bounds(self, shard_index: int, num_shards: int) -> Tuple[int, int]:
+        """Contiguous row range of one shard; shards are disjoint and cover every row."""
+        if not 0 <= shard_index < num_shards:
+            raise ValueError(f"shard_index must be in [0, {num_shards}), got {shard_index}")
+        return len(self) * shard_index // num_shards, len(self) * (shard_index + 1) // num_shards
+
+    def iter_prompts(self, start: int = 0, stop: int = None, batch_size: int = 1024) -> Iterator[Tuple[int, str, str]]:
+        """Yields (row, prompt_id, prompt) for rows in [start, stop), decoding one batch of rows at a time."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        for batch_start in range(start, stop, batch_size):
+            batch = self.table.slice(batch_start, min(batch_size, stop - batch_start))
+            prompts = batch.column(self.prompt_column).to_pylist()
+            ids = batch.column("prompt_id").to_pylist()
+            for offset, (pid, prompt) in enumerate(zip(ids, prompts)):
+                yield batch_start + offset, pid, prompt
+
+    def iter_shard(self, shard_index: int, num_shards: int, batch_size: int = 1024) -> Iterator[Tuple[int, str, str]]:
+        start, stop = self.shard_bounds(shard_index, num_shards)
+        return self.iter_prompts(start, stop, batch_size)
+
+    def prompts(self, limit: int = None) -> List[str]:
+        return [prompt for _, _, prompt in self.iter_prompts(stop=limit)]
+
+_open_datasets: Dict[str, Dataset] = {}
+
+def open_source(source_path: str, prompt_column: str = "Question", id_column: str = None, name: str = None, cache_dir: str = DEFAULT_CACHE_DIR) -> Dataset:
+    arrow_path = convert_source(source_path, prompt_column, id_column, cache_dir)
+    dataset = _open_datasets.get(arrow_path)
+    if dataset is None:
+        dataset = _open_datasets[arrow_path] = Dataset(name or os.path.basename(source_path), arrow_path, prompt_column)
+    return dataset
+
+def open_dataset(name: str, cache_dir: str = DEFAULT_CACHE_DIR) -> Dataset:
+    spec = DATASETS.get(name)
+    if spec is None:
+        raise ValueError(f"Unknown dataset: {name}")
+    return open_source(spec["source"], spec["prompt_column"], spec.get("id_column"), name=name, cache_dir=cache_dir)
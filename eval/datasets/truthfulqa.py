@@ -1,11 +1,9 @@
-import pandas as pd
+from eval.datasets.registry import open_source
 
 def load_truthfulqa(filepath: str) -> list[str]:
     try:
-        df = pd.read_csv(filepath)
-        if 'Question' not in df.columns:
-            raise ValueError("CSV file must contain a 'Question' column for prompts.")
-        return df['Question'].tolist()
+        # Parsed once into a memory-mapped Arrow cache shared by every later load.
+        return open_source(filepath, prompt_column='Question', name='TruthfulQA').prompts()
     except FileNotFoundError:
         print(f"Error: The file {filepath} was not found.")
         return []
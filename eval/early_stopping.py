@@ -0,0 +1,100 @@
+import math
+import threading
+from statistics import NormalDist
+from typing import Any, Dict, Optional, Tuple
+
+STOPPING_METRICS = ("accuracy", "fallback_rate", "contradiction_rate")
+
+def wilson_interval(successes: int, n: int, confidence: float = 0.95) -> Tuple[float, float]:
+    """Wilson score interval of a proportion; (0, 1) without observations."""
+    if n == 0:
+        return 0.0, 1.0
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    p = successes / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    half_width = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+class EarlyStopping:
+    """
+    Decides when a run has seen enough prompts. Accuracy, fallback rate and
+    contradiction rate are counted as results arrive, and the run stops once
+
+      - ci_width: after min_samples results, the Wilson interval of every metric
+        in metrics is at most ci_width wide, or
+      - baseline_accuracy: Wald's sequential probability ratio test of
+        "accuracy = baseline_accuracy - margin" (worse than the baseline cell, so
+        the cell can be pruned) against "accuracy = baseline_accuracy" (not worse)
+        accepts either hypothesis, with error rates alpha and beta.
+
+    Either rule may be used alone. Prompts must arrive in random order (see
+    run_full_pipeline), or the prompts seen before stopping are not a fair sample.
+    """
+    def __init__(self, ci_width: float = None, confidence: float = 0.95, min_samples: int = 30, metrics: Tuple[str, ...] = STOPPING_METRICS,
+                 baseline_accuracy: float = None, margin: float = 0.05, alpha: float = 0.05, beta: float = 0.2):
+        unknown = set(metrics) - set(STOPPING_METRICS)
+        if unknown:
+            raise ValueError(f"Unknown early stopping metrics {sorted(unknown)}. Expected some of {STOPPING_METRICS}.")
+        self.ci_width = ci_width
+        self.confidence = confidence
+        self.min_samples = min_samples
+        self.metrics = tuple(metrics)
+        self.baseline_accuracy = baseline_accuracy
+        self.margin = margin
+        self.counts = {"n": 0, "accuracy": 0, "fallback_rate": 0, "contradiction_rate": 0}
+        self.llr = 0.0
+        self.stop_reason = None
+        self._lock = threading.Lock()
+
+        if baseline_accuracy is not None:
+            # Both hypotheses are kept inside (0, 1), so a perfect or useless baseline still gives finite log ratios.
+            p0 = min(max(baseline_accuracy, 1e-3), 1 - 1e-3)
+            p1 = min(max(baseline_accuracy - margin, 1e-3), 1 - 1e-3)
+            self._llr_correct, self._llr_wrong = math.log(p1 / p0), math.log((1 - p1) / (1 - p0))
+            self._accept_worse, self._accept_not_worse = math.log((1 - beta) / alpha), math.log(beta / (1 - alpha))
+
+    @property
+    def enabled(self) -> bool:
+        return self.ci_width is not None or self.baseline_accuracy is not None
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_reason is not None
+
+    def update(self, row: Dict[str, Any], correct: bool):
+        """row is a results row (see src/evaluation.py); correct is its TruthfulQA score."""
+        with self._lock:
+            self.counts["n"] += 1
+            self.counts["accuracy"] += bool(correct)
+            self.counts["fallback_rate"] += row.get("routing_decision") == "fallback_validation"
+            self.counts["contradiction_rate"] += bool(row.get("contradiction_flag"))
+            if self.baseline_accuracy is not None:
+                self.llr += self._llr_correct if correct else self._llr_wrong
+            if self.stop_reason is None:
+                self.stop_reason = self._decide()
+
+    def _decide(self) -> Optional[str]:
+        if self.baseline_accuracy is not None:
+            if self.llr >= self._accept_worse:
+                return "worse_than_baseline"
+            if self.llr <= self._accept_not_worse:
+                return "not_worse_than_baseline"
+        if self.ci_width is not None and self.counts["n"] >= self.min_samples:
+            if all(high - low <= self.ci_width for low, high in (self.interval(metric) for metric in self.metrics)):
+                return "ci_width"
+        return None
+
+    def interval(self, metric: str) -> Tuple[float, float]:
+        return wilson_interval(self.counts[metric], self.counts["n"], self.confidence)
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            n = self.counts["n"]
+            result = {"stop_reason": self.stop_reason, "n": n}
+            for metric in STOPPING_METRICS:
+                low, high = self.interval(metric)
+                result[metric] = self.counts[metric] / n if n else float("nan")
+                result[f"{metric}_ci_low"], result[f"{metric}_ci_high"] = low, high
+            if self.baseline_accuracy is not None:
+                result["baseline_accuracy"], result["sprt_llr"] = self.baseline_accuracy, self.llr
+        return result
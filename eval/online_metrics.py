@@ -0,0 +1,281 @@
+import json
+import math
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+class RunningStats:
+    """Count, mean and variance (Welford), min and max of a stream; merge() combines two streams exactly (Chan et al.)."""
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other: "RunningStats"):
+        if not other.count:
+            return
+        count = self.count + other.count
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta * delta * self.count * other.count / count
+        self.count = count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self) -> float:
+        return self.m2 / (self.count - 1) if self.count > 1 else float("nan")
+
+    def to_dict(self) -> dict:
+        return {"count": self.count, "mean": self.mean, "m2": self.m2,
+                "min": self.min if self.count else None, "max": self.max if self.count else None}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RunningStats":
+        stats = cls()
+        if state["count"]:
+            stats.count, stats.mean, stats.m2, stats.min, stats.max = state["count"], state["mean"], state["m2"], state["min"], state["max"]
+        return stats
+
+class TDigest:
+    """
+    Merging t-digest (Dunning) for quantiles of a stream. Values are buffered and
+    folded into at most ~compression centroids with the arcsine scale function,
+    which keeps the tails (p95, p99) at near single-value resolution. Memory is
+    bounded by compression and buffer_size; digests of different processes merge.
+    """
+    def __init__(self, compression: float = 100, buffer_size: int = 500):
+        self.compression = compression
+        self.buffer_size = buffer_size
+        self.centroids: List[List[float]] = [] # [mean, weight], sorted by mean
+        self.count = 0
+        self.min = math.inf
+        self.max = -math.inf
+        self._buffer: List[List[float]] = []
+
+    def add(self, value: float, weight: float = 1):
+        self._buffer.append([value, weight])
+        self.count += weight
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+        if len(self._buffer) >= self.buffer_size:
+            self._compress()
+
+    def merge(self, other: "TDigest"):
+        if not other.count:
+            return
+        self._buffer.extend([mean, weight] for mean, weight in other.centroids + other._buffer)
+        self.count += other.count
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+
+    def _q_limit(self, q: float) -> float:
+        # The largest quantile a centroid starting at q may reach: one unit of k(q) = compression / (2 pi) * asin(2q - 1).
+        k = self.compression / (2 * math.pi) * math.asin(2 * q - 1) + 1
+        return 1.0 if k >= self.compression / 4 else (math.sin(2 * math.pi * k / self.compression) + 1) / 2
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self.centroids + self._buffer, key=lambda point: point[0])
+        self._buffer = []
+        total = sum(weight for _, weight in points)
+        merged = [list(points[0])]
+        weight_before = 0.0
+        q_limit = self._q_limit(0.0)
+        for mean, weight in points[1:]:
+            current = merged[-1]
+            if (weight_before + current[1] + weight) / total <= q_limit:
+                current[1] += weight
+                current[0] += (mean - current[0]) * weight / current[1]
+            else:
+                weight_before += current[1]
+                q_limit = self._q_limit(weight_before / total)
+                merged.append([mean, weight])
+        self.centroids = merged
+
+    def quantile(self, q: float) -> float:
+        """Interpolates between centroid centers, and towards min/max beyond the outer ones."""
+        self._compress()
+        if not self.centroids:
+            return float("nan")
+        if len(self.centroids) == 1:
+            return self.centroids[0][0]
+        rank = q * self.count
+        first_mean, first_weight = self.centroids[0]
+        if rank < first_weight / 2:
+            return self.min + (first_mean - self.min) * rank / (first_weight / 2)
+        cumulative = 0.0
+        for (mean, weight), (next_mean, next_weight) in zip(self.centroids, self.centroids[1:]):
+            center, next_center = cumulative + weight / 2, cumulative + weight + next_weight / 2
+            if rank <= next_center:
+                return mean + (next_mean - mean) * (rank - center) / (next_center - center)
+            cumulative += weight
+        last_mean, last_weight = self.centroids[-1]
+        return last_mean + (self.max - last_mean) * min(1.0, (rank - (self.count - last_weight / 2)) / (last_weight / 2))
+
+    def to_dict(self) -> dict:
+        self._compress()
+        return {"compression": self.compression, "count": self.count, "min": self.min if self.count else None,
+                "max": self.max if self.count else None, "centroids": self.centroids}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "TDigest":
+        digest = cls(state["compression"])
+        if state["count"]:
+            digest.centroids = [list(centroid) for centroid in state["centroids"]]
+            digest.count, digest.min, digest.max = state["count"], state["min"], state["max"]
+        return digest
+
+def _number(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return None if math.isnan(value) else value
+
+class OnlineMetrics:
+    """
+    The metrics of eval.metrics.compute_all_metrics, accumulated one result row at
+    a time in constant memory: fallback and contradiction rates, Welford entropy
+    and latency statistics, and t-digest latency quantiles (p50/p95/p99).
+
+    snapshot() is JSON-serializable; from_snapshot() and merge() combine the
+    accumulators of several workers. maybe_flush() appends a snapshot to a JSONL
+    file at most once per interval, so long runs can be followed with tail -f.
+    """
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self, compression: float = 100):
+        self.rows = 0
+        self.fallbacks = 0
+        self.contradictions = 0
+        self.errors = 0
+        self.entropy = RunningStats()
+        self.latency = RunningStats()
+        self.latency_digest = TDigest(compression)
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+
+    def update(self, row: Dict[str, Any]):
+        """row is a results row (see src/evaluation.py): routing_decision, contradiction_flag, entropy, latency."""
+        entropy, latency = _number(row.get("entropy")), _number(row.get("latency"))
+        with self._lock:
+            self.rows += 1
+            self.fallbacks += row.get("routing_decision") == "fallback_validation"
+            self.contradictions += bool(row.get("contradiction_flag"))
+            self.errors += row.get("routing_decision") == "Error"
+            if entropy is not None:
+                self.entropy.add(entropy)
+            if latency is not None:
+                self.latency.add(latency)
+                self.latency_digest.add(latency)
+
+    def update_many(self, rows: Iterable[Dict[str, Any]]):
+        for row in rows:
+            self.update(row)
+
+    def merge(self, other: "OnlineMetrics"):
+        with self._lock:
+            self.rows += other.rows
+            self.fallbacks += other.fallbacks
+            self.contradictions += other.contradictions
+            self.errors += other.errors
+            self.entropy.merge(other.entropy)
+            self.latency.merge(other.latency)
+            self.latency_digest.merge(other.latency_digest)
+
+    def metrics(self) -> Dict[str, float]:
+        """compute_all_metrics' keys plus entropy_std and latency quantiles; NaN where nothing was observed."""
+        with self._lock:
+            rate = lambda count: count / self.rows if self.rows else float("nan")
+            result = {
+                "fallback_rate": rate(self.fallbacks),
+                "contradiction_rate": rate(self.contradictions),
+                "avg_entropy": self.entropy.mean if self.entropy.count else float("nan"),
+                "avg_latency": self.latency.mean if self.latency.count else float("nan"),
+                "entropy_std": math.sqrt(self.entropy.variance) if self.entropy.count > 1 else float("nan")
+            }
+            for q in self.QUANTILES:
+                result[f"latency_p{round(q * 100)}"] = self.latency_digest.quantile(q)
+        return result
+
+    def snapshot(self, **labels) -> Dict[str, Any]:
+        metrics = self.metrics()
+        with self._lock:
+            state = {
+                "rows": self.rows, "fallbacks": self.fallbacks, "contradictions": self.contradictions, "errors": self.errors,
+                "entropy": self.entropy.to_dict(), "latency": self.latency.to_dict(), "latency_digest": self.latency_digest.to_dict()
+            }
+        # NaN is not valid JSON, so empty metrics are written as null.
+        metrics = {name: None if math.isnan(value) else value for name, value in metrics.items()}
+        return {"timestamp": time.time(), **labels, "metrics": metrics, "state": state}
+
+    @classmethod
+    def from_snapshot(cls, snapshot: Dict[str, Any]) -> "OnlineMetrics":
+        state = snapshot["state"]
+        online_metrics = cls(state["latency_digest"]["compression"])
+        online_metrics.rows, online_metrics.fallbacks = state["rows"], state["fallbacks"]
+        online_metrics.contradictions, online_metrics.errors = state["contradictions"], state["errors"]
+        online_metrics.entropy = RunningStats.from_dict(state["entropy"])
+        online_metrics.latency = RunningStats.from_dict(state["latency"])
+        online_metrics.latency_digest = TDigest.from_dict(state["latency_digest"])
+        return online_metrics
+
+    def flush(self, path: str, **labels):
+        line = json.dumps(self.snapshot(**labels)) + "\n"
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # One O_APPEND write per snapshot, so lines of concurrent workers do not interleave.
+        fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+        self._last_flush = time.monotonic()
+
+    def maybe_flush(self, path: str, interval_seconds: float, **labels) -> bool:
+        """Flushes at most once per interval_seconds; cheap to call after every result."""
+        if not path or time.monotonic() - self._last_flush < interval_seconds:
+            return False
+        self.flush(path, **labels)
+        return True
+
+def latest_snapshots(path: str, label_keys: tuple = ("dataset", "model", "strategy", "seed")) -> Dict[tuple, Dict[str, Any]]:
+    """The last snapshot in a JSONL file for each combination of label_keys."""
+    latest = {}
+    if not os.path.exists(path):
+        return latest
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                snapshot = json.loads(line)
+                latest[tuple(snapshot.get(key) for key in label_keys)] = snapshot
+    return latest
+
+def merge_snapshots(snapshots: Iterable[Dict[str, Any]]) -> OnlineMetrics:
+    merged = None
+    for snapshot in snapshots:
+        online_metrics = OnlineMetrics.from_snapshot(snapshot)
+        if merged is None:
+            merged = online_metrics
+        else:
+            merged.merge(online_metrics)
+    return merged if merged is not None else OnlineMetrics()
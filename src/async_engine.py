@@ -0,0 +1,240 @@
+import asyncio
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+from .neural_generator import NeuralGenerator
+from .rate_limiter import ModelRateLimiters, estimate_request_tokens, is_rate_limit_error, rate_limit_backoff
+from .telemetry import telemetry
+
+class GenerationResult:
+    __slots__ = ("index", "output", "error", "latency", "queue_wait", "hedged_model", "rate_limit_retries")
+
+    def __init__(self, index: int, output: Optional[dict], error: Optional[BaseException], latency: float, queue_wait: float,
+                 hedged_model: str = None, rate_limit_retries: int = 0):
+        self.index = index
+        self.output = output
+        self.error = error
+        self.latency = latency # Time spent on the request itself, excluding rate-limit waits
+        self.queue_wait = queue_wait
+        self.hedged_model = hedged_model # model of the hedged duplicate, when that one answered first
+        self.rate_limit_retries = rate_limit_retries
+
+class LatencyTracker:
+    """Recent request latencies per model, for hedging decisions."""
+    def __init__(self, window: int = 256, min_samples: int = 20):
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+
+    def observe(self, model: str, seconds: float):
+        samples = self._samples.get(model)
+        if samples is None:
+            samples = self._samples[model] = deque(maxlen=self.window)
+        samples.append(seconds)
+
+    def quantile(self, model: str, q: float) -> Optional[float]:
+        samples = self._samples.get(model)
+        if samples is None or len(samples) < self.min_samples:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class AdaptiveConcurrency:
+    """
+    AIMD limit on in-flight requests: +1 per limit successes (about one step per
+    round trip), halved on a 429 or a response slower than latency_target. One
+    decrease per cooldown_seconds, so a burst of 429s from the same window
+    counts once.
+    """
+    def __init__(self, max_limit: int, min_limit: int = 1, latency_target: float = None, decrease_factor: float = 0.5, cooldown_seconds: float = 1.0):
+        self.max_limit = max_limit
+        self.min_limit = max(1, min(min_limit, max_limit))
+        self.limit = float(max_limit)
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.cooldown_seconds = cooldown_seconds
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency: float):
+        if self.latency_target is not None and latency > self.latency_target:
+            self._decrease()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+    def on_throttle(self):
+        self._decrease()
+
+    def _decrease(self):
+        now = time.monotonic()
+        if now - self._last_decrease < self.cooldown_seconds:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        telemetry.observe("concurrency_limit", self.limit)
+
+class AsyncGenerationEngine:
+    """
+    Keeps up to max_in_flight requests running against an async NeuralGenerator,
+    throttled per model by ModelRateLimiters. Requests already in the client's
+    response cache skip the rate limiter. generate_all returns results in input
+    order; generate_each hands each result to a callback as it finishes.
+
+    Tail latency and throttling:
+      - the in-flight limit adapts (AdaptiveConcurrency) between min_in_flight and max_in_flight;
+      - a 429 is retried after Retry-After or a backoff, up to max_rate_limit_retries
+        times, and only then reported as that request's error;
+      - a request still running past the hedge_quantile latency of its model gets a
+        duplicate (to hedge_backups[model] if set, else the same model) and the first
+        answer wins. hedge_quantile=None disables hedging.
+    """
+    def __init__(self, generator: NeuralGenerator, rate_limiters: ModelRateLimiters, max_in_flight: int = 8, min_in_flight: int = 1,
+                 latency_target: float = None, max_rate_limit_retries: int = 6, hedge_quantile: float = None, hedge_min_samples: int = 20,
+                 hedge_backups: Dict[str, str] = None):
+        self.generator = generator
+        self.rate_limiters = rate_limiters
+        self.max_in_flight = max_in_flight
+        self.min_in_flight = min_in_flight
+        self.latency_target = latency_target
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.hedge_quantile = hedge_quantile
+        self.hedge_backups = hedge_backups or {}
+        self.latency_tracker = LatencyTracker(min_samples=hedge_min_samples)
+        self.concurrency = None
+
+    def _reset_concurrency(self):
+        # Created per call so it binds to the running event loop; the adapted limit carries over between calls.
+        previous_limit = self.concurrency.limit if self.concurrency is not None else None
+        self.concurrency = AdaptiveConcurrency(self.max_in_flight, self.min_in_flight, self.latency_target)
+        if previous_limit is not None:
+            self.concurrency.limit = previous_limit
+
+    async def generate_all(self, requests: List[Dict[str, Any]]) -> List[GenerationResult]:
+        self._reset_concurrency()
+        tasks = [self._generate_one(i, request) for i, request in enumerate(requests)]
+        return await asyncio.gather(*tasks)
+
+    async def generate_each(self, requests: Iterable[Dict[str, Any]], on_result: Callable[[GenerationResult], Awaitable[None]], window: int = None):
+        """
+        Hands each result to on_result as soon as it finishes, in completion order.
+        At most window requests (default 2 * max_in_flight) are started and not yet
+        handed off, so an on_result that blocks on a full downstream queue stops new
+        requests from being sent. An exception from on_result cancels the rest.
+        """
+        self._reset_concurrency()
+        slots = asyncio.Semaphore(window or 2 * self.max_in_flight)
+        pending = set()
+
+        async def _one(index: int, request: Dict[str, Any]):
+            try:
+                await on_result(await self._generate_one(index, request))
+            finally:
+                slots.release()
+
+        try:
+            for index, request in enumerate(requests):
+                await slots.acquire()
+                for task in [task for task in pending if task.done()]:
+                    pending.discard(task)
+                    task.result() # re-raises a failed on_result
+                pending.add(asyncio.ensure_future(_one(index, request)))
+            await asyncio.gather(*pending)
+        except BaseException:
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+            raise
+
+    async def _generate_one(self, index: int, request: Dict[str, Any]) -> GenerationResult:
+        queued_at = time.time()
+        retries = 0
+        while True:
+            await self.concurrency.acquire()
+            start_time = time.time()
+            try:
+                output, hedged_model = await self._hedged_call(request)
+                error = None
+            except Exception as e:
+                output, hedged_model, error = None, None, e
+            finally:
+                await self.concurrency.release()
+            latency = time.time() - start_time
+
+            if error is None:
+                self.concurrency.on_success(latency)
+                return GenerationResult(index, output, None, latency, start_time - queued_at, hedged_model, retries)
+            if not is_rate_limit_error(error) or retries >= self.max_rate_limit_retries:
+                return GenerationResult(index, None, error, latency, start_time - queued_at, None, retries)
+            # Throttled: shrink concurrency, back off outside the in-flight slot, then try again.
+            self.concurrency.on_throttle()
+            telemetry.increment("rate_limit_retries")
+            await asyncio.sleep(rate_limit_backoff(error, retries))
+            retries += 1
+
+    async def _call(self, request: Dict[str, Any], cached: bool) -> dict:
+        limiter = self.rate_limiters.for_model(request["model"])
+        estimated_tokens = estimate_request_tokens(request["messages"], request["max_tokens"])
+        if not cached:
+            await limiter.acquire(estimated_tokens)
+        start_time = time.time()
+        try:
+            output = await self.generator.agenerate(**request)
+        except BaseException:
+            # Also on cancellation of the losing side of a hedge.
+            if not cached:
+                limiter.record_usage(estimated_tokens, 0)
+            raise
+        if not cached:
+            self.latency_tracker.observe(request["model"], time.time() - start_time)
+            usage = output["completion"].usage or {}
+            limiter.record_usage(estimated_tokens, usage.get("total_tokens"))
+        return output
+
+    def _hedge_delay(self, model: str) -> Optional[float]:
+        if not self.hedge_quantile:
+            return None
+        return self.latency_tracker.quantile(model, self.hedge_quantile)
+
+    async def _hedged_call(self, request: Dict[str, Any]) -> Tuple[dict, Optional[str]]:
+        cached = self.generator.is_cached(**request)
+        hedge_delay = None if cached else self._hedge_delay(request["model"])
+        if hedge_delay is None:
+            return await self._call(request, cached), None
+
+        primary = asyncio.ensure_future(self._call(request, cached))
+        done, _ = await asyncio.wait({primary}, timeout=hedge_delay)
+        if done:
+            return primary.result(), None
+
+        hedge_model = self.hedge_backups.get(request["model"], request["model"])
+        hedge = asyncio.ensure_future(self._call({**request, "model": hedge_model}, False))
+        telemetry.increment("hedged_requests")
+        pending = {primary, hedge}
+        first_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            telemetry.increment("hedge_wins")
+                        return task.result(), (hedge_model if task is hedge else None)
+                    first_error = first_error or task.exception()
+            raise first_error
+        finally:
+            # The loser is cancelled and awaited, so its connection is released before this returns.
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
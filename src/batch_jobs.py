@@ -0,0 +1,272 @@
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from .completion import Completion
+from .config import LANGDB_API_KEY, LANGDB_PROJECT_ID, LANGDB_BASE_URL
+from .http_transport import HTTPPool, http_pool
+from .langdb_client import _build_headers
+from .mock_langdb_server import mock_completion
+from .neural_generator import NeuralGenerator
+from .response_cache import ResponseCache, CacheMissError
+from .startup_profiler import lazy_import
+from .telemetry import telemetry
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_BACKENDS = ("langdb", "local")
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+def batch_request_line(custom_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """One line of an OpenAI-style batch input file."""
+    body = {key: value for key, value in body.items() if value is not None and key not in ("stream", "prompt_cache_key")}
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+def _write_json(path: str, payload: dict):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(payload, f)
+    os.replace(tmp_path, path) # pollers never see a half-written status
+
+class LangDBBatchBackend:
+    """The provider's Files and Batches endpoints (OpenAI-compatible), through the openai client."""
+    def __init__(self, api_key: str = LANGDB_API_KEY, project_id: str = LANGDB_PROJECT_ID, base_url: str = LANGDB_BASE_URL,
+                 pool: HTTPPool = http_pool, completion_window: str = "24h"):
+        self.api_key = api_key
+        self.project_id = project_id
+        self.base_url = base_url
+        self.pool = pool
+        self.completion_window = completion_window
+        self._client = None
+
+    @property
+    def endpoint(self) -> str:
+        # Real completions, so they share cache entries with live calls to the same API.
+        return self.base_url
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = lazy_import("openai").OpenAI(base_url=self.base_url, api_key=self.api_key, max_retries=2, http_client=self.pool.client())
+        return self._client
+
+    def submit(self, input_path: str) -> str:
+        headers = _build_headers(self.project_id)
+        with open(input_path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch", extra_headers=headers)
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window=self.completion_window,
+                                           extra_headers=headers)
+        return batch.id
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        batch = self.client.batches.retrieve(job_id, extra_headers=_build_headers(self.project_id))
+        counts = batch.request_counts
+        return {"status": batch.status, "completed": counts.completed if counts else 0, "failed": counts.failed if counts else 0,
+                "total": counts.total if counts else 0, "output_file_id": batch.output_file_id, "error_file_id": batch.error_file_id}
+
+    def iter_results(self, job_id: str, status: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        """Output and error lines, streamed from the result files without loading them whole."""
+        for file_id in (status.get("output_file_id"), status.get("error_file_id")):
+            if not file_id:
+                continue
+            with self.client.with_streaming_response.files.content(file_id, extra_headers=_build_headers(self.project_id)) as response:
+                for line in response.iter_lines():
+                    if line.strip():
+                        yield json.loads(line)
+
+    def cancel(self, job_id: str):
+        self.client.batches.cancel(job_id, extra_headers=_build_headers(self.project_id))
+
+class LocalBatchBackend:
+    """
+    File-based stand-in for the batch endpoint, for offline runs and tests. Each job
+    is a directory under root with input.jsonl, status.json, output.jsonl and
+    errors.jsonl. A worker thread answers the input lines one by one with
+    respond(body) (synthetic completions from the mock server by default), waiting
+    seconds_per_request each; every fail_every-th request fails with a 500.
+    Results are cached under their own endpoint, so they never answer live requests.
+    """
+    endpoint = "local-batch"
+
+    def __init__(self, root: str, respond: Callable[[Dict[str, Any]], Dict[str, Any]] = None, seconds_per_request: float = 0.0, fail_every: int = 0):
+        self.root = root
+        self.respond = respond or mock_completion
+        self.seconds_per_request = seconds_per_request
+        self.fail_every = fail_every
+        self._cancelled = set()
+
+    def _job_dir(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def submit(self, input_path: str) -> str:
+        job_id = f"batch_{uuid.uuid4().hex[:16]}"
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        shutil.copyfile(input_path, os.path.join(job_dir, "input.jsonl"))
+        _write_json(os.path.join(job_dir, "status.json"), {"status": "validating", "completed": 0, "failed": 0, "total": 0})
+        threading.Thread(target=self._process, args=(job_id,), name=f"local-batch-{job_id}", daemon=True).start()
+        return job_id
+
+    def _process(self, job_id: str):
+        job_dir = self._job_dir(job_id)
+        with open(os.path.join(job_dir, "input.jsonl")) as f:
+            total = sum(1 for line in f if line.strip())
+        counts = {"completed": 0, "failed": 0, "total": total}
+        status_path = os.path.join(job_dir, "status.json")
+        _write_json(status_path, {"status": "in_progress", **counts})
+        with open(os.path.join(job_dir, "input.jsonl")) as requests, open(os.path.join(job_dir, "output.jsonl"), "w") as output, \
+                open(os.path.join(job_dir, "errors.jsonl"), "w") as errors:
+            for n, line in enumerate(line for line in requests if line.strip()):
+                if job_id in self._cancelled:
+                    _write_json(status_path, {"status": "cancelled", **counts})
+                    return
+                request = json.loads(line)
+                time.sleep(self.seconds_per_request)
+                request_id = f"batch_req_{n}"
+                if self.fail_every and (n + 1) % self.fail_every == 0:
+                    error = {"code": "server_error", "message": "synthetic failure"}
+                    errors.write(json.dumps({"id": request_id, "custom_id": request["custom_id"], "response": {"status_code": 500, "body": {"error": error}}, "error": error}) + "\n")
+                    counts["failed"] += 1
+                else:
+                    output.write(json.dumps({"id": request_id, "custom_id": request["custom_id"],
+                                             "response": {"status_code": 200, "body": self.respond(request["body"])}, "error": None}) + "\n")
+                    counts["completed"] += 1
+                if (n + 1) % 100 == 0:
+                    _write_json(status_path, {"status": "in_progress", **counts})
+        _write_json(status_path, {"status": "completed", **counts})
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        with open(os.path.join(self._job_dir(job_id), "status.json")) as f:
+            return json.load(f)
+
+    def iter_results(self, job_id: str, status: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        for name in ("output.jsonl", "errors.jsonl"):
+            path = os.path.join(self._job_dir(job_id), name)
+            if not os.path.exists(path):
+                continue
+            with open(path) as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+
+    def cancel(self, job_id: str):
+        self._cancelled.add(job_id)
+
+def build_batch_backend(name: str, local_root: str = ".cache/batch_jobs", completion_window: str = "24h"):
+    if name == "langdb":
+        return LangDBBatchBackend(completion_window=completion_window)
+    if name == "local":
+        return LocalBatchBackend(local_root)
+    raise ValueError(f"Unknown batch backend: {name}. Expected one of {BATCH_BACKENDS}.")
+
+class BatchJobError(RuntimeError):
+    pass
+
+class BatchJobRunner:
+    """
+    Runs many generation requests as batch jobs instead of one call each.
+
+    Requests already in the response cache are answered from it. The rest are
+    written to one input JSONL file per max_requests_per_job requests, submitted,
+    and polled every poll_interval seconds. Result lines are streamed back, cached
+    under the backend's endpoint (the live API's for LangDBBatchBackend), and turned
+    into NeuralGenerator outputs with the usual feature extraction.
+    """
+    def __init__(self, backend, generator: NeuralGenerator, work_dir: str, poll_interval: float = 30.0, timeout: float = None,
+                 max_requests_per_job: int = 50_000):
+        self.backend = backend
+        self.generator = generator
+        self.work_dir = work_dir
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_requests_per_job = max_requests_per_job
+        self.jobs: List[Dict[str, Any]] = []
+
+    @property
+    def cache(self) -> Optional[ResponseCache]:
+        cache = getattr(self.generator.langdb_client, "cache", None)
+        return cache if cache is not None and cache.enabled else None
+
+    def run(self, requests: List[Dict[str, Any]]) -> Iterator[Tuple[int, Optional[dict], Optional[Exception], float]]:
+        """Yields (index into requests, output or None, error or None, seconds from submission to result) as results arrive."""
+        to_submit = []
+        for index, request in enumerate(requests):
+            start_time = time.time()
+            cached_response = self._cache_get(request)
+            if cached_response is not None:
+                output = self.generator.output_from_response(Completion.from_dict(cached_response), **request)
+                yield index, output, None, time.time() - start_time
+            elif self.cache is not None and self.cache.replay_only:
+                # In replay mode nothing is submitted.
+                raise CacheMissError(f"No cached batch response for request {index} (endpoint {self.backend.endpoint}) in replay-only mode.")
+            else:
+                to_submit.append(index)
+        for start in range(0, len(to_submit), self.max_requests_per_job):
+            yield from self._run_job(requests, to_submit[start:start + self.max_requests_per_job])
+
+    def _cache_key(self, request: Dict[str, Any]) -> str:
+        return ResponseCache.make_key(endpoint=self.backend.endpoint, **self.generator.request_body(**request))
+
+    def _cache_get(self, request: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        if self.cache is None:
+            return None
+        cached_response = self.cache.get(self._cache_key(request))
+        telemetry.increment("response_cache_misses" if cached_response is None else "response_cache_hits")
+        return cached_response
+
+    def _run_job(self, requests: List[Dict[str, Any]], indices: List[int]):
+        os.makedirs(self.work_dir, exist_ok=True)
+        input_path = os.path.join(self.work_dir, f"input_{uuid.uuid4().hex[:12]}.jsonl")
+        with open(input_path, "w") as f:
+            for index in indices:
+                f.write(json.dumps(batch_request_line(f"request-{index}", self.generator.request_body(**requests[index]))) + "\n")
+
+        submitted_at = time.time()
+        with telemetry.stage("batch_submit"):
+            job_id = self.backend.submit(input_path)
+        job = {"job_id": job_id, "requests": len(indices), "input_path": input_path, "status": "submitted"}
+        self.jobs.append(job)
+        print(f"Batch job {job_id}: submitted {len(indices)} requests")
+        status = self._wait(job_id, submitted_at, job)
+
+        pending = set(indices)
+        for line in self.backend.iter_results(job_id, status):
+            index = int(line["custom_id"].rsplit("-", 1)[1])
+            if index not in pending:
+                continue
+            pending.discard(index)
+            yield (index, *self._result(requests[index], line), time.time() - submitted_at)
+        for index in sorted(pending):
+            yield index, None, BatchJobError(f"No result for this request in batch job {job_id} ({status['status']})"), time.time() - submitted_at
+
+    def _wait(self, job_id: str, submitted_at: float, job: Dict[str, Any]) -> Dict[str, Any]:
+        last_reported = None
+        while True:
+            status = self.backend.status(job_id)
+            job.update(status)
+            progress = (status["status"], status.get("completed"), status.get("failed"))
+            if progress != last_reported:
+                print(f"Batch job {job_id}: {status['status']} ({status.get('completed', 0)}/{status.get('total') or job['requests']} done, {status.get('failed', 0)} failed)")
+                last_reported = progress
+            if status["status"] in TERMINAL_STATUSES:
+                # Expired and cancelled jobs still return the results they finished; failed jobs (invalid input) none.
+                if status["status"] == "failed":
+                    raise BatchJobError(f"Batch job {job_id} failed: {status}")
+                return status
+            if self.timeout is not None and time.time() - submitted_at > self.timeout:
+                self.backend.cancel(job_id)
+                raise BatchJobError(f"Batch job {job_id} did not finish within {self.timeout}s; cancelled.")
+            time.sleep(self.poll_interval)
+
+    def _result(self, request: Dict[str, Any], line: Dict[str, Any]) -> Tuple[Optional[dict], Optional[Exception]]:
+        response = line.get("response") or {}
+        if line.get("error") or response.get("status_code") != 200:
+            error = line.get("error") or (response.get("body") or {}).get("error")
+            return None, BatchJobError(f"status {response.get('status_code')}: {error}")
+        completion = Completion.from_dict(response["body"])
+        if self.cache is not None:
+            self.cache.put(self._cache_key(request), completion.to_dict())
+        return self.generator.output_from_response(completion, **request), None
@@ -0,0 +1,299 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .neural_generator import NeuralGenerator
+from .scheduler import Scheduler
+from .telemetry import telemetry
+
+def output_tokens(output: Dict[str, Any]) -> int:
+    completion = output.get("completion")
+    if completion is None:
+        return 0
+    usage = completion.usage or {}
+    return usage.get("total_tokens") or completion.n_tokens
+
+def prompt_tokens(output: Dict[str, Any]) -> int:
+    completion = output.get("completion")
+    if completion is None:
+        return 0
+    return (completion.usage or {}).get("prompt_tokens") or 0
+
+def tokens_cost(prompt_tokens: int, completion_tokens: int, model: str, prices: Dict[str, Tuple[float, float]]) -> float:
+    """USD cost from (input, output) prices per million tokens; 0 for unpriced models."""
+    price = (prices or {}).get(model)
+    if price is None:
+        return 0.0
+    return (prompt_tokens * price[0] + completion_tokens * price[1]) / 1_000_000
+
+def output_cost(output: Dict[str, Any], model: str, prices: Dict[str, Tuple[float, float]]) -> float:
+    completion = output.get("completion")
+    if completion is None:
+        return 0.0
+    usage = completion.usage or {}
+    return tokens_cost(usage.get("prompt_tokens") or 0, usage.get("completion_tokens") or completion.n_tokens, model, prices)
+
+class CascadeBudget:
+    """
+    Per-run limits on escalations to the fallback model: total fallback cost (USD),
+    total fallback tokens, and per-request latency (the primary call plus the
+    expected fallback latency). Speculative launches are only allowed while more
+    than speculative_reserve of the cost and token budgets is left.
+    """
+    def __init__(self, max_cost: float = None, max_fallback_tokens: int = None, max_request_latency: float = None, speculative_reserve: float = 0.5):
+        self.max_cost = max_cost
+        self.max_fallback_tokens = max_fallback_tokens
+        self.max_request_latency = max_request_latency
+        self.speculative_reserve = speculative_reserve
+        self.spent_cost = 0.0
+        self.spent_tokens = 0
+        self._lock = threading.Lock()
+
+    def remaining_fraction(self) -> float:
+        with self._lock:
+            fractions = [1.0]
+            if self.max_cost:
+                fractions.append(1 - self.spent_cost / self.max_cost)
+            if self.max_fallback_tokens:
+                fractions.append(1 - self.spent_tokens / self.max_fallback_tokens)
+        return max(0.0, min(fractions))
+
+    def escalation_refusal(self, expected_tokens: float, expected_cost: float, elapsed: float, expected_latency: float) -> Optional[str]:
+        """Why an escalation is not allowed now, or None if it is."""
+        with self._lock:
+            if self.max_cost is not None and self.spent_cost + expected_cost > self.max_cost:
+                return "cost_budget"
+            if self.max_fallback_tokens is not None and self.spent_tokens + expected_tokens > self.max_fallback_tokens:
+                return "token_budget"
+        if self.max_request_latency is not None and elapsed + expected_latency > self.max_request_latency:
+            return "latency_budget"
+        return None
+
+    def speculation_refusal(self, expected_tokens: float, expected_cost: float, elapsed: float, expected_latency: float) -> Optional[str]:
+        if self.remaining_fraction() <= self.speculative_reserve:
+            return "speculative_reserve"
+        return self.escalation_refusal(expected_tokens, expected_cost, elapsed, expected_latency)
+
+    def charge(self, tokens: int, cost: float):
+        with self._lock:
+            self.spent_tokens += tokens
+            self.spent_cost += cost
+
+class CascadeExecutor:
+    """
+    Carries out the scheduler's routing decisions: when a strategy returns
+    fallback_validation with a fallback_model_id, the request is re-run on that
+    model (budget permitting) and its answer replaces the primary one.
+
+    With speculative=True the primary answer is streamed; as soon as
+    Scheduler.route_partial flags it, the fallback request is started in a worker
+    thread. Whichever is settled first wins: a finished fallback closes the primary
+    stream, and a primary that ends up not routed drops the fallback (cancelled if
+    it has not started; otherwise its tokens are charged, and recorded as
+    wasted_fallback_tokens/wasted_fallback_cost, once it finishes).
+
+    Every request gets an accounting record; summary() compares them with always
+    calling the fallback model, estimated from the fallback calls seen so far, or
+    from the primary's tokens at the fallback model's prices before there are any.
+    before_fallback(request), if given, is called before every fallback call, e.g. to pace it.
+    """
+    def __init__(self, generator: NeuralGenerator, scheduler: Scheduler, budget: CascadeBudget = None, speculative: bool = False,
+                 prices: Dict[str, Tuple[float, float]] = None, max_speculative_workers: int = 4,
+                 before_fallback: Callable[[Dict[str, Any]], None] = None):
+        self.generator = generator
+        self.scheduler = scheduler
+        self.budget = budget or CascadeBudget()
+        self.speculative = speculative
+        self.prices = prices or {}
+        self.records: List[Dict[str, Any]] = []
+        self._fallback_latencies: List[float] = []
+        self._fallback_tokens: List[int] = []
+        self._fallback_costs: List[float] = []
+        self._lock = threading.Lock()
+        self.max_speculative_workers = max_speculative_workers
+        self.before_fallback = before_fallback
+        self._pool = None
+
+    def _expected_fallback(self, primary_latency: float, primary_tokens: int, fallback_model: Optional[str], primary_prompt_tokens: int = 0) -> Tuple[float, float, float]:
+        # The primary call, priced as the fallback model, stands in for the fallback until one has been observed.
+        with self._lock:
+            if not self._fallback_latencies:
+                return primary_latency, primary_tokens, tokens_cost(primary_prompt_tokens, primary_tokens - primary_prompt_tokens, fallback_model, self.prices)
+            n = len(self._fallback_latencies)
+            return sum(self._fallback_latencies) / n, sum(self._fallback_tokens) / n, sum(self._fallback_costs) / n
+
+    def _default_fallback_model(self, records: List[Dict[str, Any]]) -> Optional[str]:
+        for record in records:
+            if record["fallback_model"]:
+                return record["fallback_model"]
+        return next((strategy.fallback_model_id for strategy in self.scheduler.strategies if getattr(strategy, "fallback_model_id", None)), None)
+
+    def _call_fallback(self, request: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """The fallback answer and its usage; the caller merges the usage into the record only if the answer is used."""
+        if self.before_fallback is not None:
+            self.before_fallback(request)
+        start_time = time.time()
+        output = self.generator.generate(**request)
+        latency = time.time() - start_time
+        tokens = output_tokens(output)
+        cost = output_cost(output, request["model"], self.prices)
+        self.budget.charge(tokens, cost)
+        with self._lock:
+            self._fallback_latencies.append(latency)
+            self._fallback_tokens.append(tokens)
+            self._fallback_costs.append(cost)
+        return output, {"fallback_latency": latency, "fallback_tokens": tokens, "fallback_cost": cost}
+
+    def _record_wasted(self, record: Dict[str, Any], future):
+        # Done callback of a dropped speculative fallback that could not be cancelled.
+        if future.cancelled() or future.exception() is not None:
+            return
+        _, usage = future.result()
+        with self._lock:
+            record.update(wasted_fallback_tokens=usage["fallback_tokens"], wasted_fallback_cost=usage["fallback_cost"])
+
+    def _fallback_failed(self, record: Dict[str, Any], error: Exception):
+        # The primary answer is kept when the fallback model fails.
+        record["skipped"] = f"fallback_error: {error}"
+        telemetry.increment("cascade_fallback_errors")
+
+    def _new_record(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "primary_model": request["model"], "fallback_model": None, "escalated": False, "speculative": False, "winner": "primary",
+            "skipped": None, "primary_latency": None, "primary_tokens": 0, "primary_prompt_tokens": 0, "primary_cost": 0.0,
+            "fallback_latency": None, "fallback_tokens": 0, "fallback_cost": 0.0, "wasted_fallback_tokens": 0, "wasted_fallback_cost": 0.0, "latency": None
+        }
+
+    def run(self, request: Dict[str, Any], speculative: bool = None) -> Dict[str, Any]:
+        """
+        Returns {"output": final answer, "primary_output", "routing": the scheduler's decision
+        on the primary answer, "accounting": this request's record}. speculative overrides
+        the executor's setting for this request.
+        """
+        start_time = time.time()
+        record = self._new_record(request)
+        fallback_output = None
+        if self.speculative if speculative is None else speculative:
+            primary_output, fallback_output, routing = self._run_speculative(request, record, start_time)
+        else:
+            primary_output = self.generator.generate(**request)
+            record["primary_latency"] = time.time() - start_time
+            with telemetry.stage("routing"):
+                routing = self.scheduler.route(primary_output)
+        record["primary_tokens"] = output_tokens(primary_output)
+        record["primary_prompt_tokens"] = prompt_tokens(primary_output)
+        record["primary_cost"] = output_cost(primary_output, request["model"], self.prices)
+
+        fallback_model = routing.get("fallback_model_id")
+        if fallback_output is None and not record["speculative"] and routing.get("routing_decision") == "fallback_validation" and fallback_model:
+            record["fallback_model"] = fallback_model
+            expected_latency, expected_tokens, expected_cost = self._expected_fallback(record["primary_latency"], record["primary_tokens"], fallback_model,
+                                                                                       record["primary_prompt_tokens"])
+            record["skipped"] = self.budget.escalation_refusal(expected_tokens, expected_cost, time.time() - start_time, expected_latency)
+            if record["skipped"] is None:
+                try:
+                    fallback_output, usage = self._call_fallback({**request, "model": fallback_model})
+                    record.update(usage, escalated=True, winner="fallback")
+                except Exception as e:
+                    self._fallback_failed(record, e)
+            else:
+                telemetry.increment("cascade_escalations_skipped")
+        if record["escalated"]:
+            telemetry.increment("cascade_escalations")
+
+        record["latency"] = time.time() - start_time
+        with self._lock:
+            self.records.append(record)
+        return {"output": fallback_output if record["winner"] == "fallback" else primary_output, "primary_output": primary_output,
+                "routing": routing, "accounting": record}
+
+    def _run_speculative(self, request: Dict[str, Any], record: Dict[str, Any], start_time: float):
+        future = None
+
+        def on_early_routing(partial_output: Dict[str, Any]):
+            nonlocal future
+            fallback_model = partial_output.get("fallback_model_id")
+            if partial_output.get("routing_decision") != "fallback_validation" or not fallback_model:
+                return
+            elapsed = time.time() - start_time
+            expected_latency, expected_tokens, expected_cost = self._expected_fallback(elapsed, 0, fallback_model)
+            record["fallback_model"] = fallback_model
+            record["skipped"] = self.budget.speculation_refusal(expected_tokens, expected_cost, elapsed, expected_latency)
+            if record["skipped"] is None:
+                record["speculative"] = True
+                telemetry.increment("cascade_speculative_launches")
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(max_workers=self.max_speculative_workers, thread_name_prefix="cascade")
+                future = self._pool.submit(self._call_fallback, {**request, "model": fallback_model})
+
+        primary_output = self.generator.generate_stream(
+            scheduler=self.scheduler, abandon_on_early_routing=False, on_early_routing=on_early_routing,
+            stop_when=lambda: future is not None and future.done() and future.exception() is None, **request
+        )
+        record["primary_latency"] = time.time() - start_time
+
+        if primary_output["stream_abandoned"]:
+            # The speculative fallback finished first; the primary stream was closed.
+            fallback_output, usage = future.result()
+            record.update(usage, escalated=True, winner="fallback")
+            return primary_output, fallback_output, primary_output["early_routing"]
+
+        with telemetry.stage("routing"):
+            routing = self.scheduler.route(primary_output)
+        if future is None:
+            record["skipped"] = None # the full answer is routed again in run()
+            return primary_output, None, routing
+        if routing.get("routing_decision") == "fallback_validation":
+            try:
+                fallback_output, usage = future.result()
+            except Exception as e:
+                self._fallback_failed(record, e)
+                return primary_output, None, routing
+            record.update(usage, escalated=True, winner="fallback")
+            return primary_output, fallback_output, routing
+        # The complete primary answer is fine after all: drop the speculative fallback.
+        if not future.cancel():
+            telemetry.increment("cascade_speculative_wasted")
+            future.add_done_callback(lambda done: self._record_wasted(record, done))
+        return primary_output, None, routing
+
+    def accounting(self) -> List[Dict[str, Any]]:
+        """Per-request records with the estimated always-fallback latency, tokens and cost and the savings against them."""
+        with self._lock:
+            records = [dict(record) for record in self.records]
+        default_fallback_model = self._default_fallback_model(records)
+        rows = []
+        for record in records:
+            # An escalated request's own fallback call is its always-fallback baseline.
+            if record["fallback_latency"] is not None:
+                baseline_latency, baseline_tokens, baseline_cost = record["fallback_latency"], record["fallback_tokens"], record["fallback_cost"]
+            else:
+                baseline_latency, baseline_tokens, baseline_cost = self._expected_fallback(
+                    record["primary_latency"], record["primary_tokens"], record["fallback_model"] or default_fallback_model, record["primary_prompt_tokens"])
+            rows.append({
+                **record,
+                "baseline_latency": baseline_latency, "baseline_tokens": baseline_tokens, "baseline_cost": baseline_cost,
+                "saved_latency": baseline_latency - record["latency"],
+                "saved_fallback_tokens": baseline_tokens - record["fallback_tokens"] - record["wasted_fallback_tokens"],
+                "saved_cost": baseline_cost - record["primary_cost"] - record["fallback_cost"] - record["wasted_fallback_cost"]
+            })
+        return rows
+
+    def summary(self) -> Dict[str, Any]:
+        """Totals over all requests, with savings versus always using the fallback model."""
+        rows = self.accounting()
+        summary = {
+            "requests": len(rows),
+            "escalations": sum(row["escalated"] for row in rows),
+            "speculative_launches": sum(row["speculative"] for row in rows),
+            "skipped_escalations": sum(row["skipped"] is not None for row in rows)
+        }
+        for name in ("latency", "fallback_tokens", "wasted_fallback_tokens", "saved_latency", "saved_fallback_tokens", "saved_cost"):
+            summary[name] = sum(row[name] for row in rows)
+        summary["cost"] = sum(row["primary_cost"] + row["fallback_cost"] + row["wasted_fallback_cost"] for row in rows)
+        return summary
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
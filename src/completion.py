@@ -0,0 +1,128 @@
+import sys
+from typing import Any, Dict, List, Optional
+
+from .startup_profiler import lazy_import
+
+# Message fields that mark a tool call; see ToolIntentExtractor.
+TOOL_KEYS = ("tool_calls", "function_call", "tool_use")
+
+class Completion:
+    """
+    Compact record of one chat completion.
+
+    Per-token data lives in flat buffers instead of one dict per token: the token
+    strings are concatenated into token_text and split by token_offsets, the
+    sampled logprobs are a float64 [n_tokens] array, and the top-k logprobs a
+    float64 [n_tokens, k] matrix padded with -inf. Top-k token strings are not
+    kept. raw holds the full response dict only when it was explicitly requested
+    (LANGDB_KEEP_RAW_RESPONSES).
+    """
+    __slots__ = ("model", "text", "finish_reason", "tool_calls", "usage", "token_text", "token_offsets", "logprobs", "top_logprobs", "raw")
+
+    def __init__(self, model: str, text: str, finish_reason: str = None, tool_calls: Dict[str, Any] = None, usage: Dict[str, Any] = None,
+                 token_text: str = "", token_offsets=None, logprobs=None, top_logprobs=None, raw: dict = None):
+        np = lazy_import("numpy")
+        self.model = model
+        self.text = text
+        self.finish_reason = finish_reason
+        self.tool_calls = tool_calls # {key: value} for the TOOL_KEYS present in the message, or None
+        self.usage = usage
+        self.token_text = token_text
+        self.token_offsets = np.zeros(1, dtype=np.int32) if token_offsets is None else token_offsets
+        self.logprobs = np.zeros(0, dtype=np.float64) if logprobs is None else logprobs
+        self.top_logprobs = np.zeros((len(self.logprobs), 0), dtype=np.float64) if top_logprobs is None else top_logprobs
+        self.raw = raw
+
+    @classmethod
+    def from_lists(cls, model: str, text: str, tokens: List[str], logprobs: List[Optional[float]], top_logprobs: List[List[float]],
+                   finish_reason: str = None, tool_calls: Dict[str, Any] = None, usage: Dict[str, Any] = None, raw: dict = None) -> "Completion":
+        np = lazy_import("numpy")
+        offsets = np.zeros(len(tokens) + 1, dtype=np.int32)
+        np.cumsum([len(token) for token in tokens], out=offsets[1:])
+        top_k = max((len(row) for row in top_logprobs), default=0)
+        if all(len(row) == top_k for row in top_logprobs):
+            # The usual case: the API returns the same number of alternatives for every token.
+            top = np.array(top_logprobs, dtype=np.float64).reshape(len(top_logprobs), top_k)
+        else:
+            top = np.full((len(top_logprobs), top_k), -np.inf, dtype=np.float64)
+            for i, row in enumerate(top_logprobs):
+                top[i, :len(row)] = row
+        return cls(model, text, finish_reason, tool_calls, usage, "".join(tokens), offsets,
+                   np.array([np.nan if logprob is None else logprob for logprob in logprobs], dtype=np.float64), top, raw)
+
+    @classmethod
+    def from_openai(cls, response, keep_raw: bool = False) -> "Completion":
+        """Reads an openai ChatCompletion object directly, without dumping it to dicts first."""
+        if keep_raw:
+            return cls.from_dict(response.model_dump(), keep_raw=True)
+        choice = response.choices[0] if response.choices else None
+        message = choice.message if choice is not None else None
+        content = (choice.logprobs.content if choice is not None and choice.logprobs is not None else None) or []
+        tool_calls = {}
+        for key in TOOL_KEYS:
+            value = getattr(message, key, None)
+            if value is not None:
+                tool_calls[key] = value.model_dump() if hasattr(value, "model_dump") else [item.model_dump() for item in value]
+        usage = response.usage
+        return cls.from_lists(
+            response.model, (message.content if message is not None else None) or "",
+            [token_data.token for token_data in content],
+            [token_data.logprob for token_data in content],
+            [[candidate.logprob for candidate in token_data.top_logprobs or ()] for token_data in content],
+            choice.finish_reason if choice is not None else None, tool_calls or None,
+            {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens, "total_tokens": usage.total_tokens} if usage is not None else None
+        )
+
+    @classmethod
+    def from_dict(cls, response: dict, keep_raw: bool = False) -> "Completion":
+        """From a response dict: the API's chat.completion shape or the compact shape of to_dict."""
+        response = response or {}
+        if "choices" not in response and "logprobs" in response:
+            return cls.from_lists(response.get("model"), response.get("text") or "", response.get("tokens") or [], response["logprobs"],
+                                  response.get("top_logprobs") or [], response.get("finish_reason"), response.get("tool_calls"), response.get("usage"))
+        choice = (response.get("choices") or [{}])[0]
+        message = choice.get("message") or {}
+        content = (choice.get("logprobs") or {}).get("content") or []
+        tool_calls = {key: message[key] for key in TOOL_KEYS if message.get(key) is not None}
+        return cls.from_lists(
+            response.get("model"), message.get("content") or "",
+            [token_data.get("token") or "" for token_data in content],
+            [token_data.get("logprob") for token_data in content],
+            [[candidate["logprob"] for candidate in token_data.get("top_logprobs") or []] for token_data in content],
+            choice.get("finish_reason"), tool_calls or None, response.get("usage"), response if keep_raw else None
+        )
+
+    def to_dict(self) -> dict:
+        """JSON-serializable compact form, readable by from_dict (used for the response cache)."""
+        np = lazy_import("numpy")
+        return {
+            "model": self.model,
+            "text": self.text,
+            "finish_reason": self.finish_reason,
+            "tool_calls": self.tool_calls,
+            "usage": self.usage,
+            "tokens": self.tokens,
+            "logprobs": [None if np.isnan(logprob) else logprob for logprob in self.logprobs.tolist()],
+            "top_logprobs": self.top_logprobs_lists()
+        }
+
+    @property
+    def n_tokens(self) -> int:
+        return len(self.logprobs)
+
+    @property
+    def tokens(self) -> List[str]:
+        offsets = self.token_offsets.tolist()
+        return [self.token_text[start:end] for start, end in zip(offsets, offsets[1:])]
+
+    def top_logprobs_lists(self) -> List[List[float]]:
+        """Per-token top-k logprobs without the -inf padding."""
+        np = lazy_import("numpy")
+        return [row[np.isfinite(row)].tolist() for row in self.top_logprobs]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by this record, buffers included."""
+        size = sys.getsizeof(self) + sys.getsizeof(self.text) + sys.getsizeof(self.token_text)
+        size += sum(array.nbytes for array in (self.token_offsets, self.logprobs, self.top_logprobs))
+        return size
@@ -5,3 +5,108 @@ load_dotenv()
 
 LANGDB_API_KEY = os.getenv("LANGDB_API_KEY")
 LANGDB_PROJECT_ID = os.getenv("LANGDB_PROJECT_ID")
+
+LANGDB_BASE_URL = os.getenv("LANGDB_BASE_URL", "https://api.us-east-1.langdb.ai")
+
+# Connection pool shared by every LangDB client in a process (see src/http_transport.py).
+LANGDB_HTTP_MAX_CONNECTIONS = int(os.getenv("LANGDB_HTTP_MAX_CONNECTIONS", "64"))
+LANGDB_HTTP_MAX_KEEPALIVE = int(os.getenv("LANGDB_HTTP_MAX_KEEPALIVE", "32"))
+LANGDB_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("LANGDB_HTTP_KEEPALIVE_EXPIRY", "30"))
+LANGDB_HTTP_CONNECT_TIMEOUT = float(os.getenv("LANGDB_HTTP_CONNECT_TIMEOUT", "10"))
+LANGDB_HTTP_READ_TIMEOUT = float(os.getenv("LANGDB_HTTP_READ_TIMEOUT", "120"))
+LANGDB_HTTP2 = os.getenv("LANGDB_HTTP2", "false").lower() in ("1", "true", "yes")
+# Keep the full response dict on every Completion (and in the response cache); off by default to save memory.
+LANGDB_KEEP_RAW_RESPONSES = os.getenv("LANGDB_KEEP_RAW_RESPONSES", "false").lower() in ("1", "true", "yes")
+
+# Async generation budget. Per-model overrides can be passed to run_full_pipeline.
+LANGDB_MAX_IN_FLIGHT = int(os.getenv("LANGDB_MAX_IN_FLIGHT", "8"))
+LANGDB_REQUESTS_PER_SECOND = float(os.getenv("LANGDB_REQUESTS_PER_SECOND", "2"))
+LANGDB_TOKENS_PER_MINUTE = float(os.getenv("LANGDB_TOKENS_PER_MINUTE", "200000"))
+# Concurrency adapts between LANGDB_MIN_IN_FLIGHT and LANGDB_MAX_IN_FLIGHT (AIMD on 429s and slow responses).
+LANGDB_MIN_IN_FLIGHT = int(os.getenv("LANGDB_MIN_IN_FLIGHT", "1"))
+LANGDB_LATENCY_TARGET_SECONDS = float(os.getenv("LANGDB_LATENCY_TARGET_SECONDS")) if os.getenv("LANGDB_LATENCY_TARGET_SECONDS") else None
+LANGDB_MAX_RATE_LIMIT_RETRIES = int(os.getenv("LANGDB_MAX_RATE_LIMIT_RETRIES", "6"))
+# A request still running past this latency quantile of its model gets a hedged duplicate (0 disables hedging).
+LANGDB_HEDGE_QUANTILE = float(os.getenv("LANGDB_HEDGE_QUANTILE", "0.95"))
+LANGDB_HEDGE_MIN_SAMPLES = int(os.getenv("LANGDB_HEDGE_MIN_SAMPLES", "20"))
+# Optional backup models for hedges, e.g. "gpt-4.1-nano=gpt-4o-mini,deepseek-r1=gpt-4o-mini"; default is the same model.
+LANGDB_HEDGE_BACKUPS = dict(pair.split("=", 1) for pair in os.getenv("LANGDB_HEDGE_BACKUPS", "").split(",") if "=" in pair)
+
+# On-disk response cache shared by LangDBClient instances. Modes: off, read_write, replay.
+RESPONSE_CACHE_PATH = os.getenv("RESPONSE_CACHE_PATH", ".cache/responses.sqlite")
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(1 << 30)))
+RESPONSE_CACHE_MODE = os.getenv("RESPONSE_CACHE_MODE", "read_write")
+
+# Near-duplicate prompt cache in front of NeuralGenerator (see src/similarity_cache.py); off by default.
+SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "false").lower() in ("1", "true", "yes")
+SIMILARITY_CACHE_THRESHOLD = float(os.getenv("SIMILARITY_CACHE_THRESHOLD", "0.9"))
+SIMILARITY_CACHE_NUM_PERM = int(os.getenv("SIMILARITY_CACHE_NUM_PERM", "128"))
+SIMILARITY_CACHE_BANDS = int(os.getenv("SIMILARITY_CACHE_BANDS", "32"))
+SIMILARITY_CACHE_MAX_ENTRIES = int(os.getenv("SIMILARITY_CACHE_MAX_ENTRIES", "100000"))
+# Share of hits also generated live to measure false reuse, and where hits and audits are logged.
+SIMILARITY_CACHE_AUDIT_RATE = float(os.getenv("SIMILARITY_CACHE_AUDIT_RATE", "0.0"))
+SIMILARITY_CACHE_AUDIT_PATH = os.getenv("SIMILARITY_CACHE_AUDIT_PATH", "eval_results/similarity_cache_audit.jsonl")
+
+# Cascade executor (src/cascade.py): escalations to the strategy's fallback model within a per-run budget.
+CASCADE_MAX_COST = float(os.getenv("CASCADE_MAX_COST")) if os.getenv("CASCADE_MAX_COST") else None
+CASCADE_MAX_FALLBACK_TOKENS = int(os.getenv("CASCADE_MAX_FALLBACK_TOKENS")) if os.getenv("CASCADE_MAX_FALLBACK_TOKENS") else None
+CASCADE_MAX_REQUEST_LATENCY_SECONDS = float(os.getenv("CASCADE_MAX_REQUEST_LATENCY_SECONDS")) if os.getenv("CASCADE_MAX_REQUEST_LATENCY_SECONDS") else None
+# Speculative fallback calls stop once less than this share of the cost/token budget is left.
+CASCADE_SPECULATIVE_RESERVE = float(os.getenv("CASCADE_SPECULATIVE_RESERVE", "0.5"))
+# USD per million (input, output) tokens, e.g. "gpt-4.1-nano=0.1:0.4,gpt-5.2-pro=15:120"; unpriced models cost 0.
+MODEL_PRICES = {model: tuple(float(price) for price in prices.split(":", 1))
+                for model, prices in (pair.split("=", 1) for pair in os.getenv("MODEL_PRICES", "").split(",") if "=" in pair)}
+
+# NLI validator backend: transformers, torch_int8 or onnx (CPU int8 via ONNX Runtime).
+NLI_BACKEND = os.getenv("NLI_BACKEND", "transformers")
+NLI_BATCH_SIZE = int(os.getenv("NLI_BATCH_SIZE", "16"))
+# NLI results and tokenized premises, cached in memory and in SQLite. Modes: off, read_write.
+NLI_CACHE_PATH = os.getenv("NLI_CACHE_PATH", ".cache/nli.sqlite")
+NLI_CACHE_MAX_BYTES = int(os.getenv("NLI_CACHE_MAX_BYTES", str(256 << 20)))
+NLI_CACHE_MEMORY_ENTRIES = int(os.getenv("NLI_CACHE_MEMORY_ENTRIES", "10000"))
+NLI_CACHE_MODE = os.getenv("NLI_CACHE_MODE", "read_write")
+# Socket of a warm NLI daemon (python -m src.validators.nli_daemon); runs fall back to in-process NLI when none is listening. Empty disables.
+NLI_DAEMON_SOCKET = os.getenv("NLI_DAEMON_SOCKET", ".cache/nli.sock")
+
+# Optional startup budget reported by `python -m src.main --profile-startup`.
+STARTUP_BUDGET_SECONDS = float(os.getenv("STARTUP_BUDGET_SECONDS")) if os.getenv("STARTUP_BUDGET_SECONDS") else None
+
+# Logging is sampled and written from a background thread; see src/telemetry.py.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.05"))
+METRICS_JSONL_PATH = os.getenv("METRICS_JSONL_PATH", "eval_results/metrics.jsonl")
+METRICS_PROMETHEUS_PATH = os.getenv("METRICS_PROMETHEUS_PATH", "eval_results/metrics.prom") # each cell writes metrics_<cell>.prom next to it
+METRICS_EXPORT_INTERVAL_SECONDS = float(os.getenv("METRICS_EXPORT_INTERVAL_SECONDS", "30"))
+
+# Streaming run metrics (rates, entropy, latency quantiles), appended as JSONL snapshots during a run.
+ONLINE_METRICS_PATH = os.getenv("ONLINE_METRICS_PATH", "eval_results/online_metrics.jsonl")
+ONLINE_METRICS_FLUSH_INTERVAL_SECONDS = float(os.getenv("ONLINE_METRICS_FLUSH_INTERVAL_SECONDS", "30"))
+ONLINE_METRICS_COMPRESSION = float(os.getenv("ONLINE_METRICS_COMPRESSION", "100"))
+
+# Stages of run_full_pipeline (generation, NLI, result writes) are connected by queues of this many items.
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "64"))
+PIPELINE_NLI_MAX_WAIT_SECONDS = float(os.getenv("PIPELINE_NLI_MAX_WAIT_SECONDS", "0.05"))
+
+# Batch mode (run_full_pipeline(batch_mode=True)): a run's uncached prompts go out as one batch job. Backends: langdb, local.
+BATCH_BACKEND = os.getenv("BATCH_BACKEND", "langdb")
+BATCH_LOCAL_ROOT = os.getenv("BATCH_LOCAL_ROOT", ".cache/batch_jobs")
+BATCH_WORK_DIR = os.getenv("BATCH_WORK_DIR", ".cache/batch_inputs")
+BATCH_POLL_INTERVAL_SECONDS = float(os.getenv("BATCH_POLL_INTERVAL_SECONDS", "30"))
+BATCH_TIMEOUT_SECONDS = float(os.getenv("BATCH_TIMEOUT_SECONDS")) if os.getenv("BATCH_TIMEOUT_SECONDS") else None
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+
+# Early stopping (main --early-stop, sweep --early-stop): prompts run in seeded random order until every tracked rate's
+# confidence interval is at most this wide, or a sequential test against a baseline cell decides (sweep --baseline-strategy).
+EARLY_STOPPING_CI_WIDTH = float(os.getenv("EARLY_STOPPING_CI_WIDTH", "0.1"))
+EARLY_STOPPING_CONFIDENCE = float(os.getenv("EARLY_STOPPING_CONFIDENCE", "0.95"))
+EARLY_STOPPING_MIN_SAMPLES = int(os.getenv("EARLY_STOPPING_MIN_SAMPLES", "30"))
+EARLY_STOPPING_MARGIN = float(os.getenv("EARLY_STOPPING_MARGIN", "0.05"))
+EARLY_STOPPING_ALPHA = float(os.getenv("EARLY_STOPPING_ALPHA", "0.05"))
+EARLY_STOPPING_BETA = float(os.getenv("EARLY_STOPPING_BETA", "0.2"))
+
+# Partitioned Parquet results written incrementally by run_full_pipeline.
+RESULTS_STORE_ROOT = os.getenv("RESULTS_STORE_ROOT", "eval_results/store")
+RESULTS_ROW_GROUP_SIZE = int(os.getenv("RESULTS_ROW_GROUP_SIZE", "50"))
+
+# Datasets are converted once into memory-mapped Arrow files here.
+DATASET_CACHE_DIR = os.getenv("DATASET_CACHE_DIR", ".cache/datasets")
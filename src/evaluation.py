@@ -1,147 +1,454 @@
-import pandas as pd
+import asyncio
 import random
-import numpy as np
 import os
 import sys
 import time
-import openai
 import hashlib
-from typing import List, Dict, Any
-from .langdb_client import LangDBClient
-from .config import LANGDB_API_KEY, LANGDB_PROJECT_ID
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Awaitable, Callable, Tuple
+from .langdb_client import LangDBClient, AsyncLangDBClient
+from .config import LANGDB_API_KEY, LANGDB_PROJECT_ID, LANGDB_MAX_IN_FLIGHT, LANGDB_REQUESTS_PER_SECOND, LANGDB_TOKENS_PER_MINUTE
+from .config import LANGDB_MIN_IN_FLIGHT, LANGDB_LATENCY_TARGET_SECONDS, LANGDB_MAX_RATE_LIMIT_RETRIES
+from .config import LANGDB_HEDGE_QUANTILE, LANGDB_HEDGE_MIN_SAMPLES, LANGDB_HEDGE_BACKUPS
+from .config import RESPONSE_CACHE_PATH, RESPONSE_CACHE_MAX_BYTES, RESPONSE_CACHE_MODE
+from .config import NLI_BACKEND, NLI_BATCH_SIZE, NLI_CACHE_PATH, NLI_CACHE_MAX_BYTES, NLI_CACHE_MEMORY_ENTRIES, NLI_CACHE_MODE, NLI_DAEMON_SOCKET
+from .config import CASCADE_MAX_COST, CASCADE_MAX_FALLBACK_TOKENS, CASCADE_MAX_REQUEST_LATENCY_SECONDS, CASCADE_SPECULATIVE_RESERVE, MODEL_PRICES
+from .config import SIMILARITY_CACHE_ENABLED, SIMILARITY_CACHE_THRESHOLD, SIMILARITY_CACHE_NUM_PERM, SIMILARITY_CACHE_BANDS
+from .config import SIMILARITY_CACHE_MAX_ENTRIES, SIMILARITY_CACHE_AUDIT_RATE, SIMILARITY_CACHE_AUDIT_PATH
+from .config import RESULTS_STORE_ROOT, RESULTS_ROW_GROUP_SIZE, DATASET_CACHE_DIR, PIPELINE_QUEUE_SIZE, PIPELINE_NLI_MAX_WAIT_SECONDS
+from .results_store import ResultsStore, strategy_label, logprob_columns, results_schema
+from .response_cache import ResponseCache, CacheMissError
+from .similarity_cache import SimilarityCache
 from .neural_generator import NeuralGenerator
-from .scheduler import Scheduler
-from .strategies.direct_response_strategy import DirectResponseStrategy
-from .strategies.high_entropy_strategy import HighEntropyStrategy
-
-from .validators.nli_contradiction_validator import NLIContradictionValidator
-from eval.evaluate import evaluate_predictions
-from eval.datasets.truthfulqa import load_truthfulqa
-from eval.metrics import compute_all_metrics
+from .async_engine import AsyncGenerationEngine, GenerationResult
+from .batch_jobs import BatchJobRunner, build_batch_backend
+from .cascade import CascadeBudget, CascadeExecutor
+from .rate_limiter import ModelRateLimiters, is_rate_limit_error, rate_limit_backoff
+from .scheduler import Scheduler, build_scheduler
+from .staged_pipeline import StagedPipeline
+from .startup_profiler import startup_profiler, lazy_import
+from .telemetry import telemetry
+from .config import METRICS_JSONL_PATH, METRICS_PROMETHEUS_PATH, METRICS_EXPORT_INTERVAL_SECONDS
+from .config import ONLINE_METRICS_PATH, ONLINE_METRICS_FLUSH_INTERVAL_SECONDS, ONLINE_METRICS_COMPRESSION
+from .config import EARLY_STOPPING_CONFIDENCE, EARLY_STOPPING_MIN_SAMPLES, EARLY_STOPPING_MARGIN, EARLY_STOPPING_ALPHA, EARLY_STOPPING_BETA
+from .config import BATCH_BACKEND, BATCH_LOCAL_ROOT, BATCH_WORK_DIR, BATCH_POLL_INTERVAL_SECONDS, BATCH_TIMEOUT_SECONDS, BATCH_COMPLETION_WINDOW
+
+from .validators.base_validator import BaseValidator
+from .validators.nli_cache import CachedNLIValidator, NLICache
+from .validators.nli_daemon import NLIDaemonClient
+from .validators.nli_contradiction_validator import build_nli_validator
+
+# pandas, numpy, openai, transformers and the eval/ modules are imported on first use.
 
 RATE_LIMIT_SECONDS = 3.5
-MAX_API_CALLS = 3
-api_calls = 0
 
-def run_full_pipeline(dataset_name: str, strategy_config: Dict[str, Any], seed: int, output_csv_path: str, model_id: str = "gpt-4.1-nano", prompt_limit: int = 20):
+def _result_row(prompt_content: str, model_id: str, all_results: Dict[str, Any], latency: float) -> Dict[str, Any]:
+    return {
+        "Question": prompt_content,
+        "Model": model_id,
+        "ModelAnswer": all_results.get("text"),
+        "entropy": all_results.get("entropy"),
+        "routing_decision": all_results.get("routing_decision", "N/A"),
+        "answered_by": all_results.get("answered_by", model_id),
+        "fallback_model": all_results.get("cascade_fallback_model"),
+        "early_routing_decision": (all_results.get("early_routing") or {}).get("routing_decision"),
+        "time_to_routing": all_results.get("time_to_routing"),
+        "contradiction_flag": all_results.get("contradiction_flag", False),
+        "nli_scores": all_results.get("nli_scores", {}),
+        "factual_flag": False,
+        "factual_score": None,
+        "latency": latency
+    }
+
+def _error_row(prompt_content: str, model_id: str, latency: float) -> Dict[str, Any]:
+    return {
+        "Question": prompt_content,
+        "Model": model_id,
+        "ModelAnswer": "Error",
+        "entropy": None,
+        "routing_decision": "Error",
+        "answered_by": None,
+        "fallback_model": None,
+        "early_routing_decision": None,
+        "time_to_routing": None,
+        "contradiction_flag": False,
+        "nli_scores": {},
+        "factual_flag": False,
+        "factual_score": None,
+        "latency": latency
+    }
+
+def _route_output(neural_output: Dict[str, Any], scheduler: Scheduler) -> Dict[str, Any]:
+    # The stored decision is the complete answer's; a streamed answer's early decision only started work sooner.
+    # Cascade rows carry the primary answer's routing, since the stored answer may be the fallback model's.
+    with telemetry.stage("routing"):
+        routing_decision_output = neural_output.get("primary_routing") or scheduler.route(neural_output)
+    return {**neural_output, **routing_decision_output, "contradiction_flag": False, "nli_scores": {}}
+
+def _validate_batch(items: List[Dict[str, Any]], nli_validator: BaseValidator):
+    """NLI for a batch of routed pipeline items (see StagedPipeline), updating their outputs in place."""
+    telemetry.increment("fallback_validations", len(items))
+    with telemetry.stage("nli_batch"):
+        nli_batch_results = nli_validator.validate_batch([item["output"] for item in items])
+    for item, nli_validation_results in zip(items, nli_batch_results):
+        item["output"].update(nli_validation_results)
+
+def _generation_request(prompt_content: str, model_id: str, seed: int) -> Dict[str, Any]:
+    return {
+        "model": model_id,
+        "messages": [{"role": "user", "content": prompt_content}],
+        "temperature": 0.8,
+        "max_tokens": 256,
+        "seed": seed,
+        "prompt_cache_key": hashlib.md5(f"{prompt_content}-{model_id}-{seed}".encode()).hexdigest()
+    }
+
+def _generate_async(indexed_questions: List[Tuple[int, str]], model_id: str, seed: int, max_in_flight: int, rate_limiters: ModelRateLimiters,
+                    response_cache: ResponseCache, similarity_cache: SimilarityCache, on_result: Callable[[GenerationResult], Awaitable[None]], features: tuple = (),
+                    stop_when: Callable[[], bool] = None):
+    """
+    Generates every prompt and hands each result to on_result as it finishes; GenerationResult.index points into indexed_questions.
+    Once stop_when() returns True no further requests are started; those in flight still finish.
+    """
+    async def _run():
+        client = AsyncLangDBClient(api_key=LANGDB_API_KEY, project_id=LANGDB_PROJECT_ID, cache=response_cache)
+        engine = AsyncGenerationEngine(
+            generator=NeuralGenerator(langdb_client=client, similarity_cache=similarity_cache, features=features),
+            rate_limiters=rate_limiters,
+            max_in_flight=max_in_flight,
+            min_in_flight=LANGDB_MIN_IN_FLIGHT,
+            latency_target=LANGDB_LATENCY_TARGET_SECONDS,
+            max_rate_limit_retries=LANGDB_MAX_RATE_LIMIT_RETRIES,
+            hedge_quantile=LANGDB_HEDGE_QUANTILE or None,
+            hedge_min_samples=LANGDB_HEDGE_MIN_SAMPLES,
+            hedge_backups=LANGDB_HEDGE_BACKUPS
+        )
+        try:
+            # A full pipeline queue stalls on_result, which stops new requests (backpressure).
+            requests = (_generation_request(prompt_content, model_id, seed) for _, prompt_content in indexed_questions)
+            if stop_when is not None:
+                requests = itertools.takewhile(lambda _: not stop_when(), requests)
+            await engine.generate_each(requests, on_result)
+        finally:
+            await client.close()
+
+    asyncio.run(_run())
+
+def run_full_pipeline(dataset_name: str, strategy_config: Dict[str, Any], seed: int, output_csv_path: str, model_id: str = "gpt-4.1-nano", prompt_limit: int = 20,
+                      async_mode: bool = False, max_in_flight: int = LANGDB_MAX_IN_FLIGHT, requests_per_second: float = LANGDB_REQUESTS_PER_SECOND,
+                      tokens_per_minute: float = LANGDB_TOKENS_PER_MINUTE, rate_limits: Dict[str, Dict[str, float]] = None,
+                      cache_mode: str = RESPONSE_CACHE_MODE, cache_path: str = RESPONSE_CACHE_PATH, streaming: bool = False,
+                      nli_backend: str = NLI_BACKEND, nli_batch_size: int = NLI_BATCH_SIZE,
+                      resume: bool = True, results_root: str = RESULTS_STORE_ROOT, rate_limiters: ModelRateLimiters = None,
+                      similarity_cache: SimilarityCache = None, cascade: bool = False, batch_mode: bool = False, batch_backend=None,
+                      early_stopping: Dict[str, Any] = None) -> Dict[str, Any]:
+    """
+    Runs one (dataset, model, strategy, seed) cell and returns its metrics and TruthfulQA summary.
+    Pass rate_limiters to share a budget with other runs (see src/sweep.py). A similarity_cache
+    (or SIMILARITY_CACHE_ENABLED) serves near-duplicate prompts from earlier completions.
+    cascade re-asks routed prompts to the strategy's fallback model (sequential path only;
+    speculatively, from the first streamed tokens, when streaming is set too). Without cascade,
+    streaming uses the decision on the first tokens to get NLI ready early; rows are still routed
+    on the complete answer and record when the early decision was taken (time_to_routing).
+    batch_mode submits the uncached prompts as one batch job to batch_backend (default:
+    BATCH_BACKEND, see src/batch_jobs.py) and routes the results as they are read back.
+    early_stopping (keyword arguments of eval.early_stopping.EarlyStopping, e.g. {"ci_width": 0.1}
+    or {"baseline_accuracy": 0.4}) runs the prompts in seeded random order and stops once decided.
+    """
 
     random.seed(seed)
-    np.random.seed(seed)
+    lazy_import("numpy").random.seed(seed)
     os.environ['PYTHONHASHSEED'] = str(seed)
 
-    prompt_limit = min(prompt_limit, 5) # temporary safety cap
-
-    client = LangDBClient(api_key=LANGDB_API_KEY, project_id=LANGDB_PROJECT_ID)
-    generator = NeuralGenerator(langdb_client=client)
-
-    nli_validator = NLIContradictionValidator()
-
-    strategies = []
-    for strategy_name, config in strategy_config.items():
-        if strategy_name == "HighEntropyStrategy":
-            strategies.append(HighEntropyStrategy(threshold=config["threshold"]))
-        elif strategy_name == "DirectResponseStrategy":
-            strategies.append(DirectResponseStrategy())
-    scheduler = Scheduler(strategies=strategies)
-
-    if dataset_name == "TruthfulQA":
-        questions = load_truthfulqa("eval/TruthfulQA.csv")
-    else:
-        raise ValueError(f"Unknown dataset: {dataset_name}")
-
-    questions = questions[:prompt_limit]
-
-    generated_results: List[Dict[str, Any]] = []
-    predictions_for_eval: List[Dict[str, str]] = []
-
-    rate_limit_retries = 0
-    for i, prompt_content in enumerate(questions):
-        messages = [{"role": "user", "content": prompt_content}]
-        
-        while True:
-            start_time = time.time()
-            try:
-                time.sleep(RATE_LIMIT_SECONDS)
-
-                global api_calls
-                if api_calls >= MAX_API_CALLS:
-                    raise RuntimeError("API call cap reached. Stopping.")
-                api_calls += 1
-
-                neural_output = generator.generate(
-                    model=model_id,
-                    messages=messages,
-                    temperature=0.8,
-                    max_tokens=256,
-                    seed=seed,
-                    prompt_cache_key=hashlib.md5(f"{prompt_content}-{model_id}-{seed}".encode()).hexdigest()
-                )
-                time.sleep(1) # Latency buffer
-                end_time = time.time()
-                latency = end_time - start_time
-                
-                rate_limit_retries = 0 # Reset on successful call
-
-                routing_decision_output = scheduler.route(neural_output)
-
-                nli_validation_results = {"contradiction_flag": False, "nli_scores": {}}
-                factuality_validation_results = {"factual_flag": False, "factual_score": None}
-
-                if routing_decision_output.get("routing_decision") == "fallback_validation":
-                    nli_validation_results = nli_validator.validate(neural_output)
-
-                all_results = {**neural_output, **routing_decision_output, **nli_validation_results}
-                all_results["latency"] = latency
-
-                print(f"[{i+1}/{len(questions)}] model={model_id} entropy={all_results.get("entropy", "None")} routing={all_results.get("routing_decision", "N/A")} latency={latency:.2f}s")
-                sys.stdout.flush()
-
-                generated_results.append({
-                    "Question": prompt_content,
-                    "Model": model_id,
-                    "ModelAnswer": all_results.get("text"),
-                    "entropy": all_results.get("entropy"),
-                    "routing_decision": all_results.get("routing_decision", "N/A"),
-                    "contradiction_flag": all_results.get("contradiction_flag", False),
-                    "nli_scores": all_results.get("nli_scores", {}),
-                    "factual_flag": False,
-                    "factual_score": None,
-                    "latency": latency
-                })
-                predictions_for_eval.append({"Question": prompt_content, "ModelAnswer": all_results.get("text")})
-                break # Break out of while True loop, move to next prompt
-
-            except openai.RateLimitError as e:
-                raise RuntimeError("LangDB quota exceeded. Aborting run.")
-
-            except Exception as e:
-                end_time = time.time()
-                latency = end_time - start_time
-                print(f"[{i+1}/{len(questions)}] model={model_id} error=\"{e}\" latency={latency:.2f}s")
-                sys.stdout.flush()
-                generated_results.append({
-                    "Question": prompt_content,
-                    "Model": model_id,
-                    "ModelAnswer": "Error",
-                    "entropy": None,
-                    "routing_decision": "Error",
-                    "contradiction_flag": False,
-                    "nli_scores": {},
-                    "factual_flag": False,
-                    "factual_score": None,
-                    "latency": latency
-                })
-                predictions_for_eval.append({"Question": prompt_content, "ModelAnswer": "Error"})
-                break # Break out of while True loop on other errors, move to next prompt
-
-    if generated_results:
-        generated_results_df = pd.DataFrame(generated_results)
+    telemetry.reset() # metrics exported for this run cover this run only, also when a sweep worker runs several
+
+    with startup_profiler.measure("ResponseCache"):
+        response_cache = ResponseCache(cache_path, max_bytes=RESPONSE_CACHE_MAX_BYTES, mode=cache_mode)
+
+    if similarity_cache is None and SIMILARITY_CACHE_ENABLED:
+        similarity_cache = SimilarityCache(SIMILARITY_CACHE_THRESHOLD, SIMILARITY_CACHE_NUM_PERM, SIMILARITY_CACHE_BANDS,
+                                           max_entries=SIMILARITY_CACHE_MAX_ENTRIES, audit_rate=SIMILARITY_CACHE_AUDIT_RATE)
+
+    # The NLI model is only loaded if some output is actually routed to fallback validation and not already in the NLI cache.
+    nli_cache = NLICache(NLI_CACHE_PATH, max_bytes=NLI_CACHE_MAX_BYTES, memory_entries=NLI_CACHE_MEMORY_ENTRIES, mode=NLI_CACHE_MODE)
+    nli_validator = build_nli_validator(backend=nli_backend, batch_size=nli_batch_size, cache=nli_cache, daemon_socket=NLI_DAEMON_SOCKET)
+
+    with startup_profiler.measure("Scheduler"):
+        scheduler = build_scheduler(strategy_config)
+
+    with startup_profiler.measure(f"dataset {dataset_name}"):
+        from eval.datasets.registry import open_dataset
+        prompt_rows = list(open_dataset(dataset_name, cache_dir=DATASET_CACHE_DIR).iter_prompts(stop=prompt_limit))
+    questions = [prompt for _, _, prompt in prompt_rows]
+    # Stable IDs (content hashes or the source's id column): a rerun resumes by ID, so reordering or appending source rows is safe.
+    prompt_ids = [pid for _, pid, _ in prompt_rows]
+
+    strategy_name = strategy_label(strategy_config)
+    metric_labels = {"dataset": dataset_name, "model": model_id, "strategy": strategy_name, "seed": seed}
+    # One exposition file per cell (the textfile collector reads them all), so concurrent sweep workers never overwrite each other.
+    prometheus_root, prometheus_ext = os.path.splitext(METRICS_PROMETHEUS_PATH)
+    prometheus_path = f"{prometheus_root}_{dataset_name}_{model_id}_{strategy_name}_seed{seed}{prometheus_ext}"
+
+    # Rows are appended to a partitioned Parquet store as they finish; a rerun resumes after the last flushed row group.
+    results_store = ResultsStore(results_root, dataset_name, model_id, strategy_name, seed, row_group_size=RESULTS_ROW_GROUP_SIZE)
+    if not resume:
+        results_store.clear()
+    completed = results_store.completed_ids() & set(prompt_ids)
+    if completed:
+        print(f"Resuming: {len(completed)} of {len(questions)} prompts already completed in {results_store.partition_dir}")
+    order = list(range(len(questions)))
+    stopper = None
+    if early_stopping and batch_mode:
+        print("Early stopping is ignored in batch mode: every prompt is submitted in one batch job.")
+    elif early_stopping:
+        from eval.answer_index import load_truthfulqa_index
+        from eval.early_stopping import EarlyStopping
+        stopper = EarlyStopping(**{"confidence": EARLY_STOPPING_CONFIDENCE, "min_samples": EARLY_STOPPING_MIN_SAMPLES, "margin": EARLY_STOPPING_MARGIN,
+                                   "alpha": EARLY_STOPPING_ALPHA, "beta": EARLY_STOPPING_BETA, **early_stopping})
+        truthfulqa_index = load_truthfulqa_index()
+        # A seeded shuffle of all prompt indices (not just the pending ones), so a resumed run continues the same order
+        # and the prompts answered before stopping are a random sample of the prompt_limit prompts.
+        random.Random(seed).shuffle(order)
+    pending_questions = [(i, questions[i]) for i in order if prompt_ids[i] not in completed]
+
+    # Metrics are accumulated per result and flushed periodically; rows of a resumed run are counted once up front.
+    from eval.online_metrics import OnlineMetrics
+    online_metrics = OnlineMetrics(ONLINE_METRICS_COMPRESSION)
+    if completed:
+        stored = results_store.read_table(columns=["prompt_id", "Question", "ModelAnswer", "routing_decision", "contradiction_flag", "entropy", "latency"]).to_pylist()
+        stored = [row for row in stored if row["prompt_id"] in completed] # error rows are retried below
+        online_metrics.update_many(stored)
+        if stopper is not None:
+            for row in stored:
+                stopper.update(row, truthfulqa_index.score_one(row["Question"], row["ModelAnswer"])[0])
+
+    def _record(row: Dict[str, Any]):
+        with telemetry.stage("result_write"):
+            results_store.append(row)
+        online_metrics.update(row)
+        online_metrics.maybe_flush(ONLINE_METRICS_PATH, ONLINE_METRICS_FLUSH_INTERVAL_SECONDS, **metric_labels)
+        # Error rows are retried on resume, so they are not evidence about the cell.
+        if stopper is not None and not stopper.stopped and row["routing_decision"] != "Error":
+            stopper.update(row, truthfulqa_index.score_one(row["Question"], row["ModelAnswer"])[0])
+            if stopper.stopped:
+                print(f"Early stopping after {stopper.counts['n']} of {len(questions)} prompts: {stopper.stop_reason}")
+
+    def _route(item: Dict[str, Any]) -> bool:
+        # Rate-limited requests were already retried; what still fails becomes an error row, except a replay-mode cache miss.
+        if item["error"] is not None:
+            if isinstance(item["error"], CacheMissError):
+                raise item["error"]
+            return False
+        item["output"] = _route_output(item["output"], scheduler)
+        return item["output"].get("routing_decision") == "fallback_validation"
+
+    def _write(item: Dict[str, Any]):
+        i, prompt_content, latency = item["index"], item["prompt"], item["latency"]
+        telemetry.observe("request_latency_seconds", latency)
+        if item["error"] is not None:
+            telemetry.increment("errors")
+            print(f"[{i+1}/{len(questions)}] model={model_id} error=\"{item['error']}\" latency={latency:.2f}s")
+            _record({**_error_row(prompt_content, model_id, latency), "prompt_index": i, "prompt_id": prompt_ids[i]})
+        else:
+            all_results = item["output"]
+            all_results["latency"] = latency
+            if all_results.get("time_to_routing") is not None:
+                telemetry.observe("time_to_routing_seconds", all_results["time_to_routing"])
+            print(f"[{i+1}/{len(questions)}] model={model_id} entropy={all_results.get('entropy', 'None')} routing={all_results.get('routing_decision', 'N/A')} latency={latency:.2f}s{item['note']}")
+            _record({**_result_row(prompt_content, model_id, all_results, latency), "prompt_index": i, "prompt_id": prompt_ids[i],
+                     **logprob_columns(all_results.get("completion"))})
+        sys.stdout.flush()
+        telemetry.maybe_export(METRICS_JSONL_PATH, prometheus_path, METRICS_EXPORT_INTERVAL_SECONDS, **metric_labels)
+
+    # Generation feeds routing (inline), a batching NLI thread and a writer thread through bounded queues,
+    # so NLI and result writes overlap with the requests still in flight.
+    pipeline = StagedPipeline(_route, lambda items: _validate_batch(items, nli_validator), _write,
+                              queue_size=PIPELINE_QUEUE_SIZE, batch_size=nli_batch_size, max_wait_seconds=PIPELINE_NLI_MAX_WAIT_SECONDS)
+    cascade_executor = None
+    nli_prepare_pool = None
+    try:
+        if batch_mode:
+            if async_mode or streaming or cascade:
+                print("Batch mode generates every prompt in one batch job; async_mode, streaming and cascade are ignored.")
+            client = LangDBClient(api_key=LANGDB_API_KEY, project_id=LANGDB_PROJECT_ID, cache=response_cache)
+            generator = NeuralGenerator(langdb_client=client, similarity_cache=similarity_cache, features=scheduler.required_features())
+            if batch_backend is None:
+                batch_backend = build_batch_backend(BATCH_BACKEND, local_root=BATCH_LOCAL_ROOT, completion_window=BATCH_COMPLETION_WINDOW)
+            runner = BatchJobRunner(batch_backend, generator, BATCH_WORK_DIR, poll_interval=BATCH_POLL_INTERVAL_SECONDS, timeout=BATCH_TIMEOUT_SECONDS)
+            requests = [_generation_request(prompt_content, model_id, seed) for _, prompt_content in pending_questions]
+            for k, output, error, latency in runner.run(requests):
+                i, prompt_content = pending_questions[k]
+                note = f" batch_job={runner.jobs[-1]['job_id']}" if runner.jobs else ""
+                pipeline.submit({"index": i, "prompt": prompt_content, "output": output, "error": error, "latency": latency, "note": note})
+        elif async_mode:
+            if cascade:
+                print("Cascade escalation runs in the sequential path only; ignored with async_mode.")
+
+            async def _on_result(generation: GenerationResult):
+                i, prompt_content = pending_questions[generation.index]
+                note = f" queue_wait={generation.queue_wait:.2f}s" + (f" hedged_to={generation.hedged_model}" if generation.hedged_model else "")
+                output = generation.output
+                if output is not None and generation.hedged_model:
+                    output = {**output, "answered_by": generation.hedged_model} # the hedge's backup model answered, not model_id
+                await pipeline.asubmit({"index": i, "prompt": prompt_content, "output": output, "error": generation.error,
+                                        "latency": generation.latency, "note": note})
+
+            if rate_limiters is None:
+                rate_limiters = ModelRateLimiters(requests_per_second, tokens_per_minute, overrides=rate_limits)
+            _generate_async(pending_questions, model_id, seed, max_in_flight, rate_limiters, response_cache, similarity_cache, on_result=_on_result,
+                            features=scheduler.required_features(), stop_when=(lambda: stopper.stopped) if stopper is not None else None)
+        else:
+            with startup_profiler.measure("NeuralGenerator"):
+                client = LangDBClient(api_key=LANGDB_API_KEY, project_id=LANGDB_PROJECT_ID, cache=response_cache)
+                generator = NeuralGenerator(langdb_client=client, similarity_cache=similarity_cache, features=scheduler.required_features())
+            fallback_paced = False
+            if streaming and not cascade:
+                nli_prepare_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="nli-prepare")
+
+                def _prepare_nli(partial_output: Dict[str, Any]):
+                    # Failures here are not errors: validate_batch does the same work again once the answer is complete.
+                    if partial_output.get("routing_decision") == "fallback_validation":
+                        telemetry.increment("nli_prepared_early")
+                        nli_prepare_pool.submit(nli_validator.prepare, [partial_output])
+            if cascade:
+                def _pace_fallback(fallback_request: Dict[str, Any]):
+                    # A cached primary answer skipped the sleeps below; a live fallback call still gets them.
+                    nonlocal fallback_paced
+                    if cached and not generator.is_cached(**fallback_request):
+                        time.sleep(RATE_LIMIT_SECONDS)
+                        fallback_paced = True
+
+                cascade_budget = CascadeBudget(CASCADE_MAX_COST, CASCADE_MAX_FALLBACK_TOKENS, CASCADE_MAX_REQUEST_LATENCY_SECONDS, CASCADE_SPECULATIVE_RESERVE)
+                cascade_executor = CascadeExecutor(generator, scheduler, cascade_budget, speculative=streaming, prices=MODEL_PRICES,
+                                                   before_fallback=_pace_fallback)
+
+            rate_limit_retries = 0
+            for i, prompt_content in pending_questions:
+                if stopper is not None and stopper.stopped:
+                    break
+                generation_request = _generation_request(prompt_content, model_id, seed)
+                # Cached responses cost no network time, so they skip the sleeps.
+                cached = generator.is_cached(**generation_request)
+
+                while True:
+                    start_time = time.time()
+                    fallback_paced = False
+                    try:
+                        if not cached:
+                            time.sleep(RATE_LIMIT_SECONDS)
+
+                        cascade_result = None
+                        if cascade_executor is not None:
+                            # Streams bypass the response cache, so cached prompts are not run speculatively.
+                            cascade_result = cascade_executor.run(generation_request, speculative=streaming and not cached)
+                            accounting = cascade_result["accounting"]
+                            # The row describes the stored answer (its features, logprobs and NLI check); the routing is the primary answer's.
+                            primary_output = cascade_result["primary_output"]
+                            neural_output = {**cascade_result["output"], "primary_routing": cascade_result["routing"],
+                                             "early_routing": primary_output.get("early_routing"), "time_to_routing": primary_output.get("time_to_routing"),
+                                             "answered_by": accounting["fallback_model"] if accounting["winner"] == "fallback" else model_id,
+                                             "cascade_fallback_model": accounting["fallback_model"]}
+                        elif streaming and not cached:
+                            # The stream runs on, so the stored, routed and NLI-checked answer is complete; the early decision
+                            # only gets the NLI validator ready (model load, premise tokens) while the answer is still streaming.
+                            neural_output = generator.generate_stream(scheduler=scheduler, abandon_on_early_routing=False, on_early_routing=_prepare_nli,
+                                                                      **generation_request)
+                        else:
+                            neural_output = generator.generate(**generation_request)
+                        if not cached or fallback_paced:
+                            time.sleep(1) # Latency buffer
+                        end_time = time.time()
+                        latency = end_time - start_time
+
+                        rate_limit_retries = 0 # Reset on successful call
+
+                        item = {"index": i, "prompt": prompt_content, "output": neural_output, "error": None, "latency": latency, "note": ""}
+                        if neural_output.get("routing_tokens") is not None:
+                            item["note"] = f" routed_after_tokens={neural_output['routing_tokens']}"
+                        if cascade_result is not None:
+                            item["note"] = f" answered_by={neural_output['answered_by']}" + (f" escalation_skipped={accounting['skipped']}" if accounting["skipped"] else "")
+                        break # Break out of while True loop, move to next prompt
+
+                    except CacheMissError:
+                        raise
+
+                    except Exception as e:
+                        if is_rate_limit_error(e) and rate_limit_retries < LANGDB_MAX_RATE_LIMIT_RETRIES:
+                            backoff = rate_limit_backoff(e, rate_limit_retries)
+                            rate_limit_retries += 1
+                            telemetry.increment("rate_limit_retries")
+                            print(f"[{i+1}/{len(questions)}] model={model_id} rate limited, retry {rate_limit_retries} in {backoff:.1f}s")
+                            time.sleep(backoff)
+                            continue
+                        rate_limit_retries = 0
+                        end_time = time.time()
+                        latency = end_time - start_time
+                        item = {"index": i, "prompt": prompt_content, "output": None, "error": e, "latency": latency, "note": ""}
+                        break # Break out of while True loop on other errors, move to next prompt
+
+                # Routes inline; NLI and the write happen while the next prompt is being generated.
+                pipeline.submit(item)
+        pipeline.close()
+        if nli_prepare_pool is not None:
+            nli_prepare_pool.shutdown(wait=True)
+    except BaseException:
+        if nli_prepare_pool is not None:
+            nli_prepare_pool.shutdown(wait=False)
+        pipeline.close(abort=True)
+        results_store.close()
+        raise
+    print(f"Pipeline stages: {pipeline.stats()}")
+    early_stopping_summary = {}
+    if stopper is not None:
+        early_stopping_summary = {"early_stopped": stopper.stopped, "stop_reason": stopper.stop_reason}
+        print(f"Early stopping: {stopper.summary()}")
+
+    if response_cache.enabled:
+        print(f"Response cache: {response_cache.stats()}")
+        response_cache.close()
+    cascade_summary = {}
+    if cascade_executor is not None:
+        cascade_executor.close()
+        cascade_summary = {f"cascade_{name}": value for name, value in cascade_executor.summary().items()}
+        print(f"Cascade: {cascade_summary}")
+        if cascade_executor.records:
+            os.makedirs(os.path.dirname(output_csv_path) or ".", exist_ok=True)
+            lazy_import("pandas").DataFrame(cascade_executor.accounting()).to_csv(os.path.splitext(output_csv_path)[0] + "_cascade.csv", index=False)
+    nli_client = nli_validator.validator if isinstance(nli_validator, CachedNLIValidator) else nli_validator
+    if isinstance(nli_client, NLIDaemonClient):
+        if nli_client.counts["daemon_items"] or nli_client.counts["fallback_items"]:
+            print(f"NLI daemon: {nli_client.stats()}")
+        nli_client.close()
+    if nli_cache.enabled:
+        print(f"NLI cache: {nli_cache.stats()}")
+        nli_cache.close()
+    if similarity_cache is not None:
+        print(f"Similarity cache: {similarity_cache.summary()}")
+        if SIMILARITY_CACHE_AUDIT_PATH:
+            os.makedirs(os.path.dirname(SIMILARITY_CACHE_AUDIT_PATH) or ".", exist_ok=True)
+            similarity_cache.write_audit_log(SIMILARITY_CACHE_AUDIT_PATH)
+
+    from eval.evaluate import evaluate_predictions
+
+    with telemetry.stage("result_write"):
+        results_store.close()
+    # Only the requested prompts; the logprob columns stay in the store for offline re-routing and are not read here.
+    results_df = results_store.read_table(columns=[name for name in results_schema().names if name not in ("token_logprobs", "top_logprobs")]).to_pandas()
+    # Rows are matched to the requested prompts by ID and put in their current source order.
+    position = {pid: i for i, pid in enumerate(prompt_ids)}
+    results_df = results_df[results_df["prompt_id"].isin(position)]
+    results_df = results_df.assign(prompt_index=results_df["prompt_id"].map(position)).sort_values("prompt_index")
+
+    metrics = {}
+    if len(results_df):
         os.makedirs(os.path.dirname(output_csv_path), exist_ok=True)
-        generated_results_df.to_csv(output_csv_path, index=False)
-        print(f"Full pipeline results saved to {output_csv_path}")
+        with telemetry.stage("result_write"):
+            results_df.drop(columns=["prompt_index", "prompt_id"]).to_csv(output_csv_path, index=False)
+        print(f"Full pipeline results saved to {output_csv_path} (row groups in {results_store.partition_dir})")
 
         print("\n--- Computed Metrics ---")
-        metrics = compute_all_metrics(generated_results_df)
+        metrics = online_metrics.metrics()
         for metric_name, value in metrics.items():
             print(f"{metric_name}: {value:.4f}")
         print("------------------------")
@@ -149,57 +456,27 @@ def run_full_pipeline(dataset_name: str, strategy_config: Dict[str, Any], seed:
         print("No full pipeline results to save.")
 
     predictions_path = f"eval_results/predictions_{dataset_name}_{model_id}_{strategy_name}_seed{seed}.csv"
-    predictions_df = pd.DataFrame(predictions_for_eval)
-    predictions_df.to_csv(predictions_path, index=False)
+    predictions_df = results_df[["Question", "ModelAnswer"]]
+    with telemetry.stage("result_write"):
+        predictions_df.to_csv(predictions_path, index=False)
     print(f"Predictions for evaluation saved to {predictions_path}")
 
+    online_metrics.flush(ONLINE_METRICS_PATH, **metric_labels)
+    telemetry.export_jsonl(METRICS_JSONL_PATH, **metric_labels)
+    telemetry.export_prometheus(prometheus_path, **metric_labels)
+    print(f"Metrics exported to {METRICS_JSONL_PATH}, {prometheus_path} and {ONLINE_METRICS_PATH}")
+
     print("\n--- Running TruthfulQA Evaluation ---")
-    evaluation_summary = evaluate_predictions(predictions_path, f"eval_results/eval_summary_{dataset_name}_{model_id}_{strategy_name}_seed{seed}.csv")
+    evaluation_summary = evaluate_predictions(output_results_path=f"eval_results/eval_summary_{dataset_name}_{model_id}_{strategy_name}_seed{seed}.csv", predictions_df=predictions_df)
     print("-------------------------------------")
 
     print("\n--- TruthfulQA Accuracy ---")
-    print(f"TruthfulQA Accuracy: {evaluation_summary.get("accuracy", 0.0):.2f}")
+    print(f"TruthfulQA Accuracy: {evaluation_summary.get('accuracy', 0.0):.2f}")
     print("---------------------------")
 
-if __name__ == "__main__":
-    import sys
-    selected_model = "gpt-4.1-nano"
-    dataset_name = "TruthfulQA"
-    strategy_config = {"HighEntropyStrategy": {"threshold": 0.5}}
-    seed = 42
-    prompt_limit = 20 # Default prompt limit
-
-    if len(sys.argv) > 1:
-        selected_model = sys.argv[1]
-    if len(sys.argv) > 2:
-        dataset_name = sys.argv[2]
-    if len(sys.argv) > 3:
-        strategy_name_arg = sys.argv[3]
-        if strategy_name_arg == "HighEntropyStrategy":
-            threshold = float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
-            strategy_config = {"HighEntropyStrategy": {"threshold": threshold}}
-        elif strategy_name_arg == "DirectResponseStrategy":
-            strategy_config = {"DirectResponseStrategy": {}}
-        else:
-            print(f"Warning: Unknown strategy \'{strategy_name_arg}\'. Using default HighEntropyStrategy.")
-    if len(sys.argv) > 5:
-        seed = int(sys.argv[5])
-    if len(sys.argv) > 6:
-        prompt_limit = int(sys.argv[6]) # Read prompt limit from CLI
-
-    available_models = [
-        "gpt-4.1-nano",
-        "gpt-4o-mini",
-        "claude-3-haiku-20240307",
-        "gemini-2.0-flash"
-    ]
-    if selected_model not in available_models:
-        print(f"Warning: Unknown model \'{selected_model}\'. Using default model: gpt-4.1-nano")
-        selected_model = "gpt-4.1-nano"
-
-    run_full_pipeline(dataset_name=dataset_name, strategy_config=strategy_config, seed=seed, model_id=selected_model, prompt_limit=prompt_limit)
+    return {**metrics, **evaluation_summary, **cascade_summary, **early_stopping_summary, "n_prompts": len(results_df)}
 
 def run_evaluation(model_id: str = "gpt-4.1-nano", output_csv_path: str = "evaluation_results.csv"):
     print("Warning: run_evaluation is deprecated. Please use run_full_pipeline directly.")
     run_full_pipeline(dataset_name="TruthfulQA", strategy_config={
-                      "HighEntropyStrategy": {"threshold": 0.5}}, seed=42, model_id=model_id, prompt_limit=20)
\ No newline at end of file
+                      "HighEntropyStrategy": {"threshold": 0.5}}, seed=42, model_id=model_id, prompt_limit=20, output_csv_path=output_csv_path)
\ No newline at end of file
@@ -1,11 +1,16 @@
 import math
+from ..completion import Completion
+from ..startup_profiler import lazy_import
 
 class EntropyExtractor:
     def compute_entropy(self, raw_response: dict) -> float:
         """
         Compute the Shannon entropy averaged over all generated tokens.
         Formula: H = -Σ p_i * log(p_i)
+        Accepts a Completion or a response dict.
         """
+        if isinstance(raw_response, Completion):
+            return self._completion_entropy(raw_response)
         logprobs = raw_response.get("choices", [{}])[0].get("logprobs")
         if not logprobs:
             return None
@@ -26,3 +31,125 @@ class EntropyExtractor:
                     total_entropy += -p * math.log(p)
         
         return total_entropy / len(token_logprobs_content) if token_logprobs_content else None
+
+    @staticmethod
+    def _completion_entropy(completion: Completion) -> float:
+        np = lazy_import("numpy")
+        if not completion.n_tokens:
+            return None
+        logprobs = completion.logprobs
+        p = np.exp(logprobs)
+        # Missing (NaN) logprobs contribute nothing but still count as tokens, as for dicts.
+        terms = np.where(p > 0, -p * logprobs, 0.0)
+        return float(np.nansum(terms) / completion.n_tokens)
+
+    def compute_entropy_batch(self, raw_responses: list, top_k: int = None) -> dict:
+        """
+        Vectorized entropy features for many responses at once.
+
+        Logprobs are packed into padded [n_responses, max_tokens] and
+        [n_responses, max_tokens, k] arrays, then reduced in a single pass.
+        Returns a dict of float arrays with one value per response (NaN when
+        the response has no logprobs):
+            entropy:           same value as compute_entropy (sampled-token -p*log(p), averaged)
+            topk_entropy:      mean per-token entropy of the renormalized top-k distribution
+            varentropy:        mean per-token variance of -log(q) under that distribution
+            max_token_entropy: largest per-token top-k entropy
+            n_tokens:          number of generated tokens
+        """
+        sampled, top, lengths = self.pack_logprobs(raw_responses, top_k)
+        return self.compute_entropy_arrays(sampled, top, lengths)
+
+    @staticmethod
+    def pack_logprobs(raw_responses: list, top_k: int = None):
+        """
+        Packs response logprobs into padded arrays: sampled [n, max_tokens] and
+        top [n, max_tokens, k], both -inf where absent, plus per-response lengths.
+        Completions are copied from their buffers; dicts are walked once.
+        """
+        np = lazy_import("numpy")
+        per_response = [EntropyExtractor._response_arrays(raw_response) for raw_response in raw_responses]
+
+        n_responses = len(per_response)
+        lengths = np.array([len(logprobs) for logprobs, _ in per_response], dtype=np.int64)
+        max_len = int(lengths.max()) if n_responses else 0
+        if top_k is None:
+            top_k = max((top.shape[1] for _, top in per_response), default=0)
+
+        sampled = np.full((n_responses, max_len), -np.inf)
+        top = np.full((n_responses, max_len, top_k), -np.inf)
+        for i, (response_logprobs, response_top) in enumerate(per_response):
+            n_tokens = len(response_logprobs)
+            if not n_tokens:
+                continue
+            # Missing sampled logprobs are stored as -inf, which contributes 0 entropy.
+            sampled[i, :n_tokens] = np.nan_to_num(response_logprobs, nan=-np.inf)
+            k = min(top_k, response_top.shape[1])
+            top[i, :n_tokens, :k] = response_top[:, :k]
+
+        return sampled, top, lengths
+
+    @staticmethod
+    def _response_arrays(raw_response):
+        """(sampled logprobs [n_tokens], top-k logprobs [n_tokens, k]) of a Completion or response dict."""
+        if isinstance(raw_response, Completion):
+            return raw_response.logprobs, raw_response.top_logprobs
+        completion = Completion.from_dict(raw_response)
+        return completion.logprobs, completion.top_logprobs
+
+    @staticmethod
+    def compute_entropy_arrays(sampled, top, lengths) -> dict:
+        """Entropy features from arrays produced by pack_logprobs (see compute_entropy_batch)."""
+        np = lazy_import("numpy")
+        token_mask = np.arange(sampled.shape[1])[None, :] < lengths[:, None]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            # Sampled-token term; padding and missing logprobs contribute 0, as in compute_entropy.
+            p = np.exp(sampled)
+            sampled_terms = np.where(p > 0, -p * sampled, 0.0)
+            entropy = np.where(lengths > 0, sampled_terms.sum(axis=1) / lengths, np.nan)
+
+            # Renormalize the top-k logprobs per token (log-softmax) and take moments of -log(q).
+            has_top = np.isfinite(top).any(axis=2) & token_mask
+            top_max = np.where(has_top, top.max(axis=2, initial=-np.inf), 0.0)
+            log_norm = top_max + np.log(np.exp(top - top_max[..., None]).sum(axis=2))
+            log_q = top - log_norm[..., None]
+            q = np.exp(log_q)
+            finite = q > 0
+            token_entropy = -np.where(finite, q * log_q, 0.0).sum(axis=2)
+            token_second_moment = np.where(finite, q * log_q ** 2, 0.0).sum(axis=2)
+            token_varentropy = token_second_moment - token_entropy ** 2
+
+            n_top = has_top.sum(axis=1)
+            topk_entropy = np.where(n_top > 0, np.where(has_top, token_entropy, 0.0).sum(axis=1) / n_top, np.nan)
+            varentropy = np.where(n_top > 0, np.where(has_top, token_varentropy, 0.0).sum(axis=1) / n_top, np.nan)
+            max_token_entropy = np.where(n_top > 0, np.where(has_top, token_entropy, -np.inf).max(axis=1, initial=-np.inf), np.nan)
+
+        return {
+            "entropy": entropy,
+            "topk_entropy": topk_entropy,
+            "varentropy": varentropy,
+            "max_token_entropy": max_token_entropy,
+            "n_tokens": lengths
+        }
+
+class RunningEntropy:
+    """
+    Incremental version of EntropyExtractor.compute_entropy for streamed logprobs.
+    The mean is updated per token, so it can be checked before the completion ends.
+    """
+    def __init__(self):
+        self.total_entropy = 0.0
+        self.n_tokens = 0
+
+    def update(self, token_logprobs_content: list):
+        for token_data in token_logprobs_content:
+            logprob = token_data.get("logprob")
+            if logprob is not None:
+                p = math.exp(logprob)
+                if p > 0:
+                    self.total_entropy += -p * math.log(p)
+            self.n_tokens += 1
+
+    @property
+    def mean(self) -> float:
+        return self.total_entropy / self.n_tokens if self.n_tokens else None
@@ -0,0 +1,177 @@
+from functools import cached_property
+from typing import Any, Callable, Dict, Iterable, List, Tuple
+
+from ..completion import Completion
+from ..startup_profiler import lazy_import
+
+# What an extractor may read from a Completion: the sampled-token logprob array,
+# the top-k logprob matrix, and message fields (text, tool calls, finish reason).
+FEATURE_INPUTS = ("logprobs", "top_logprobs", "message")
+# Always extracted by NeuralGenerator: result rows, caches and early routing rely on them.
+BASE_FEATURES = ("entropy", "tool_flag")
+SEGMENTS = 4
+
+class Feature:
+    __slots__ = ("name", "inputs", "compute")
+
+    def __init__(self, name: str, inputs: Tuple[str, ...], compute: Callable[["CompletionView"], Any]):
+        self.name = name
+        self.inputs = inputs
+        self.compute = compute
+
+FEATURES: Dict[str, Feature] = {}
+
+def register_feature(name: str, inputs: Iterable[str]):
+    """
+    Registers compute(view) as feature name. inputs declares what it reads (see
+    FEATURE_INPUTS); a feature whose logprob inputs are missing from a completion
+    is None without being computed.
+    """
+    inputs = tuple(inputs)
+    unknown = set(inputs) - set(FEATURE_INPUTS)
+    if unknown:
+        raise ValueError(f"Unknown feature inputs {sorted(unknown)}. Expected some of {FEATURE_INPUTS}.")
+
+    def decorator(compute: Callable[["CompletionView"], Any]):
+        FEATURES[name] = Feature(name, inputs, compute)
+        return compute
+    return decorator
+
+class CompletionView:
+    """
+    One completion as seen by the extractors of a plan. Intermediates (token
+    probabilities, the renormalized top-k distribution, per-token entropies) are
+    computed on first use and shared, so the arrays are walked once per plan
+    rather than once per feature.
+    """
+    def __init__(self, completion: Completion):
+        self.completion = completion
+        self.n_tokens = completion.n_tokens
+
+    @cached_property
+    def sampled_terms(self):
+        """-p * log(p) of every sampled token; 0 for missing (NaN) logprobs, as in EntropyExtractor.compute_entropy."""
+        np = lazy_import("numpy")
+        logprobs = self.completion.logprobs
+        p = np.exp(logprobs)
+        return np.where(p > 0, -p * logprobs, 0.0)
+
+    @cached_property
+    def has_top(self):
+        np = lazy_import("numpy")
+        return np.isfinite(self.completion.top_logprobs).any(axis=1)
+
+    @cached_property
+    def log_q(self):
+        """Top-k logprobs renormalized per token (log-softmax); -inf rows stay -inf."""
+        np = lazy_import("numpy")
+        top = self.completion.top_logprobs
+        with np.errstate(divide="ignore", invalid="ignore"):
+            top_max = np.where(self.has_top, top.max(axis=1, initial=-np.inf), 0.0)
+            log_norm = top_max + np.log(np.exp(top - top_max[:, None]).sum(axis=1))
+            return top - log_norm[:, None]
+
+    @cached_property
+    def q(self):
+        return lazy_import("numpy").exp(self.log_q)
+
+    @cached_property
+    def token_entropy(self):
+        np = lazy_import("numpy")
+        with np.errstate(invalid="ignore"):
+            return -np.where(self.q > 0, self.q * self.log_q, 0.0).sum(axis=1)
+
+    @cached_property
+    def token_varentropy(self):
+        np = lazy_import("numpy")
+        with np.errstate(invalid="ignore"):
+            second_moment = np.where(self.q > 0, self.q * self.log_q ** 2, 0.0).sum(axis=1)
+        return second_moment - self.token_entropy ** 2
+
+    @cached_property
+    def segment_entropy(self) -> List[float]:
+        """Mean sampled-token entropy of SEGMENTS consecutive, equally long parts of the answer (None for empty parts)."""
+        np = lazy_import("numpy")
+        return [float(segment.mean()) if len(segment) else None for segment in np.array_split(self.sampled_terms, SEGMENTS)]
+
+    @cached_property
+    def sorted_top(self):
+        """Top-k logprobs per token in descending order."""
+        np = lazy_import("numpy")
+        return -np.sort(-self.completion.top_logprobs, axis=1)
+
+    def has(self, inputs: Tuple[str, ...]) -> bool:
+        if "logprobs" in inputs and not self.n_tokens:
+            return False
+        if "top_logprobs" in inputs and not self.has_top.any():
+            return False
+        return True
+
+class FeaturePlan:
+    """The features to extract from every completion, computed together over one CompletionView."""
+    def __init__(self, names: Iterable[str]):
+        names = list(dict.fromkeys(names))
+        unknown = [name for name in names if name not in FEATURES]
+        if unknown:
+            raise ValueError(f"Unknown features {unknown}. Registered: {sorted(FEATURES)}.")
+        self.features: List[Feature] = [FEATURES[name] for name in names]
+
+    @property
+    def names(self) -> List[str]:
+        return [feature.name for feature in self.features]
+
+    @property
+    def inputs(self) -> set:
+        return {name for feature in self.features for name in feature.inputs}
+
+    def extract(self, completion: Completion) -> Dict[str, Any]:
+        if not isinstance(completion, Completion):
+            completion = Completion.from_dict(completion)
+        view = CompletionView(completion)
+        return {feature.name: feature.compute(view) if view.has(feature.inputs) else None for feature in self.features}
+
+def _mean_over_top(view: CompletionView, token_values) -> float:
+    np = lazy_import("numpy")
+    return float(np.where(view.has_top, token_values, 0.0).sum() / view.has_top.sum())
+
+@register_feature("entropy", inputs=["logprobs"])
+def _entropy(view: CompletionView) -> float:
+    return float(view.sampled_terms.sum() / view.n_tokens)
+
+@register_feature("tool_flag", inputs=["message"])
+def _tool_flag(view: CompletionView) -> bool:
+    return view.completion.tool_calls is not None
+
+@register_feature("n_tokens", inputs=[])
+def _n_tokens(view: CompletionView) -> int:
+    return view.n_tokens
+
+@register_feature("topk_entropy", inputs=["top_logprobs"])
+def _topk_entropy(view: CompletionView) -> float:
+    return _mean_over_top(view, view.token_entropy)
+
+@register_feature("varentropy", inputs=["top_logprobs"])
+def _varentropy(view: CompletionView) -> float:
+    return _mean_over_top(view, view.token_varentropy)
+
+@register_feature("max_token_entropy", inputs=["top_logprobs"])
+def _max_token_entropy(view: CompletionView) -> float:
+    np = lazy_import("numpy")
+    return float(np.where(view.has_top, view.token_entropy, -np.inf).max())
+
+@register_feature("top_margin", inputs=["top_logprobs"])
+def _top_margin(view: CompletionView) -> float:
+    """Mean probability gap between the two most likely alternatives per token; a missing second alternative counts as 0."""
+    np = lazy_import("numpy")
+    probabilities = np.exp(view.sorted_top[:, :2])
+    if probabilities.shape[1] < 2:
+        return float(probabilities[view.has_top, 0].mean())
+    return float((probabilities[:, 0] - probabilities[:, 1])[view.has_top].mean())
+
+@register_feature("segment_entropy", inputs=["logprobs"])
+def _segment_entropy(view: CompletionView) -> List[float]:
+    return view.segment_entropy
+
+@register_feature("max_segment_entropy", inputs=["logprobs"])
+def _max_segment_entropy(view: CompletionView) -> float:
+    return max(value for value in view.segment_entropy if value is not None)
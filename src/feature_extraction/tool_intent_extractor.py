@@ -1,8 +1,12 @@
+from ..completion import Completion, TOOL_KEYS
+
 class ToolIntentExtractor:
     def __init__(self):
-        self.tool_keys = ["tool_calls", "function_call", "tool_use"]
+        self.tool_keys = list(TOOL_KEYS)
 
     def extract_tool_flag(self, raw_response: dict) -> bool:
+        if isinstance(raw_response, Completion):
+            return raw_response.tool_calls is not None
         if not raw_response or not raw_response.get("choices"):
             return False
         
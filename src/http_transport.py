@@ -0,0 +1,75 @@
+import asyncio
+import atexit
+import importlib.util
+import os
+from typing import Dict
+
+from .config import LANGDB_HTTP_MAX_CONNECTIONS, LANGDB_HTTP_MAX_KEEPALIVE, LANGDB_HTTP_KEEPALIVE_EXPIRY
+from .config import LANGDB_HTTP_CONNECT_TIMEOUT, LANGDB_HTTP_READ_TIMEOUT, LANGDB_HTTP2
+from .startup_profiler import lazy_import
+
+class HTTPPool:
+    """
+    Keep-alive connection pools shared by every LangDB client of a process.
+
+    The sync pool is one httpx.Client per process. httpx.AsyncClient is bound to
+    the event loop it first runs on, so there is one async pool per loop,
+    reference-counted by acquire_async / release_async and closed with its last user.
+    """
+    def __init__(self, max_connections: int = LANGDB_HTTP_MAX_CONNECTIONS, max_keepalive_connections: int = LANGDB_HTTP_MAX_KEEPALIVE,
+                 keepalive_expiry: float = LANGDB_HTTP_KEEPALIVE_EXPIRY, connect_timeout: float = LANGDB_HTTP_CONNECT_TIMEOUT,
+                 read_timeout: float = LANGDB_HTTP_READ_TIMEOUT, http2: bool = LANGDB_HTTP2):
+        if http2 and importlib.util.find_spec("h2") is None:
+            raise ImportError("LANGDB_HTTP2 requires the h2 package: pip install 'httpx[http2]'")
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.keepalive_expiry = keepalive_expiry
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.http2 = http2
+        self._client = None
+        self._client_pid = None
+        self._async_clients: Dict[asyncio.AbstractEventLoop, list] = {} # loop -> [client, users]
+
+    def _client_options(self) -> dict:
+        httpx = lazy_import("httpx")
+        return {
+            "limits": httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_keepalive_connections,
+                                   keepalive_expiry=self.keepalive_expiry),
+            "timeout": httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            "http2": self.http2,
+            "follow_redirects": True
+        }
+
+    def client(self):
+        # Pools must not be shared across fork, so each process builds its own.
+        if self._client is None or self._client_pid != os.getpid():
+            self._client = lazy_import("httpx").Client(**self._client_options())
+            self._client_pid = os.getpid()
+        return self._client
+
+    def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            entry = self._async_clients[loop] = [lazy_import("httpx").AsyncClient(**self._client_options()), 0]
+        entry[1] += 1
+        return entry[0]
+
+    async def release_async(self):
+        loop = asyncio.get_running_loop()
+        entry = self._async_clients.get(loop)
+        if entry is None:
+            return
+        entry[1] -= 1
+        if entry[1] <= 0:
+            del self._async_clients[loop]
+            await entry[0].aclose()
+
+    def close(self):
+        if self._client is not None and self._client_pid == os.getpid():
+            self._client.close()
+        self._client = None
+
+http_pool = HTTPPool()
+atexit.register(http_pool.close)
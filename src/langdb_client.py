@@ -1,28 +1,139 @@
-import requests
-import json
-from openai import OpenAI
-from .config import LANGDB_API_KEY, LANGDB_PROJECT_ID
+from .completion import Completion
+from .config import LANGDB_API_KEY, LANGDB_PROJECT_ID, LANGDB_BASE_URL, LANGDB_KEEP_RAW_RESPONSES
+from .http_transport import HTTPPool, http_pool
+from .response_cache import ResponseCache, CacheMissError
+from .startup_profiler import lazy_import
+from .telemetry import telemetry
+
+def _build_headers(project_id: str, seed: int = None, prompt_cache_key: str = None) -> dict:
+    headers = {"x-project-id": project_id}
+    if seed is not None:
+        headers["x-seed"] = str(seed)
+    if prompt_cache_key is not None:
+        headers["x-prompt-cache-key"] = prompt_cache_key
+    return headers
+
+def _cache_lookup(cache: ResponseCache, endpoint: str, model: str, messages: list, seed: int, kwargs: dict, keep_raw: bool = False):
+    """Returns (cache_key, cached Completion or None); cache_key is None when the request is not cacheable."""
+    if cache is None or not cache.enabled or kwargs.get("stream"):
+        return None, None
+    cache_key = ResponseCache.make_key(model=model, messages=messages, seed=seed, endpoint=endpoint, **kwargs)
+    cached_response = cache.get(cache_key)
+    telemetry.increment("response_cache_misses" if cached_response is None else "response_cache_hits")
+    if cached_response is None and cache.replay_only:
+        raise CacheMissError(f"No cached response for model={model} (key {cache_key[:12]}) in replay-only mode.")
+    return cache_key, Completion.from_dict(cached_response, keep_raw=keep_raw) if cached_response is not None else None
+
+def _to_completion(response, cache: ResponseCache, cache_key: str, keep_raw: bool) -> Completion:
+    with telemetry.stage("to_completion"):
+        completion = Completion.from_openai(response, keep_raw=keep_raw)
+    if cache_key is not None:
+        # Full dumps are cached only when they were kept anyway; otherwise the compact form.
+        cache.put(cache_key, completion.raw if completion.raw is not None else completion.to_dict())
+    return completion
 
 class LangDBClient:
-    def __init__(self, api_key: str, project_id: str):
-        self.client = OpenAI(
-            base_url="https://api.us-east-1.langdb.ai",
-            api_key=api_key,
-            max_retries=0
-        )
+    def __init__(self, api_key: str, project_id: str, cache: ResponseCache = None, base_url: str = LANGDB_BASE_URL, pool: HTTPPool = http_pool,
+                 keep_raw: bool = LANGDB_KEEP_RAW_RESPONSES):
+        self.api_key = api_key
         self.project_id = project_id
+        self.cache = cache
+        self.base_url = base_url
+        self.pool = pool
+        self.keep_raw = keep_raw # also keep the full response dict on each Completion
+        self._client = None
+
+    @property
+    def client(self):
+        # Built on first network call, so fully cached (replay) runs never import openai.
+        # Connections come from the process-wide pool, so every client reuses the same keep-alive connections.
+        if self._client is None:
+            self._client = lazy_import("openai").OpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                max_retries=0,
+                http_client=self.pool.client()
+            )
+        return self._client
 
     def create_chat_completion(self, model: str, messages: list, seed: int = None, prompt_cache_key: str = None, **kwargs):
-        headers = {"x-project-id": self.project_id}
-        if seed is not None:
-            headers["x-seed"] = str(seed)
-        if prompt_cache_key is not None:
-            headers["x-prompt-cache-key"] = prompt_cache_key
+        cache_key, cached_response = _cache_lookup(self.cache, self.base_url, model, messages, seed, kwargs, self.keep_raw)
+        if cached_response is not None:
+            return cached_response
+
+        headers = _build_headers(self.project_id, seed, prompt_cache_key)
+
+        with telemetry.stage("network"):
+            response = self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                extra_headers=headers,
+                **kwargs
+            )
+        return _to_completion(response, self.cache, cache_key, self.keep_raw)
+
+    def stream_chat_completion(self, model: str, messages: list, seed: int = None, prompt_cache_key: str = None, **kwargs):
+        """
+        Yields each streamed chunk as a dict. Streams bypass the response cache.
+        Closing the generator early closes the underlying HTTP stream.
+        """
+        headers = _build_headers(self.project_id, seed, prompt_cache_key)
 
-        response = self.client.chat.completions.create(
+        stream = self.client.chat.completions.create(
             model=model,
             messages=messages,
             extra_headers=headers,
+            stream=True,
+            stream_options={"include_usage": True},
             **kwargs
         )
-        return response.model_dump()
+        try:
+            for chunk in stream:
+                yield chunk.model_dump()
+        finally:
+            stream.close()
+
+class AsyncLangDBClient:
+    """Async variant of LangDBClient; returns the same Completion."""
+    def __init__(self, api_key: str, project_id: str, cache: ResponseCache = None, base_url: str = LANGDB_BASE_URL, pool: HTTPPool = http_pool,
+                 keep_raw: bool = LANGDB_KEEP_RAW_RESPONSES):
+        self.api_key = api_key
+        self.project_id = project_id
+        self.cache = cache
+        self.base_url = base_url
+        self.pool = pool
+        self.keep_raw = keep_raw # also keep the full response dict on each Completion
+        self._client = None
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = lazy_import("openai").AsyncOpenAI(
+                base_url=self.base_url,
+                api_key=self.api_key,
+                max_retries=0,
+                http_client=self.pool.acquire_async()
+            )
+        return self._client
+
+    async def create_chat_completion(self, model: str, messages: list, seed: int = None, prompt_cache_key: str = None, **kwargs):
+        cache_key, cached_response = _cache_lookup(self.cache, self.base_url, model, messages, seed, kwargs, self.keep_raw)
+        if cached_response is not None:
+            return cached_response
+
+        headers = _build_headers(self.project_id, seed, prompt_cache_key)
+
+        with telemetry.stage("network"):
+            response = await self.client.chat.completions.create(
+                model=model,
+                messages=messages,
+                extra_headers=headers,
+                **kwargs
+            )
+        return _to_completion(response, self.cache, cache_key, self.keep_raw)
+
+    async def close(self):
+        # The pool, not this client, owns the connections; they close with the pool's last user on this loop.
+        if self._client is not None:
+            self._client = None
+            await self.pool.release_async()
@@ -1,5 +1,6 @@
 import sys
-from .evaluation import run_full_pipeline
+from .startup_profiler import startup_profiler
+from .config import STARTUP_BUDGET_SECONDS, EARLY_STOPPING_CI_WIDTH
 
 def main():
     selected_model = "deepseek-r1"
@@ -8,23 +9,39 @@ def main():
     seed = 42
     prompt_limit = 20 # Default prompt limit
 
-    if len(sys.argv) > 1:
-        selected_model = sys.argv[1]
-    if len(sys.argv) > 2:
-        dataset_name = sys.argv[2]
-    if len(sys.argv) > 3:
-        strategy_name_arg = sys.argv[3]
+    # --async runs generation concurrently under the configured rate budget
+    async_mode = "--async" in sys.argv
+    # --stream routes high-entropy answers from the first tokens instead of the full completion
+    streaming = "--stream" in sys.argv
+    # --cascade re-asks routed prompts to the strategy's fallback model (speculatively when combined with --stream)
+    cascade = "--cascade" in sys.argv
+    # --batch submits the run's uncached prompts as one batch job (BATCH_BACKEND) and polls for the results
+    batch_mode = "--batch" in sys.argv
+    # --early-stop runs the prompts in seeded random order and stops once the rates' confidence intervals are narrow enough
+    early_stop = "--early-stop" in sys.argv
+    # --profile-startup prints import and initialization times per component
+    profile_startup = "--profile-startup" in sys.argv
+    # --no-resume discards rows already checkpointed for this run instead of continuing after them
+    resume = "--no-resume" not in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg not in ("--async", "--stream", "--cascade", "--batch", "--early-stop", "--profile-startup", "--no-resume")]
+
+    if len(args) > 0:
+        selected_model = args[0]
+    if len(args) > 1:
+        dataset_name = args[1]
+    if len(args) > 2:
+        strategy_name_arg = args[2]
         if strategy_name_arg == "HighEntropyStrategy":
-            threshold = float(sys.argv[4]) if len(sys.argv) > 4 else 0.5
+            threshold = float(args[3]) if len(args) > 3 else 0.5
             strategy_config = {"HighEntropyStrategy": {"threshold": threshold}}
         elif strategy_name_arg == "DirectResponseStrategy":
             strategy_config = {"DirectResponseStrategy": {}}
         else:
             print(f"Warning: Unknown strategy \'{strategy_name_arg}\'. Using default HighEntropyStrategy.")
-    if len(sys.argv) > 5:
-        seed = int(sys.argv[5])
-    if len(sys.argv) > 6:
-        prompt_limit = int(sys.argv[6]) # Read prompt limit from CLI
+    if len(args) > 4:
+        seed = int(args[4])
+    if len(args) > 5:
+        prompt_limit = int(args[5]) # Read prompt limit from CLI
 
     available_models = [
         "gpt-4.1-nano",
@@ -38,8 +55,14 @@ def main():
         print(f"Warning: Unknown model \'{selected_model}\'. Using default model: deepseek-r1")
         selected_model = "deepseek-r1"
 
+    with startup_profiler.measure("src.evaluation", kind="import"):
+        from .evaluation import run_full_pipeline
+
     output_csv_path = f"eval_results/{dataset_name}_{selected_model}_{list(strategy_config.keys())[0]}_seed{seed}.csv"
-    run_full_pipeline(dataset_name=dataset_name, strategy_config=strategy_config, seed=seed, model_id=selected_model, prompt_limit=prompt_limit, output_csv_path=output_csv_path)
+    run_full_pipeline(dataset_name=dataset_name, strategy_config=strategy_config, seed=seed, model_id=selected_model, prompt_limit=prompt_limit, output_csv_path=output_csv_path, async_mode=async_mode, streaming=streaming, resume=resume, cascade=cascade, batch_mode=batch_mode, early_stopping={"ci_width": EARLY_STOPPING_CI_WIDTH} if early_stop else None)
+
+    if profile_startup:
+        print(startup_profiler.report(budget_seconds=STARTUP_BUDGET_SECONDS))
 
 
 if __name__ == "__main__":
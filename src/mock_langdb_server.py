@@ -0,0 +1,202 @@
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Filler vocabulary for synthetic answers; content does not matter, only its shape.
+_WORDS = ("the", "answer", "is", "likely", "that", "it", "depends", "on", "context", "but", "most", "sources", "agree", "this", "claim", "not", "true", "because", "evidence", "shows")
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive, so clients can reuse pooled connections
+
+    def setup(self):
+        super().setup()
+        self.server.mock._count("connections")
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        mock = self.server.mock
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            return self._send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "invalid_request_error"}})
+        if mock._should_rate_limit():
+            return self._send_json(429, {"error": {"message": "Rate limit exceeded (mock)", "type": "rate_limit_error", "code": "rate_limit_exceeded"}},
+                                   headers={"Retry-After": str(mock.retry_after_seconds)})
+
+        if body.get("stream"):
+            return self._send_stream(mock, body, mock.completion({**body, "logprobs": True}, seed=self.headers.get("x-seed")))
+        completion = mock.completion(body, seed=self.headers.get("x-seed"))
+        time.sleep(mock.response_delay(completion["usage"]["completion_tokens"]))
+        self._send_json(200, completion)
+
+    def _send_json(self, status: int, payload: dict, headers: dict = None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, mock, body: dict, completion: dict):
+        # Server-sent events without a length, so the connection is closed after the stream.
+        self.close_connection = True
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        tokens = completion["choices"][0]["logprobs"]["content"]
+        include_logprobs = bool(body.get("logprobs"))
+        time.sleep(mock.latency_seconds)
+        for token_data in tokens:
+            time.sleep(mock.per_token_latency_seconds)
+            chunk = {
+                "id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"],
+                "choices": [{"index": 0, "delta": {"content": token_data["token"]}, "logprobs": {"content": [token_data]} if include_logprobs else None, "finish_reason": None}]
+            }
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        final = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"],
+                 "choices": [{"index": 0, "delta": {}, "logprobs": None, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(final)}\n\n".encode())
+        if (body.get("stream_options") or {}).get("include_usage"):
+            usage_chunk = {"id": completion["id"], "object": "chat.completion.chunk", "created": completion["created"], "model": completion["model"],
+                           "choices": [], "usage": completion["usage"]}
+            self.wfile.write(f"data: {json.dumps(usage_chunk)}\n\n".encode())
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+def mock_completion(body: dict, seed: str = None, logprob_spread: float = 1.5) -> dict:
+    """A synthetic chat completion for a request body, deterministic in (model, messages, seed); see MockLangDBServer."""
+    model = body.get("model", "mock")
+    messages = body.get("messages") or []
+    request_seed = str(body.get("seed", seed)) # the client sends the seed as an x-seed header
+    digest = hashlib.sha256(json.dumps([model, messages, request_seed], sort_keys=True, default=str).encode()).hexdigest()
+    rng = random.Random(digest)
+
+    top_k = int(body.get("top_logprobs") or 0) if body.get("logprobs") else 0
+    n_tokens = rng.randint(8, max(8, min(int(body.get("max_tokens") or 64), 64)))
+    content = []
+    for position in range(n_tokens):
+        # Random logits over 20 alternatives (the API's top_logprobs maximum), independent of the
+        # request so the text only depends on (model, messages, seed). The sampled token is the most likely one.
+        logits = sorted((rng.gauss(0, logprob_spread) for _ in range(20)), reverse=True)
+        log_norm = max(logits) + math.log(sum(math.exp(logit - max(logits)) for logit in logits))
+        words = rng.sample(_WORDS, len(logits))
+        alternatives = [{"token": (" " if position else "") + word, "logprob": logit - log_norm, "bytes": None} for word, logit in zip(words, logits)]
+        content.append({**alternatives[0], "top_logprobs": alternatives[:top_k]})
+
+    prompt_tokens = sum(len(str(message.get("content") or "")) for message in messages) // 4
+    return {
+        "id": f"chatcmpl-mock-{digest[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": "".join(token_data["token"] for token_data in content)},
+            "logprobs": {"content": content} if body.get("logprobs") else None,
+            "finish_reason": "stop"
+        }],
+        "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": n_tokens, "total_tokens": prompt_tokens + n_tokens}
+    }
+
+class MockLangDBServer:
+    """
+    Local stand-in for the LangDB chat-completions endpoint.
+
+    Completions are deterministic in (model, messages, seed) and carry synthetic
+    per-token logprobs with top_logprobs alternatives. Response time is
+    latency_seconds + per_token_latency_seconds * tokens (+ uniform jitter).
+    Every rate_limit_every-th request, and a rate_limit_probability share of the
+    rest, is answered with a 429 and a Retry-After header.
+    """
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_seconds: float = 0.0, per_token_latency_seconds: float = 0.0,
+                 jitter_seconds: float = 0.0, rate_limit_every: int = 0, rate_limit_probability: float = 0.0, retry_after_seconds: float = 1.0,
+                 logprob_spread: float = 1.5, seed: int = 0):
+        self.latency_seconds = latency_seconds
+        self.per_token_latency_seconds = per_token_latency_seconds
+        self.jitter_seconds = jitter_seconds
+        self.rate_limit_every = rate_limit_every
+        self.rate_limit_probability = rate_limit_probability
+        self.retry_after_seconds = retry_after_seconds
+        self.logprob_spread = logprob_spread # larger spread -> more peaked top-k distributions -> lower entropy
+        self.stats = {"requests": 0, "rate_limited": 0, "connections": 0}
+        self._lock = threading.Lock()
+        self._random = random.Random(seed)
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.mock = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def _count(self, name: str):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _should_rate_limit(self) -> bool:
+        with self._lock:
+            self.stats["requests"] += 1
+            limited = (self.rate_limit_every and self.stats["requests"] % self.rate_limit_every == 0) or self._random.random() < self.rate_limit_probability
+            if limited:
+                self.stats["rate_limited"] += 1
+        return bool(limited)
+
+    def response_delay(self, n_tokens: int) -> float:
+        with self._lock:
+            jitter = self._random.uniform(0, self.jitter_seconds) if self.jitter_seconds else 0.0
+        return self.latency_seconds + self.per_token_latency_seconds * n_tokens + jitter
+
+    def completion(self, body: dict, seed: str = None) -> dict:
+        return mock_completion(body, seed, self.logprob_spread)
+
+    def start(self) -> "MockLangDBServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local LangDB chat-completions stand-in. Point LANGDB_BASE_URL at the printed URL.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Fixed latency per response.")
+    parser.add_argument("--per-token-ms", type=float, default=0.0, help="Additional latency per generated token.")
+    parser.add_argument("--jitter-ms", type=float, default=0.0)
+    parser.add_argument("--rate-limit-every", type=int, default=0, help="Answer every N-th request with 429 (0 = never).")
+    parser.add_argument("--rate-limit-probability", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=1.0)
+    args = parser.parse_args()
+
+    server = MockLangDBServer(args.host, args.port, args.latency_ms / 1000, args.per_token_ms / 1000, args.jitter_ms / 1000,
+                              args.rate_limit_every, args.rate_limit_probability, args.retry_after)
+    print(f"Mock LangDB server on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+        print(f"Served: {server.stats}")
+
+if __name__ == "__main__":
+    main()
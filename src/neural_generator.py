@@ -1,62 +1,196 @@
-import sys
+import time
 from loguru import logger
 import json
 
+from .config import LOG_LEVEL, LOG_SAMPLE_RATE
+from .completion import Completion
 from .langdb_client import LangDBClient
-from .feature_extraction.entropy_extractor import EntropyExtractor
-from .feature_extraction.tool_intent_extractor import ToolIntentExtractor
+from .response_cache import ResponseCache
+from .similarity_cache import SimilarityCache
+from .telemetry import telemetry, setup_logging
+from .feature_extraction.entropy_extractor import RunningEntropy
+from .feature_extraction.registry import BASE_FEATURES, FeaturePlan
 
 class NeuralGenerator:
-    def __init__(self, langdb_client: LangDBClient):
+    def __init__(self, langdb_client: LangDBClient, similarity_cache: SimilarityCache = None, features: tuple = ()):
+        """features: registered feature names to extract in addition to BASE_FEATURES, e.g. Scheduler.required_features()."""
         self.langdb_client = langdb_client
-        self.entropy_extractor = EntropyExtractor()
-        self.tool_intent_extractor = ToolIntentExtractor()
+        self.similarity_cache = similarity_cache
+        self.feature_plan = FeaturePlan(BASE_FEATURES + tuple(features))
+        setup_logging(level=LOG_LEVEL, log_sample_rate=LOG_SAMPLE_RATE)
 
     def generate(self, model: str, messages: list, temperature: float, max_tokens: int, seed: int = None, prompt_cache_key: str = None):
-        logger.remove()
-        logger.add(sys.stderr, format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | <cyan>{message}</cyan>", colorize=True)
-        
-        # Log the request payload
-        logger.debug(f"REQUEST PAYLOAD: {json.dumps({'model': model, 'logprobs': True, 'top_logprobs': 5}, indent=2)}")
+        cached_output = self._similarity_lookup(model, messages, temperature, max_tokens, seed)
+        if cached_output is not None and not self.similarity_cache.should_audit(messages):
+            return cached_output
 
         # Perform the API call using LangDBClient, requesting logprobs
         raw_response = self.langdb_client.create_chat_completion(
-            model=model,
-            messages=messages,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            logprobs=True, top_logprobs=5,  # Request logprobs from the API
-            stream=False,
-            seed=seed,
-            prompt_cache_key=prompt_cache_key
+            **self._request_kwargs(model, messages, temperature, max_tokens, seed, prompt_cache_key)
         )
 
-        # Log the response payload
-        logger.info("RESPONSE RECEIVED")
-        print(json.dumps(raw_response, indent=2))
+        output = self._build_output(raw_response, messages)
+        self._similarity_update(cached_output, output, model, messages, temperature, max_tokens, seed)
+        return output
 
-        # Access logprobs more robustly
-        if raw_response and raw_response.get("choices") and raw_response["choices"][0].get("logprobs"):
-            logger.info(f"LOGPROBS CONTENT: {json.dumps(raw_response["choices"][0]["logprobs"], indent=2)}")
-        else:
-            logger.info("LOGPROBS not found or are null.")
+    async def agenerate(self, model: str, messages: list, temperature: float, max_tokens: int, seed: int = None, prompt_cache_key: str = None):
+        """Same as generate, but awaits an AsyncLangDBClient."""
+        cached_output = self._similarity_lookup(model, messages, temperature, max_tokens, seed)
+        if cached_output is not None and not self.similarity_cache.should_audit(messages):
+            return cached_output
 
-        text_content = ""
-        if raw_response and raw_response.get("choices"):
-            first_choice = raw_response["choices"][0]
-            if first_choice.get("message") and first_choice["message"].get("content"):
-                text_content = first_choice["message"]["content"]
+        raw_response = await self.langdb_client.create_chat_completion(
+            **self._request_kwargs(model, messages, temperature, max_tokens, seed, prompt_cache_key)
+        )
+        output = self._build_output(raw_response, messages)
+        self._similarity_update(cached_output, output, model, messages, temperature, max_tokens, seed)
+        return output
+
+    def _similarity_lookup(self, model: str, messages: list, temperature: float, max_tokens: int, seed: int = None) -> dict:
+        if self.similarity_cache is None:
+            return None
+        with telemetry.stage("similarity_cache"):
+            cached_output = self.similarity_cache.lookup(messages, model=model, temperature=temperature, max_tokens=max_tokens, seed=seed)
+        telemetry.increment("similarity_cache_misses" if cached_output is None else "similarity_cache_hits")
+        return None if cached_output is None else {**cached_output, "messages": messages}
+
+    def _similarity_update(self, cached_output: dict, output: dict, model: str, messages: list, temperature: float, max_tokens: int, seed: int = None):
+        # A fresh output is indexed; an audited hit is compared with its live output instead.
+        if self.similarity_cache is None:
+            return
+        if cached_output is None:
+            self.similarity_cache.add(messages, output, model=model, temperature=temperature, max_tokens=max_tokens, seed=seed)
+        elif self.similarity_cache.record_audit(cached_output, output):
+            telemetry.increment("similarity_cache_false_reuse")
+
+    def generate_stream(self, model: str, messages: list, temperature: float, max_tokens: int, scheduler=None, seed: int = None, prompt_cache_key: str = None,
+                        abandon_on_early_routing: bool = False, on_early_routing=None, stop_when=None):
+        """
+        Streaming variant of generate. The running mean entropy is updated as logprobs
+        arrive and scheduler.route_partial is re-evaluated after every chunk. Once a
+        strategy decides early, on_early_routing(partial_output) is called and, if
+        abandon_on_early_routing is set, the stream is closed and the partial answer returned
+        (only for callers that never use the text, since it is truncated).
+        stop_when() is checked after every chunk; once it returns True the stream is abandoned too.
+        """
+        request_kwargs = self._request_kwargs(model, messages, temperature, max_tokens, seed, prompt_cache_key)
+        request_kwargs.pop("stream")
+
+        running_entropy = RunningEntropy()
+        text_parts = []
+        token_logprobs_content = []
+        tool_calls = []
+        usage = None
+        early_routing = None
+        routing_tokens = None
+        time_to_routing = None
+        abandoned = False
+
+        start_time = time.time()
+        stream = self.langdb_client.stream_chat_completion(**request_kwargs)
+        try:
+            for chunk in stream:
+                if chunk.get("usage"):
+                    usage = chunk["usage"]
+                if not chunk.get("choices"):
+                    continue
+                choice = chunk["choices"][0]
+                delta = choice.get("delta") or {}
+                if delta.get("content"):
+                    text_parts.append(delta["content"])
+                if delta.get("tool_calls"):
+                    tool_calls.extend(delta["tool_calls"])
+                if stop_when is not None and stop_when():
+                    abandoned = True
+                    break
+                chunk_logprobs = (choice.get("logprobs") or {}).get("content") or []
+                if not chunk_logprobs:
+                    continue
+                token_logprobs_content.extend(chunk_logprobs)
+                running_entropy.update(chunk_logprobs)
+
+                if scheduler is None or early_routing is not None:
+                    continue
+                early_routing = scheduler.route_partial({"entropy": running_entropy.mean, "n_tokens": running_entropy.n_tokens, "messages": messages})
+                if early_routing is None:
+                    continue
+                routing_tokens = running_entropy.n_tokens
+                time_to_routing = time.time() - start_time
+                if on_early_routing is not None:
+                    on_early_routing({"text": "".join(text_parts), "entropy": running_entropy.mean, "messages": messages, **early_routing})
+                if abandon_on_early_routing:
+                    abandoned = True
+                    break
+        finally:
+            stream.close()
+
+        # Reassemble a non-streaming shaped response so the usual extractors apply.
+        message = {"role": "assistant", "content": "".join(text_parts)}
+        if tool_calls:
+            message["tool_calls"] = tool_calls
+        raw_response = {
+            "model": model,
+            "choices": [{"index": 0, "message": message, "logprobs": {"content": token_logprobs_content} if token_logprobs_content else None}],
+            "usage": usage
+        }
+
+        output = self._build_output(raw_response, messages)
+        output["early_routing"] = early_routing
+        output["routing_tokens"] = routing_tokens
+        output["time_to_routing"] = time_to_routing
+        output["stream_abandoned"] = abandoned
+        return output
+
+    def is_cached(self, model: str, messages: list, temperature: float, max_tokens: int, seed: int = None, prompt_cache_key: str = None) -> bool:
+        """True when the request will be served without a network call: a response cache or similarity cache hit."""
+        if self.similarity_cache is not None and not self.similarity_cache.should_audit(messages) and \
+                self.similarity_cache.lookup(messages, count=False, model=model, temperature=temperature, max_tokens=max_tokens, seed=seed) is not None:
+            return True
+        cache = getattr(self.langdb_client, "cache", None)
+        if cache is None or not cache.enabled:
+            return False
+        return cache.contains(ResponseCache.make_key(endpoint=getattr(self.langdb_client, "base_url", None),
+                                                     **self._request_kwargs(model, messages, temperature, max_tokens, seed, prompt_cache_key)))
+
+    def request_body(self, model: str, messages: list, temperature: float, max_tokens: int, seed: int = None, prompt_cache_key: str = None) -> dict:
+        """The chat completion request generate() would send, e.g. for a batch input file."""
+        return self._request_kwargs(model, messages, temperature, max_tokens, seed, prompt_cache_key)
+
+    def output_from_response(self, raw_response, model: str, messages: list, temperature: float, max_tokens: int, seed: int = None,
+                             prompt_cache_key: str = None) -> dict:
+        """The output generate() returns for a response obtained elsewhere (a batch job); indexed in the similarity cache like a live one."""
+        output = self._build_output(raw_response, messages)
+        self._similarity_update(None, output, model, messages, temperature, max_tokens, seed)
+        return output
+
+    def _request_kwargs(self, model: str, messages: list, temperature: float, max_tokens: int, seed: int = None, prompt_cache_key: str = None) -> dict:
+        return {
+            "model": model,
+            "messages": messages,
+            "temperature": temperature,
+            "max_tokens": max_tokens,
+            "logprobs": True, "top_logprobs": 5,  # Request logprobs from the API
+            "stream": False,
+            "seed": seed,
+            "prompt_cache_key": prompt_cache_key
+        }
+
+    def _build_output(self, raw_response, messages: list) -> dict:
+        # Clients return a Completion; plain response dicts (streams, test doubles) are converted once here.
+        completion = raw_response if isinstance(raw_response, Completion) else Completion.from_dict(raw_response)
 
-        # Compute entropy
-        entropy_value = self.entropy_extractor.compute_entropy(raw_response)
+        # Only a sample of responses is logged (at INFO, the default LOG_LEVEL); full payloads are serialized only when TRACE is enabled.
+        if telemetry.should_log():
+            logger.info("RESPONSE RECEIVED model={} tokens={}", completion.model, completion.n_tokens)
+        logger.opt(lazy=True).trace("RESPONSE PAYLOAD: {}", lambda: json.dumps(completion.raw if completion.raw is not None else completion.to_dict()))
 
-        # Extract tool flag
-        tool_flag_value = self.tool_intent_extractor.extract_tool_flag(raw_response)
+        # Entropy, tool flag and whatever the strategies asked for, in one pass over the completion
+        with telemetry.stage("features"):
+            features = self.feature_plan.extract(completion)
 
         return {
-            "text": text_content,
-            "raw": raw_response,
-            "entropy": entropy_value,
-            "tool_flag": tool_flag_value,
+            "text": completion.text,
+            "completion": completion,
+            **features,
             "messages": messages # Include original messages in the output
         }
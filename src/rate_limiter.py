@@ -0,0 +1,148 @@
+import asyncio
+import multiprocessing
+import random
+import sys
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate # Tokens added per second
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, amount: float = 1.0):
+        # Requests larger than the bucket would never fit, so cap them at a full bucket.
+        amount = min(amount, self.capacity)
+        # Holding the lock while waiting keeps acquisition FIFO across waiters.
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        """Refund (positive) or charge (negative) tokens once the real cost is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + delta)
+
+class SharedTokenBucket:
+    """
+    TokenBucket whose level lives in a multiprocessing.Array ([tokens, updated_at]),
+    so every process holding the same array draws from one budget. The array must
+    be handed to workers at start-up (Pool initializer or Process args).
+    """
+    def __init__(self, rate: float, capacity: float, state=None):
+        self.rate = rate
+        self.capacity = capacity
+        self.state = state if state is not None else multiprocessing.Array("d", [capacity, time.monotonic()])
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> float:
+        # Caller holds the state lock. CLOCK_MONOTONIC is system-wide, so timestamps compare across processes.
+        now = time.monotonic()
+        tokens = min(self.capacity, self.state[0] + (now - self.state[1]) * self.rate)
+        self.state[0] = tokens
+        self.state[1] = now
+        return tokens
+
+    async def acquire(self, amount: float = 1.0):
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                with self.state.get_lock():
+                    tokens = self._refill()
+                    if tokens >= amount:
+                        self.state[0] = tokens - amount
+                        return
+                await asyncio.sleep((amount - tokens) / self.rate)
+
+    def adjust(self, delta: float):
+        with self.state.get_lock():
+            self.state[0] = min(self.capacity, self._refill() + delta)
+
+class RateLimiter:
+    """Requests/sec and tokens/min budget for a single model."""
+    def __init__(self, requests_per_second: float, tokens_per_minute: Optional[float] = None, shared_state: Tuple = None):
+        # shared_state is a (request_state, token_state) pair from create_shared_rate_states.
+        request_state, token_state = shared_state or (None, None)
+        if request_state is not None:
+            self.request_bucket = SharedTokenBucket(rate=requests_per_second, capacity=max(1.0, requests_per_second), state=request_state)
+        else:
+            self.request_bucket = TokenBucket(rate=requests_per_second, capacity=max(1.0, requests_per_second))
+        self.token_bucket = None
+        if tokens_per_minute:
+            if token_state is not None:
+                self.token_bucket = SharedTokenBucket(rate=tokens_per_minute / 60.0, capacity=tokens_per_minute, state=token_state)
+            else:
+                self.token_bucket = TokenBucket(rate=tokens_per_minute / 60.0, capacity=tokens_per_minute)
+
+    async def acquire(self, estimated_tokens: int = 0):
+        await self.request_bucket.acquire(1)
+        if self.token_bucket is not None and estimated_tokens:
+            await self.token_bucket.acquire(estimated_tokens)
+
+    def record_usage(self, estimated_tokens: int, actual_tokens: Optional[int]):
+        if self.token_bucket is not None and actual_tokens is not None:
+            self.token_bucket.adjust(estimated_tokens - actual_tokens)
+
+class ModelRateLimiters:
+    def __init__(self, requests_per_second: float, tokens_per_minute: Optional[float] = None, overrides: Dict[str, Dict[str, float]] = None,
+                 shared_states: Dict[str, Tuple] = None):
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self.overrides = overrides or {}
+        self.shared_states = shared_states or {}
+        self._limiters: Dict[str, RateLimiter] = {}
+
+    def _budget(self, model: str) -> Tuple[float, Optional[float]]:
+        override = self.overrides.get(model, {})
+        return override.get("requests_per_second", self.requests_per_second), override.get("tokens_per_minute", self.tokens_per_minute)
+
+    def for_model(self, model: str) -> RateLimiter:
+        if model not in self._limiters:
+            requests_per_second, tokens_per_minute = self._budget(model)
+            self._limiters[model] = RateLimiter(requests_per_second, tokens_per_minute, shared_state=self.shared_states.get(model))
+        return self._limiters[model]
+
+def create_shared_rate_states(models: Iterable[str], requests_per_second: float, tokens_per_minute: Optional[float] = None,
+                              overrides: Dict[str, Dict[str, float]] = None, context=multiprocessing) -> Dict[str, Tuple]:
+    """Shared bucket state per model, to pass to worker processes as ModelRateLimiters(shared_states=...)."""
+    budgets = ModelRateLimiters(requests_per_second, tokens_per_minute, overrides)
+    states = {}
+    for model in models:
+        model_rps, model_tpm = budgets._budget(model)
+        now = time.monotonic()
+        states[model] = (
+            context.Array("d", [max(1.0, model_rps), now]),
+            context.Array("d", [model_tpm, now]) if model_tpm else None
+        )
+    return states
+
+def estimate_request_tokens(messages: list, max_tokens: int) -> int:
+    # ~4 characters per token is close enough for budgeting; usage is reconciled afterwards.
+    prompt_chars = sum(len(str(message.get("content") or "")) for message in messages)
+    return prompt_chars // 4 + max_tokens
+
+def is_rate_limit_error(e: BaseException) -> bool:
+    # If openai was never imported, no request went to the network and e cannot be a RateLimitError.
+    openai = sys.modules.get("openai")
+    return openai is not None and isinstance(e, openai.RateLimitError)
+
+def rate_limit_backoff(e: BaseException, attempt: int, base_seconds: float = 1.0, max_seconds: float = 60.0) -> float:
+    """Seconds to wait before retrying a 429: the server's Retry-After if given, else jittered exponential backoff."""
+    response = getattr(e, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    try:
+        return min(float(retry_after), max_seconds)
+    except (TypeError, ValueError):
+        return min(max_seconds, base_seconds * 2 ** attempt) * random.uniform(0.5, 1.0)
@@ -0,0 +1,153 @@
+import argparse
+import glob
+import os
+from typing import Any, Dict, List, Tuple
+
+from .config import RESULTS_STORE_ROOT, NLI_BACKEND, NLI_BATCH_SIZE, NLI_CACHE_PATH, NLI_CACHE_MAX_BYTES, NLI_CACHE_MEMORY_ENTRIES, NLI_CACHE_MODE, NLI_DAEMON_SOCKET
+from .feature_extraction.entropy_extractor import EntropyExtractor
+from .results_store import ResultsStore, latest_rows, read_part, strategy_label
+from .scheduler import build_scheduler
+from .startup_profiler import lazy_import
+from .validators.nli_contradiction_validator import NLI_LABELS
+
+# pandas, numpy and pyarrow are imported on first use; the NLI model only if something new is routed to it.
+
+def find_generation_partition(results_root: str, dataset: str, model: str, seed: int, source_strategy: str = None) -> str:
+    """
+    A stored run of (dataset, model, seed) to replay. Generation does not depend on the
+    strategy, so any strategy partition holds the same completions; by default the one
+    with the most rows is used.
+    """
+    if source_strategy is not None:
+        return ResultsStore(results_root, dataset, model, source_strategy, seed).partition_dir
+    pattern = os.path.join(results_root, f"dataset={dataset}", f"model={model}", "strategy=*", f"seed={seed}")
+    candidates = [path for path in glob.glob(pattern) if glob.glob(os.path.join(path, "part-*.parquet"))]
+    if not candidates:
+        raise FileNotFoundError(f"No stored results for dataset={dataset} model={model} seed={seed} under {results_root}")
+    return max(candidates, key=lambda path: sum(os.path.getsize(part) for part in glob.glob(os.path.join(path, "part-*.parquet"))))
+
+def load_generation_table(partition_dir: str):
+    pa = lazy_import("pyarrow")
+    parts = sorted(glob.glob(os.path.join(partition_dir, "part-*.parquet")))
+    return latest_rows(pa.concat_tables([read_part(path) for path in parts]))
+
+def logprob_arrays(table) -> Tuple[Any, Any, Any]:
+    """The stored list columns as padded arrays, in the layout of EntropyExtractor.pack_logprobs."""
+    np = lazy_import("numpy")
+    pc = lazy_import("pyarrow.compute")
+    lengths = pc.fill_null(pc.list_value_length(table.column("token_logprobs")), 0).to_numpy().astype(np.int64)
+    n_rows = len(lengths)
+    max_len = int(lengths.max()) if n_rows else 0
+
+    flat_sampled = np.nan_to_num(pc.list_flatten(table.column("token_logprobs")).to_numpy(zero_copy_only=False).astype(np.float64), nan=-np.inf)
+    per_token = pc.list_flatten(table.column("top_logprobs")) # one list of alternatives per token
+    alternatives = pc.fill_null(pc.list_value_length(per_token), 0).to_numpy().astype(np.int64)
+    top_k = int(alternatives.max()) if len(alternatives) else 0
+    flat_top = np.full((len(alternatives), top_k), -np.inf)
+    if top_k:
+        values = pc.list_flatten(per_token).to_numpy(zero_copy_only=False).astype(np.float64)
+        token_of_value = np.repeat(np.arange(len(alternatives)), alternatives)
+        starts = np.cumsum(alternatives) - alternatives
+        flat_top[token_of_value, np.arange(len(values)) - starts[token_of_value]] = values
+
+    token_mask = np.arange(max_len)[None, :] < lengths[:, None]
+    sampled = np.full((n_rows, max_len), -np.inf)
+    top = np.full((n_rows, max_len, top_k), -np.inf)
+    sampled[token_mask] = flat_sampled
+    top[token_mask] = flat_top
+    return sampled, top, lengths
+
+def feature_columns(table) -> Dict[str, Any]:
+    """Routing features for every stored row, one array each."""
+    np = lazy_import("numpy")
+    features = EntropyExtractor.compute_entropy_arrays(*logprob_arrays(table))
+    # Keep the entropy the online run routed on; recomputed only where it was not stored.
+    stored_entropy = table.column("entropy").to_numpy(zero_copy_only=False).astype(np.float64)
+    features["entropy"] = np.where(np.isnan(stored_entropy), features["entropy"], stored_entropy)
+    return features
+
+def reroute(table, strategy_configs: List[Dict[str, Any]], nli_validator=None):
+    """
+    Applies every strategy config to the stored rows and returns (summary, decisions):
+    summary has one row of eval.metrics.compute_all_metrics per config, decisions one
+    routing column per config. NLI runs once, on the rows that some config routes to
+    fallback validation and that have no stored NLI scores yet.
+    """
+    np = lazy_import("numpy")
+    pd = lazy_import("pandas")
+    from eval.metrics import compute_all_metrics
+
+    features = feature_columns(table)
+    labels = [strategy_label(strategy_config) for strategy_config in strategy_configs]
+    decisions = pd.DataFrame({label: build_scheduler(strategy_config).route_batch(features) for label, strategy_config in zip(labels, strategy_configs)})
+
+    errored = table.column("routing_decision").to_numpy(zero_copy_only=False) == "Error"
+    nli_scores = np.column_stack([table.column(f"nli_{label}").to_numpy(zero_copy_only=False).astype(np.float64) for label in NLI_LABELS])
+    routed_anywhere = (decisions.to_numpy() == "fallback_validation").any(axis=1) & ~errored
+    missing = np.flatnonzero(routed_anywhere & np.isnan(nli_scores).any(axis=1))
+    if len(missing):
+        if nli_validator is None:
+            raise ValueError(f"{len(missing)} newly routed rows have no stored NLI scores; pass an nli_validator.")
+        questions = table.column("Question").to_pylist()
+        answers = table.column("ModelAnswer").to_pylist()
+        print(f"Running NLI on {len(missing)} newly routed rows")
+        nli_results = nli_validator.validate_batch([{"messages": [{"role": "user", "content": questions[i]}], "text": answers[i]} for i in missing])
+        for i, nli_result in zip(missing, nli_results):
+            nli_scores[i] = [nli_result["nli_scores"].get(label, np.nan) for label in NLI_LABELS]
+    # Same rule as NLIContradictionValidator._to_result
+    contradiction = (nli_scores[:, 0] > nli_scores[:, 1]) & (nli_scores[:, 0] > nli_scores[:, 2])
+
+    base = pd.DataFrame({
+        "entropy": features["entropy"],
+        "latency": table.column("latency").to_numpy(zero_copy_only=False)
+    })
+    summary = []
+    for label in labels:
+        routing = decisions[label].to_numpy()
+        routing = np.where(errored, "Error", routing)
+        results_df = base.assign(routing_decision=routing, contradiction_flag=(routing == "fallback_validation") & contradiction)
+        summary.append({"strategy": label, "n_fallback": int((routing == "fallback_validation").sum()), **compute_all_metrics(results_df)})
+    decisions.insert(0, "prompt_index", table.column("prompt_index").to_numpy())
+    return pd.DataFrame(summary), decisions
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Re-route a stored generation pass under many strategy configs without calling the API.")
+    parser.add_argument("--dataset", default="TruthfulQA")
+    parser.add_argument("--model", default="gpt-4.1-nano")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--source-strategy", default=None, help="Strategy partition to replay, e.g. HighEntropyStrategy_t0.5 (default: largest).")
+    parser.add_argument("--thresholds", nargs="+", type=float, default=None, help="HighEntropyStrategy thresholds to evaluate.")
+    parser.add_argument("--threshold-range", nargs=3, type=float, metavar=("START", "STOP", "COUNT"), help="Evenly spaced thresholds, e.g. 0 2 100.")
+    parser.add_argument("--include-direct", action="store_true", help="Also evaluate DirectResponseStrategy.")
+    parser.add_argument("--results-root", default=RESULTS_STORE_ROOT)
+    parser.add_argument("--output", default=None, help="Summary CSV (default: eval_results/reroute_<dataset>_<model>_seed<seed>.csv).")
+    args = parser.parse_args(argv)
+
+    np = lazy_import("numpy")
+    thresholds = list(args.thresholds or [])
+    if args.threshold_range:
+        start, stop, count = args.threshold_range
+        thresholds.extend(float(threshold) for threshold in np.linspace(start, stop, int(count)))
+    strategy_configs = [{"HighEntropyStrategy": {"threshold": round(threshold, 6)}} for threshold in thresholds]
+    if args.include_direct:
+        strategy_configs.append({"DirectResponseStrategy": {}})
+    if not strategy_configs:
+        parser.error("give --thresholds, --threshold-range or --include-direct")
+
+    from .validators.nli_cache import NLICache
+    from .validators.nli_contradiction_validator import build_nli_validator
+    nli_cache = NLICache(NLI_CACHE_PATH, max_bytes=NLI_CACHE_MAX_BYTES, memory_entries=NLI_CACHE_MEMORY_ENTRIES, mode=NLI_CACHE_MODE)
+    nli_validator = build_nli_validator(backend=NLI_BACKEND, batch_size=NLI_BATCH_SIZE, cache=nli_cache, daemon_socket=NLI_DAEMON_SOCKET)
+
+    partition_dir = find_generation_partition(args.results_root, args.dataset, args.model, args.seed, args.source_strategy)
+    print(f"Replaying {partition_dir}")
+    summary, _ = reroute(load_generation_table(partition_dir), strategy_configs, nli_validator)
+
+    output = args.output or f"eval_results/reroute_{args.dataset}_{args.model}_seed{args.seed}.csv"
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    summary.to_csv(output, index=False)
+    print(summary.to_string(index=False))
+    print(f"Re-routing summary for {len(strategy_configs)} configs saved to {output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional
+
+CACHE_MODES = ("off", "read_write", "replay")
+
+# Request arguments that never change the completion and so stay out of the cache key.
+_NON_KEY_ARGS = ("stream", "prompt_cache_key", "extra_headers", "timeout")
+
+# Least recently used entries deleted per eviction query.
+_EVICT_BATCH = 64
+
+class CacheMissError(RuntimeError):
+    pass
+
+class ResponseCache:
+    """
+    On-disk, content-addressed store of chat completion responses.
+
+    Entries live in a SQLite database in WAL mode so several processes can share
+    one cache file. Once the stored payloads exceed max_bytes the least recently
+    used entries are evicted. In "replay" mode a miss raises CacheMissError
+    instead of letting the request go to the network.
+    """
+    def __init__(self, path: str, max_bytes: int = 1 << 30, mode: str = "read_write"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}. Expected one of {CACHE_MODES}.")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def replay_only(self) -> bool:
+        return self.mode == "replay"
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections must not be shared across fork, so reopen per process.
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+            # Running total of the stored payload sizes, so puts never sum the whole table.
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO cache_meta (name, value) SELECT 'bytes', COALESCE(SUM(size), 0) FROM responses")
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, messages: list, seed: int = None, endpoint: str = None, **kwargs) -> str:
+        """endpoint is the API base URL the response came from, so mock-server completions never answer requests to the real API."""
+        request = {"model": model, "messages": messages, "seed": seed}
+        if endpoint is not None:
+            request["endpoint"] = endpoint.rstrip("/")
+        request.update({k: v for k, v in kwargs.items() if k not in _NON_KEY_ARGS})
+        canonical = json.dumps(request, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+        return json.loads(row[0])
+
+    def contains(self, key: str) -> bool:
+        with self._lock:
+            return self._connection().execute("SELECT 1 FROM responses WHERE key = ?", (key,)).fetchone() is not None
+
+    def put(self, key: str, response: Dict[str, Any]):
+        payload = json.dumps(response, separators=(",", ":"), default=str)
+        now = time.time()
+        with self._lock:
+            conn = self._connection()
+            # One write transaction per put, so eviction sees a consistent total across processes.
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                replaced = conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+                conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, response, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, payload, len(payload), now, now)
+                )
+                self._evict(conn, len(payload) - (replaced[0] if replaced else 0))
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _evict(self, conn: sqlite3.Connection, added_bytes: int):
+        total = conn.execute("SELECT value FROM cache_meta WHERE name = 'bytes'").fetchone()[0] + added_bytes
+        while total > self.max_bytes:
+            rows = conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC LIMIT ?", (_EVICT_BATCH,)).fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if total <= self.max_bytes:
+                    break
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                total -= size
+        conn.execute("UPDATE cache_meta SET value = ? WHERE name = 'bytes'", (total,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            conn = self._connection()
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            total = conn.execute("SELECT value FROM cache_meta WHERE name = 'bytes'").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": total
+        }
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
@@ -0,0 +1,148 @@
+import glob
+import math
+import os
+import shutil
+from typing import Any, Dict, List, Set
+
+from .completion import Completion
+from .startup_profiler import lazy_import
+
+NLI_SCORE_COLUMNS = {"contradiction": "nli_contradiction", "entailment": "nli_entailment", "neutral": "nli_neutral"}
+
+def results_schema():
+    pa = lazy_import("pyarrow")
+    return pa.schema([
+        ("prompt_index", pa.int64()),
+        ("prompt_id", pa.string()), # stable ID from the dataset registry; resume is keyed on it
+        ("Question", pa.string()),
+        ("Model", pa.string()),
+        ("ModelAnswer", pa.string()),
+        ("entropy", pa.float64()),
+        ("routing_decision", pa.string()),
+        # The model whose answer is in ModelAnswer (the fallback model when a cascade escalated) and the fallback considered, if any.
+        ("answered_by", pa.string()),
+        ("fallback_model", pa.string()),
+        # A streamed answer's decision from its first tokens and when it was taken; routing_decision is the complete answer's.
+        ("early_routing_decision", pa.string()),
+        ("time_to_routing", pa.float64()),
+        ("contradiction_flag", pa.bool_()),
+        ("nli_contradiction", pa.float64()),
+        ("nli_entailment", pa.float64()),
+        ("nli_neutral", pa.float64()),
+        ("factual_flag", pa.bool_()),
+        ("factual_score", pa.float64()),
+        ("latency", pa.float64()),
+        # Sampled-token and top-k logprobs, kept so runs can be re-routed offline.
+        ("token_logprobs", pa.list_(pa.float32())),
+        ("top_logprobs", pa.list_(pa.list_(pa.float32())))
+    ])
+
+def strategy_label(strategy_config: Dict[str, Any]) -> str:
+    """Partition label for a strategy config, e.g. HighEntropyStrategy_t0.5."""
+    parts = []
+    for strategy_name, config in strategy_config.items():
+        parts.append(f"{strategy_name}_t{config['threshold']}" if "threshold" in config else strategy_name)
+    return "+".join(parts)
+
+def logprob_columns(completion) -> Dict[str, list]:
+    if completion is None:
+        return {"token_logprobs": [], "top_logprobs": []}
+    if not isinstance(completion, Completion):
+        completion = Completion.from_dict(completion)
+    return {
+        "token_logprobs": [None if math.isnan(logprob) else logprob for logprob in completion.logprobs.tolist()],
+        "top_logprobs": completion.top_logprobs_lists()
+    }
+
+def read_part(path: str, columns: List[str] = None):
+    """One part file in the current schema; columns added after it was written read as nulls."""
+    pa = lazy_import("pyarrow")
+    pq = lazy_import("pyarrow.parquet")
+    schema = results_schema()
+    if columns is not None:
+        schema = pa.schema([schema.field(name) for name in columns])
+    present = set(pq.read_schema(path).names)
+    part = pq.read_table(path, columns=[name for name in schema.names if name in present])
+    return pa.table([part.column(field.name) if field.name in present else pa.nulls(len(part), field.type) for field in schema], schema=schema)
+
+def latest_rows(table):
+    """
+    One row per prompt, ordered by prompt_index: the last one written, so a retried
+    error row gives way to its retry. Prompts are identified by prompt_id, or by
+    prompt_index in rows written before prompt_id was stored.
+    """
+    prompt_index = table.column("prompt_index").to_pylist()
+    prompt_ids = table.column("prompt_id").to_pylist() if "prompt_id" in table.column_names else [None] * len(prompt_index)
+    last = {}
+    for row, (pid, index) in enumerate(zip(prompt_ids, prompt_index)):
+        last[pid if pid is not None else index] = row
+    return table.take(sorted(last.values(), key=prompt_index.__getitem__))
+
+class ResultsStore:
+    """
+    Append-only Parquet results for one (dataset, model, strategy, seed) cell.
+
+    Rows are buffered and written as one new part file per row group under
+    root/dataset=.../model=.../strategy=.../seed=.../. Each part is written to a
+    temporary name and renamed, so a crash loses at most the unflushed buffer and
+    completed_ids() tells a restarted run where to resume. Error rows do not
+    count as completed; their retries are appended and supersede them in read_table().
+    """
+    def __init__(self, root: str, dataset: str, model: str, strategy: str, seed: int, row_group_size: int = 50):
+        self.partition_dir = os.path.join(root, f"dataset={dataset}", f"model={model}", f"strategy={strategy}", f"seed={seed}")
+        self.row_group_size = row_group_size
+        self._buffer: List[Dict[str, Any]] = []
+        os.makedirs(self.partition_dir, exist_ok=True)
+
+    def _part_paths(self) -> List[str]:
+        return sorted(glob.glob(os.path.join(self.partition_dir, "part-*.parquet")))
+
+    def completed_ids(self) -> Set[str]:
+        """prompt_ids with a non-error row; rows written without a prompt_id are not counted and so are run again."""
+        completed = set()
+        for path in self._part_paths():
+            part = read_part(path, ["prompt_id", "routing_decision"])
+            completed.update(pid for pid, decision in zip(part.column("prompt_id").to_pylist(), part.column("routing_decision").to_pylist())
+                             if pid is not None and decision != "Error")
+        return completed
+
+    def clear(self):
+        shutil.rmtree(self.partition_dir, ignore_errors=True)
+        os.makedirs(self.partition_dir, exist_ok=True)
+        self._buffer = []
+
+    def append(self, row: Dict[str, Any]):
+        row = dict(row)
+        nli_scores = row.pop("nli_scores", None) or {}
+        for label, column in NLI_SCORE_COLUMNS.items():
+            row.setdefault(column, nli_scores.get(label))
+        self._buffer.append(row)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        pa = lazy_import("pyarrow")
+        pq = lazy_import("pyarrow.parquet")
+        schema = results_schema()
+        table = pa.Table.from_pylist([{name: row.get(name) for name in schema.names} for row in self._buffer], schema=schema)
+        existing = self._part_paths()
+        next_part = int(os.path.basename(existing[-1])[5:10]) + 1 if existing else 0
+        path = os.path.join(self.partition_dir, f"part-{next_part:05d}.parquet")
+        pq.write_table(table, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+        self._buffer = []
+
+    def close(self):
+        self.flush()
+
+    def read_table(self, columns: List[str] = None):
+        """The latest flushed row of each prompt as one Arrow table, ordered by prompt_index."""
+        pa = lazy_import("pyarrow")
+        read_columns = None if columns is None else list(dict.fromkeys(["prompt_index", "prompt_id", *columns])) # latest_rows needs both
+        parts = [read_part(path, read_columns) for path in self._part_paths()]
+        if not parts:
+            return results_schema().empty_table() if columns is None else results_schema().empty_table().select(columns)
+        table = latest_rows(pa.concat_tables(parts))
+        return table if columns is None else table.select(columns)
@@ -1,9 +1,16 @@
-from typing import List, Any
+from typing import List, Any, Dict
+from .startup_profiler import lazy_import
+from .strategies.direct_response_strategy import DirectResponseStrategy
+from .strategies.high_entropy_strategy import HighEntropyStrategy
 
 class Scheduler:
     def __init__(self, strategies: List[Any]):
         self.strategies = strategies
 
+    def required_features(self) -> tuple:
+        """The features the strategies read, as declared in their features attribute."""
+        return tuple(dict.fromkeys(name for strategy in self.strategies for name in getattr(strategy, "features", ())))
+
     def route(self, output: dict) -> dict:
         for strategy in self.strategies:
             decision_output = strategy.decide(output)
@@ -13,6 +20,51 @@ class Scheduler:
                 return {"routing_decision": decision_output}
         return {"routing_decision": "direct_response"}
 
+    def route_partial(self, output: dict) -> dict or None:
+        """
+        Routes an incomplete (streaming) output. Only strategies that implement
+        decide_partial take part; None means no strategy can decide yet.
+        """
+        for strategy in self.strategies:
+            decide_partial = getattr(strategy, "decide_partial", None)
+            if decide_partial is None:
+                continue
+            decision_output = decide_partial(output)
+            if decision_output and isinstance(decision_output, dict):
+                return decision_output
+            elif decision_output and isinstance(decision_output, str):
+                return {"routing_decision": decision_output}
+        return None
 
+    def route_batch(self, features: Dict[str, Any]):
+        """
+        Vectorized route over feature arrays with one value per output (see
+        EntropyExtractor.compute_entropy_arrays). Returns an object array of
+        routing decisions. Strategies without decide_batch are applied row by row.
+        """
+        np = lazy_import("numpy")
+        n_outputs = len(features["entropy"])
+        decisions = np.full(n_outputs, None, dtype=object)
+        for strategy in self.strategies:
+            undecided = np.equal(decisions, None)
+            if not undecided.any():
+                break
+            decide_batch = getattr(strategy, "decide_batch", None)
+            if decide_batch is not None:
+                strategy_decisions = decide_batch(features)
+            else:
+                strategy_decisions = np.full(n_outputs, None, dtype=object)
+                for i in np.flatnonzero(undecided):
+                    decision_output = strategy.decide({name: values[i] for name, values in features.items()})
+                    strategy_decisions[i] = decision_output.get("routing_decision") if isinstance(decision_output, dict) else decision_output
+            decisions = np.where(undecided, strategy_decisions, decisions)
+        return np.where(np.equal(decisions, None), "direct_response", decisions)
 
-
+def build_scheduler(strategy_config: Dict[str, Any]) -> Scheduler:
+    strategies = []
+    for strategy_name, config in strategy_config.items():
+        if strategy_name == "HighEntropyStrategy":
+            strategies.append(HighEntropyStrategy(threshold=config["threshold"]))
+        elif strategy_name == "DirectResponseStrategy":
+            strategies.append(DirectResponseStrategy())
+    return Scheduler(strategies=strategies)
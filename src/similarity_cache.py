@@ -0,0 +1,187 @@
+import json
+import re
+import threading
+import zlib
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from .startup_profiler import lazy_import
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+_PUNCTUATION = re.compile(r"[^\w\s]")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_prompt(text: str) -> str:
+    """Lowercased, punctuation stripped, whitespace collapsed."""
+    return _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", text.lower())).strip()
+
+def shingles(text: str, size: int = 2) -> set:
+    """Word n-grams of the normalized text, plus the single words, so reordered clauses still overlap."""
+    words = normalize_prompt(text).split(" ")
+    result = set(words)
+    result.update(" ".join(words[i:i + size]) for i in range(len(words) - size + 1))
+    return result
+
+def jaccard(a: set, b: set) -> float:
+    return len(a & b) / len(a | b) if a or b else 1.0
+
+class MinHasher:
+    """MinHash signatures of shingle sets, with num_perm universal hashes (a * x + b) mod p."""
+    def __init__(self, num_perm: int = 128, seed: int = 1):
+        np = lazy_import("numpy")
+        rng = np.random.RandomState(seed)
+        self.num_perm = num_perm
+        # a, b < 2^29 and x < 2^32 keep a * x + b inside uint64 before the modulo.
+        self.a = rng.randint(1, 1 << 29, size=num_perm, dtype=np.uint64)
+        self.b = rng.randint(0, 1 << 29, size=num_perm, dtype=np.uint64)
+
+    def signature(self, shingle_set: set):
+        np = lazy_import("numpy")
+        if not shingle_set:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        hashes = np.array([zlib.crc32(shingle.encode()) for shingle in shingle_set], dtype=np.uint64)
+        return (((hashes[:, None] * self.a[None, :] + self.b[None, :]) % np.uint64(_MERSENNE_PRIME)) & np.uint64(_MAX_HASH)).min(axis=0)
+
+class SimilarityCache:
+    """
+    Near-duplicate cache of generator outputs, keyed by the prompt text.
+
+    Prompts are normalized and shingled, and their MinHash signatures are indexed
+    in an LSH table of `bands` bands. A lookup returns the stored output of the
+    most similar earlier prompt in the same scope (model and sampling parameters)
+    if the exact Jaccard similarity of their shingle sets is at least threshold.
+    Entries are evicted least recently used beyond max_entries.
+
+    Every hit is recorded in audit_log. A share audit_rate of prompts is also
+    generated live by NeuralGenerator when they hit; a hit whose live output has a different
+    tool flag or an entropy more than entropy_tolerance away counts as a false reuse.
+    """
+    def __init__(self, threshold: float = 0.9, num_perm: int = 128, bands: int = 32, shingle_size: int = 2, max_entries: int = 100_000,
+                 audit_rate: float = 0.0, entropy_tolerance: float = 0.1, audit_log_size: int = 1000, seed: int = 1):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be a multiple of bands ({bands})")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.max_entries = max_entries
+        self.audit_rate = audit_rate
+        self.entropy_tolerance = entropy_tolerance
+        self.hasher = MinHasher(num_perm, seed)
+        self.stats = {"lookups": 0, "hits": 0, "misses": 0, "candidates": 0, "rejected_candidates": 0, "audited": 0, "false_reuse": 0}
+        self.audit_log = deque(maxlen=audit_log_size)
+        self._entries: "OrderedDict[int, Tuple[tuple, str, set, Any, dict]]" = OrderedDict() # id -> (scope, prompt, shingles, band keys, output)
+        self._buckets: Dict[tuple, set] = {}
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def scope(model: str, temperature: float, max_tokens: int, seed: int = None, **kwargs) -> tuple:
+        return (model, temperature, max_tokens, seed)
+
+    @staticmethod
+    def prompt_text(messages: list) -> str:
+        return "\n".join(f"{message.get('role')}: {message.get('content') or ''}" for message in messages)
+
+    def _band_keys(self, scope: tuple, signature) -> List[tuple]:
+        return [(scope, band, signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+
+    def _best_match(self, prompt_shingles: set, band_keys: List[tuple]) -> Tuple[Optional[int], float, int]:
+        candidates = set()
+        for key in band_keys:
+            candidates.update(self._buckets.get(key, ()))
+        best_id, best_similarity = None, 0.0
+        for entry_id in candidates:
+            similarity = jaccard(prompt_shingles, self._entries[entry_id][2])
+            if similarity > best_similarity:
+                best_id, best_similarity = entry_id, similarity
+        return best_id, best_similarity, len(candidates)
+
+    def lookup(self, messages: list, count: bool = True, **request) -> Optional[Dict[str, Any]]:
+        """
+        The stored output for a near-duplicate of messages, with "similarity_cache"
+        set to {similarity, matched_prompt}, or None. count=False leaves the stats untouched.
+        """
+        scope = self.scope(**request)
+        prompt = self.prompt_text(messages)
+        prompt_shingles = shingles(prompt, self.shingle_size)
+        band_keys = self._band_keys(scope, self.hasher.signature(prompt_shingles))
+        with self._lock:
+            best_id, similarity, n_candidates = self._best_match(prompt_shingles, band_keys)
+            hit = best_id is not None and similarity >= self.threshold
+            if hit:
+                self._entries.move_to_end(best_id)
+                _, matched_prompt, _, _, output = self._entries[best_id]
+            if count:
+                self.stats["lookups"] += 1
+                self.stats["hits" if hit else "misses"] += 1
+                self.stats["candidates"] += n_candidates
+                self.stats["rejected_candidates"] += n_candidates - int(hit)
+                if hit:
+                    self.audit_log.append({"event": "hit", "prompt": prompt, "matched_prompt": matched_prompt, "similarity": similarity})
+        if not hit:
+            return None
+        return {**output, "similarity_cache": {"similarity": similarity, "matched_prompt": matched_prompt}}
+
+    def add(self, messages: list, output: Dict[str, Any], **request):
+        scope = self.scope(**request)
+        prompt = self.prompt_text(messages)
+        prompt_shingles = shingles(prompt, self.shingle_size)
+        band_keys = self._band_keys(scope, self.hasher.signature(prompt_shingles))
+        stored = {key: value for key, value in output.items() if key not in ("messages", "similarity_cache")}
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = (scope, prompt, prompt_shingles, band_keys, stored)
+            for key in band_keys:
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._evict(*self._entries.popitem(last=False))
+
+    def _evict(self, entry_id: int, entry: tuple):
+        for key in entry[3]:
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def should_audit(self, messages: list) -> bool:
+        """Whether a hit for messages is also generated live. Decided by the prompt's hash, so it is the same on every call."""
+        return self.audit_rate > 0 and zlib.crc32(self.prompt_text(messages).encode()) / _MAX_HASH < self.audit_rate
+
+    def record_audit(self, cached_output: Dict[str, Any], live_output: Dict[str, Any]) -> bool:
+        """Compares a served hit with a live generation of the same prompt; returns True for a false reuse."""
+        cached_entropy, live_entropy = cached_output.get("entropy"), live_output.get("entropy")
+        entropy_differs = (cached_entropy is None) != (live_entropy is None) or (
+            cached_entropy is not None and abs(cached_entropy - live_entropy) > self.entropy_tolerance)
+        false_reuse = entropy_differs or bool(cached_output.get("tool_flag")) != bool(live_output.get("tool_flag"))
+        with self._lock:
+            self.stats["audited"] += 1
+            self.stats["false_reuse"] += int(false_reuse)
+            self.audit_log.append({
+                "event": "audit",
+                "prompt": self.prompt_text(live_output.get("messages") or []),
+                "matched_prompt": cached_output["similarity_cache"]["matched_prompt"],
+                "similarity": cached_output["similarity_cache"]["similarity"],
+                "cached_entropy": cached_entropy, "live_entropy": live_entropy,
+                "cached_tool_flag": cached_output.get("tool_flag"), "live_tool_flag": live_output.get("tool_flag"),
+                "false_reuse": false_reuse
+            })
+        return false_reuse
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self.stats)
+            stats["entries"] = len(self._entries)
+        stats["hit_rate"] = stats["hits"] / stats["lookups"] if stats["lookups"] else 0.0
+        stats["false_reuse_rate"] = stats["false_reuse"] / stats["audited"] if stats["audited"] else None
+        return stats
+
+    def write_audit_log(self, path: str):
+        with self._lock:
+            records = list(self.audit_log)
+        with open(path, "a") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
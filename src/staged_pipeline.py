@@ -0,0 +1,234 @@
+import asyncio
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+from .telemetry import telemetry
+
+_DONE = object()
+
+class PipelineAborted(RuntimeError):
+    pass
+
+class StageQueue:
+    """
+    Bounded queue between two stages. A full queue blocks the producer (backpressure);
+    the time it waited and the depth after each put are recorded per queue.
+    """
+    def __init__(self, name: str, maxsize: int, stop_event: threading.Event):
+        self.name = name
+        self.maxsize = maxsize
+        self.items = 0
+        self.max_depth = 0
+        self.depth_sum = 0
+        self.blocked_seconds = 0.0
+        self._queue = queue.Queue(maxsize)
+        self._stop_event = stop_event
+        self._lock = threading.Lock()
+
+    def put(self, item: Any):
+        start = time.perf_counter()
+        while True:
+            if self._stop_event.is_set():
+                raise PipelineAborted(f"pipeline stopped while putting to {self.name}")
+            try:
+                self._queue.put(item, timeout=0.1)
+                break
+            except queue.Full:
+                continue
+        if item is not _DONE:
+            self._observe(time.perf_counter() - start)
+
+    def put_nowait(self, item: Any) -> bool:
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            return False
+        self._observe(0.0)
+        return True
+
+    def _observe(self, blocked: float):
+        depth = self._queue.qsize()
+        with self._lock:
+            self.items += 1
+            self.max_depth = max(self.max_depth, depth)
+            self.depth_sum += depth
+            self.blocked_seconds += blocked
+        telemetry.observe(f"queue_depth:{self.name}", depth)
+        if blocked:
+            telemetry.observe(f"backpressure_seconds:{self.name}", blocked)
+
+    def get(self, timeout: float = None) -> Any:
+        return self._queue.get(timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"items": self.items, "max_depth": self.max_depth, "mean_depth": self.depth_sum / self.items if self.items else 0.0,
+                    "capacity": self.maxsize, "blocked_seconds": self.blocked_seconds}
+
+class StagedPipeline:
+    """
+    The stages after generation, each in its own thread and connected by bounded queues:
+
+        producer --submit()--> route (inline) --validate queue--> validation worker --write queue--> writer
+
+    route(item) runs in the producer's thread and returns whether the item needs
+    validation. Items that do are collected by the validation worker into batches of
+    up to batch_size (or whatever arrived within max_wait_seconds) and handed to
+    validate_batch(items), which updates them in place; the others go straight to the
+    writer. write(item) is only ever called from the writer thread, in the order items
+    reach it: an item that skips validation can be written before an earlier one still
+    being validated.
+
+    A full queue blocks its producer, so a slow validator or writer throttles
+    generation instead of buffering without bound. The first exception in a stage
+    stops the pipeline and is raised from submit() and close().
+    """
+    def __init__(self, route: Callable[[Dict[str, Any]], bool], validate_batch: Callable[[List[Dict[str, Any]]], None],
+                 write: Callable[[Dict[str, Any]], None], queue_size: int = 64, batch_size: int = 16, max_wait_seconds: float = 0.05):
+        self.route = route
+        self.validate_batch = validate_batch
+        self.write = write
+        self.batch_size = batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.busy_seconds = {"route": 0.0, "validate": 0.0, "write": 0.0}
+        self.batches = 0
+        self._stop_event = threading.Event()
+        self._error: BaseException = None
+        self._closed = False
+        self.validate_queue = StageQueue("validate", queue_size, self._stop_event)
+        self.write_queue = StageQueue("write", queue_size, self._stop_event)
+        self._start_time = time.perf_counter()
+        self._threads = [
+            threading.Thread(target=self._guarded, args=(self._validate_loop,), name="pipeline-validate", daemon=True),
+            threading.Thread(target=self._guarded, args=(self._write_loop,), name="pipeline-write", daemon=True)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _guarded(self, loop: Callable[[], None]):
+        try:
+            loop()
+        except PipelineAborted:
+            pass
+        except BaseException as e:
+            self._fail(e)
+
+    def _fail(self, error: BaseException):
+        if self._error is None:
+            self._error = error
+        self._stop_event.set()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+        if self._stop_event.is_set():
+            raise PipelineAborted("pipeline was aborted")
+
+    def _route(self, item: Dict[str, Any]) -> StageQueue:
+        self._raise_if_failed()
+        start = time.perf_counter()
+        try:
+            needs_validation = self.route(item)
+        except BaseException as e:
+            self._fail(e)
+            raise
+        self.busy_seconds["route"] += time.perf_counter() - start
+        return self.validate_queue if needs_validation else self.write_queue
+
+    def submit(self, item: Dict[str, Any]):
+        """Routes item and queues it for the next stage; blocks while that queue is full."""
+        target = self._route(item)
+        try:
+            target.put(item)
+        except PipelineAborted:
+            self._raise_if_failed()
+        self._raise_if_failed()
+
+    async def asubmit(self, item: Dict[str, Any]):
+        """submit() for producers on an event loop: a full queue is waited on in a worker thread, not on the loop."""
+        target = self._route(item)
+        try:
+            if not target.put_nowait(item):
+                await asyncio.to_thread(target.put, item)
+        except PipelineAborted:
+            self._raise_if_failed()
+        self._raise_if_failed()
+
+    def _next_batch(self) -> List[Dict[str, Any]]:
+        """Up to batch_size items, waiting at most max_wait_seconds after the first; [_DONE] at the end."""
+        batch = []
+        deadline = None
+        while len(batch) < self.batch_size:
+            if self._stop_event.is_set():
+                raise PipelineAborted("pipeline stopped")
+            timeout = 0.1 if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                item = self.validate_queue.get(timeout=timeout)
+            except queue.Empty:
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                continue
+            batch.append(item)
+            if item is _DONE:
+                break
+            if deadline is None:
+                deadline = time.monotonic() + self.max_wait_seconds
+        return batch
+
+    def _validate_loop(self):
+        while True:
+            batch = self._next_batch()
+            done = batch and batch[-1] is _DONE
+            items = batch[:-1] if done else batch
+            if items:
+                start = time.perf_counter()
+                self.validate_batch(items)
+                self.busy_seconds["validate"] += time.perf_counter() - start
+                self.batches += 1
+                for item in items:
+                    self.write_queue.put(item)
+            if done:
+                # Every unvalidated item was queued for the writer before _DONE reached this stage.
+                self.write_queue.put(_DONE)
+                return
+
+    def _write_loop(self):
+        while True:
+            try:
+                item = self.write_queue.get(timeout=0.1)
+            except queue.Empty:
+                if self._stop_event.is_set():
+                    return
+                continue
+            if item is _DONE:
+                return
+            start = time.perf_counter()
+            self.write(item)
+            self.busy_seconds["write"] += time.perf_counter() - start
+
+    def close(self, abort: bool = False):
+        """Drains every stage and joins the threads (abort=True stops them right away). Raises the first stage error."""
+        if not self._closed:
+            self._closed = True
+            if abort:
+                self._stop_event.set()
+            else:
+                try:
+                    self.validate_queue.put(_DONE)
+                except PipelineAborted:
+                    pass
+            for thread in self._threads:
+                thread.join()
+        if not abort and self._error is not None:
+            raise self._error
+
+    def stats(self) -> Dict[str, Any]:
+        """Queue depths and backpressure, and the time each stage spent working; wall time approaches the largest busy time."""
+        return {
+            "wall_seconds": time.perf_counter() - self._start_time,
+            "busy_seconds": dict(self.busy_seconds),
+            "validation_batches": self.batches,
+            "queues": {"validate": self.validate_queue.stats(), "write": self.write_queue.stats()}
+        }
@@ -0,0 +1,57 @@
+import importlib
+import sys
+import time
+from contextlib import contextmanager
+from typing import List, Tuple
+
+class StartupProfiler:
+    """
+    Records how long heavy imports and component initializations take.
+    Heavy libraries are imported through lazy_import at first use, so each one
+    shows up as its own line in report().
+    """
+    def __init__(self):
+        self.started_at = time.perf_counter()
+        self.records: List[Tuple[int, str, str, float]] = []
+        self._depth = 0
+
+    @contextmanager
+    def measure(self, component: str, kind: str = "init"):
+        # Nested measurements (e.g. an import during an init) are indented and not double counted.
+        record_index = len(self.records)
+        self.records.append((self._depth, kind, component, 0.0))
+        self._depth += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            self.records[record_index] = (self._depth, kind, component, time.perf_counter() - start)
+
+    def import_module(self, name: str):
+        module = sys.modules.get(name)
+        if module is not None:
+            return module
+        with self.measure(name, kind="import"):
+            return importlib.import_module(name)
+
+    def total(self) -> float:
+        return sum(seconds for depth, _, _, seconds in self.records if depth == 0)
+
+    def report(self, budget_seconds: float = None) -> str:
+        lines = ["--- Startup Profile ---"]
+        for depth, kind, component, seconds in self.records:
+            label = "  " * depth + f"{kind:<7} {component}"
+            lines.append(f"{label:<48} {seconds:8.3f}s")
+        lines.append(f"{'total':<48} {self.total():8.3f}s")
+        lines.append(f"{'wall since startup':<48} {time.perf_counter() - self.started_at:8.3f}s")
+        if budget_seconds is not None:
+            status = "OK" if self.total() <= budget_seconds else "OVER BUDGET"
+            lines.append(f"{'budget':<48} {budget_seconds:8.3f}s {status}")
+        lines.append("-----------------------")
+        return "\n".join(lines)
+
+startup_profiler = StartupProfiler()
+
+def lazy_import(name: str):
+    return startup_profiler.import_module(name)
@@ -1,13 +1,12 @@
+from ..startup_profiler import lazy_import
+
 class DirectResponseStrategy:
+    features = ()
+
     def decide(self, output: dict) -> str or None:
         # This strategy always returns "direct_response"
         return "direct_response"
 
-
-
-
-
-
-
-
-
+    def decide_batch(self, features: dict):
+        np = lazy_import("numpy")
+        return np.full(len(features["entropy"]), "direct_response", dtype=object)
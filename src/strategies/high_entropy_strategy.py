@@ -1,7 +1,15 @@
+from ..startup_profiler import lazy_import
+
 class HighEntropyStrategy:
-    def __init__(self, threshold: float = 1.0, fallback_model_id: str = "gpt-5.2-pro"):
+    features = ("entropy",) # read from the output; see src/feature_extraction/registry.py
+
+    def __init__(self, threshold: float = 1.0, fallback_model_id: str = "gpt-5.2-pro", early_margin: float = 0.15, early_min_tokens: int = 24):
         self.threshold = threshold
         self.fallback_model_id = fallback_model_id
+        # A streamed answer is only routed early once at least early_min_tokens tokens
+        # have arrived and their running mean entropy exceeds threshold + early_margin.
+        self.early_margin = early_margin
+        self.early_min_tokens = early_min_tokens
 
     def decide(self, output: dict) -> dict or None:
         entropy = output.get("entropy")
@@ -9,3 +17,16 @@ class HighEntropyStrategy:
             return {"routing_decision": "fallback_validation", "fallback_model_id": self.fallback_model_id}
         return None
 
+    def decide_partial(self, output: dict) -> dict or None:
+        entropy = output.get("entropy")
+        if output.get("n_tokens", 0) < self.early_min_tokens or entropy is None:
+            return None
+        if entropy > self.threshold + self.early_margin:
+            return {"routing_decision": "fallback_validation", "fallback_model_id": self.fallback_model_id}
+        return None
+
+    def decide_batch(self, features: dict):
+        """Vectorized decide over feature arrays (one value per output); None where this strategy does not route."""
+        np = lazy_import("numpy")
+        entropy = np.asarray(features["entropy"], dtype=np.float64)
+        return np.where(entropy > self.threshold, "fallback_validation", None) # NaN compares False, like a missing entropy
@@ -0,0 +1,194 @@
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+from typing import Any, Dict, List
+
+from .config import LANGDB_HEDGE_BACKUPS, LANGDB_MAX_IN_FLIGHT, LANGDB_REQUESTS_PER_SECOND, LANGDB_TOKENS_PER_MINUTE, RESULTS_STORE_ROOT, ONLINE_METRICS_PATH
+from .config import EARLY_STOPPING_CI_WIDTH
+from .rate_limiter import ModelRateLimiters, create_shared_rate_states
+from .results_store import ResultsStore, strategy_label
+
+# Set in each worker by _init_worker; the shared buckets make every worker draw from one budget per model.
+_worker_settings: Dict[str, Any] = {}
+
+def expand_grid(grid: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """One cell per dataset x model x strategy config x seed. Thresholds only apply to HighEntropyStrategy."""
+    strategy_configs = []
+    for strategy in grid["strategies"]:
+        if strategy == "HighEntropyStrategy":
+            strategy_configs.extend({strategy: {"threshold": threshold}} for threshold in grid.get("thresholds") or [0.5])
+        elif strategy == "DirectResponseStrategy":
+            strategy_configs.append({strategy: {}})
+        else:
+            raise ValueError(f"Unknown strategy: {strategy}")
+    return [
+        {"dataset_name": dataset_name, "model_id": model_id, "strategy_config": strategy_config, "seed": seed}
+        for dataset_name, model_id, strategy_config, seed in itertools.product(grid["datasets"], grid["models"], strategy_configs, grid["seeds"])
+    ]
+
+def _init_worker(settings: Dict[str, Any], shared_states: Dict[str, tuple]):
+    _worker_settings.update(settings)
+    _worker_settings["rate_limiters"] = ModelRateLimiters(
+        settings["requests_per_second"], settings["tokens_per_minute"], overrides=settings["rate_limits"], shared_states=shared_states
+    )
+
+def _run_cell(cell: Dict[str, Any]) -> Dict[str, Any]:
+    from .evaluation import run_full_pipeline
+
+    label = strategy_label(cell["strategy_config"])
+    output_csv_path = os.path.join(_worker_settings["output_dir"], f"{cell['dataset_name']}_{cell['model_id']}_{label}_seed{cell['seed']}.csv")
+    try:
+        summary = run_full_pipeline(
+            output_csv_path=output_csv_path, prompt_limit=_worker_settings["prompt_limit"], async_mode=True,
+            max_in_flight=_worker_settings["max_in_flight"], rate_limiters=_worker_settings["rate_limiters"],
+            resume=_worker_settings["resume"], results_root=_worker_settings["results_root"], **cell
+        )
+        error = None
+    except Exception as e:
+        # One failing cell (e.g. exhausted quota for one model) must not take down the rest of the sweep.
+        summary, error = {}, f"{type(e).__name__}: {e}"
+    return {"dataset": cell["dataset_name"], "model": cell["model_id"], "strategy": label, "seed": cell["seed"], **summary, "error": error}
+
+def merge_results(cells: List[Dict[str, Any]], results_root: str, prompt_limit: int):
+    """Concatenates every cell's store partition into one Arrow table with dataset/model/strategy/seed columns."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    tables = []
+    for cell in cells:
+        label = strategy_label(cell["strategy_config"])
+        table = ResultsStore(results_root, cell["dataset_name"], cell["model_id"], label, cell["seed"]).read_table()
+        table = table.filter(pc.less(table.column("prompt_index"), prompt_limit))
+        for name, value in (("dataset", cell["dataset_name"]), ("model", cell["model_id"]), ("strategy", label), ("seed", cell["seed"])):
+            table = table.append_column(name, pa.array([value] * table.num_rows))
+        tables.append(table)
+    return pa.concat_tables(tables) if tables else None
+
+def merge_online_metrics(cells: List[Dict[str, Any]], path: str = ONLINE_METRICS_PATH) -> List[Dict[str, Any]]:
+    """One row per dataset x model x strategy, merged over seeds from each cell's last online metrics snapshot."""
+    from eval.online_metrics import latest_snapshots, merge_snapshots
+
+    snapshots = latest_snapshots(path)
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for cell in cells:
+        key = (cell["dataset_name"], cell["model_id"], strategy_label(cell["strategy_config"]))
+        snapshot = snapshots.get(key + (cell["seed"],))
+        if snapshot is not None:
+            groups.setdefault(key, []).append(snapshot)
+    return [
+        {"dataset": dataset, "model": model, "strategy": strategy, "seeds": len(group), "n_prompts": merged.rows, **merged.metrics()}
+        for (dataset, model, strategy), group in sorted(groups.items()) for merged in [merge_snapshots(group)]
+    ]
+
+def _run_cells(pool, cells: List[Dict[str, Any]], summaries: List[Dict[str, Any]], total: int):
+    for summary in pool.imap_unordered(_run_cell, cells):
+        status = f"error={summary['error']}" if summary["error"] else f"accuracy={summary.get('accuracy', 0.0):.2f}"
+        if summary.get("early_stopped"):
+            status += f" stopped={summary['stop_reason']} after {summary['n_prompts']} prompts"
+        print(f"[sweep {len(summaries) + 1}/{total}] {summary['dataset']} {summary['model']} {summary['strategy']} seed={summary['seed']} {status}")
+        summaries.append(summary)
+
+def with_baselines(cells: List[Dict[str, Any]], baseline_summaries: List[Dict[str, Any]], early_stopping: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+    """cells with early_stopping settings; each gets the accuracy of the baseline cell with its dataset, model and seed to be tested against."""
+    baselines = {(summary["dataset"], summary["model"], summary["seed"]): summary["accuracy"]
+                 for summary in baseline_summaries if not summary["error"] and "accuracy" in summary}
+    result = []
+    for cell in cells:
+        cell_early_stopping = dict(early_stopping or {})
+        baseline_accuracy = baselines.get((cell["dataset_name"], cell["model_id"], cell["seed"]))
+        if baseline_accuracy is not None:
+            cell_early_stopping["baseline_accuracy"] = float(baseline_accuracy)
+        result.append({**cell, "early_stopping": cell_early_stopping or None})
+    return result
+
+def run_sweep(grid: Dict[str, Any], workers: int = None, prompt_limit: int = 20, output_dir: str = "eval_results/sweep",
+              requests_per_second: float = LANGDB_REQUESTS_PER_SECOND, tokens_per_minute: float = LANGDB_TOKENS_PER_MINUTE,
+              rate_limits: Dict[str, Dict[str, float]] = None, max_in_flight: int = LANGDB_MAX_IN_FLIGHT,
+              resume: bool = True, results_root: str = RESULTS_STORE_ROOT, early_stopping: Dict[str, Any] = None,
+              baseline_strategy: str = None) -> List[Dict[str, Any]]:
+    """
+    Runs every grid cell on a process pool. Workers share the on-disk response cache
+    and, per model, one requests/sec and tokens/min budget, so adding workers never
+    raises the request rate against the API. Returns one summary dict per cell.
+
+    early_stopping (see run_full_pipeline) stops cells once decided. With
+    baseline_strategy (a strategy label, e.g. DirectResponseStrategy) the baseline
+    cells run to prompt_limit first, and every other cell is stopped as soon as a
+    sequential test shows whether it is worse than the baseline of its seed.
+    """
+    import pandas as pd
+    import pyarrow.parquet as pq
+
+    cells = expand_grid(grid)
+    baseline_cells = []
+    if baseline_strategy:
+        baseline_cells = [cell for cell in cells if strategy_label(cell["strategy_config"]) == baseline_strategy]
+        if not baseline_cells:
+            raise ValueError(f"No cells with the baseline strategy {baseline_strategy} in the grid.")
+    other_cells = [cell for cell in cells if cell not in baseline_cells]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(cells)))
+    os.makedirs(output_dir, exist_ok=True)
+    print(f"Sweep: {len(cells)} cells on {workers} worker(s)")
+
+    # spawn: workers start without the parent's threads and open their own SQLite/HTTP connections.
+    context = multiprocessing.get_context("spawn")
+    # Hedge backups share the budget too, or each worker would give them a bucket of its own.
+    shared_states = create_shared_rate_states(sorted(set(grid["models"]) | set(LANGDB_HEDGE_BACKUPS.values())), requests_per_second, tokens_per_minute, rate_limits, context=context)
+    settings = {
+        "prompt_limit": prompt_limit, "output_dir": output_dir, "requests_per_second": requests_per_second, "tokens_per_minute": tokens_per_minute,
+        "rate_limits": rate_limits, "max_in_flight": max_in_flight, "resume": resume, "results_root": results_root
+    }
+    summaries = []
+    with context.Pool(processes=workers, initializer=_init_worker, initargs=(settings, shared_states)) as pool:
+        _run_cells(pool, baseline_cells, summaries, len(cells))
+        _run_cells(pool, with_baselines(other_cells, summaries, early_stopping), summaries, len(cells))
+
+    summary_path = os.path.join(output_dir, "sweep_summary.csv")
+    pd.DataFrame(summaries).sort_values(["dataset", "model", "strategy", "seed"]).to_csv(summary_path, index=False)
+    merged = merge_results(cells, results_root, prompt_limit)
+    if merged is not None:
+        pq.write_table(merged, os.path.join(output_dir, "sweep_results.parquet"))
+    online_rows = merge_online_metrics(cells)
+    if online_rows:
+        pd.DataFrame(online_rows).to_csv(os.path.join(output_dir, "sweep_online_metrics.csv"), index=False)
+    print(f"Sweep summary saved to {summary_path}; merged results in {os.path.join(output_dir, 'sweep_results.parquet')}")
+    return summaries
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Run a models x strategies x thresholds x seeds sweep on a process pool.")
+    parser.add_argument("--grid", type=str, help="JSON file with datasets, models, strategies, thresholds and seeds; overrides the flags below.")
+    parser.add_argument("--datasets", nargs="+", default=["TruthfulQA"])
+    parser.add_argument("--models", nargs="+", default=["gpt-4.1-nano"])
+    parser.add_argument("--strategies", nargs="+", default=["HighEntropyStrategy"])
+    parser.add_argument("--thresholds", nargs="+", type=float, default=[0.5])
+    parser.add_argument("--seeds", nargs="+", type=int, default=[42])
+    parser.add_argument("--prompt-limit", type=int, default=20)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count, at most one per cell).")
+    parser.add_argument("--requests-per-second", type=float, default=LANGDB_REQUESTS_PER_SECOND, help="Global budget per model, shared by all workers.")
+    parser.add_argument("--tokens-per-minute", type=float, default=LANGDB_TOKENS_PER_MINUTE, help="Global budget per model, shared by all workers.")
+    parser.add_argument("--max-in-flight", type=int, default=LANGDB_MAX_IN_FLIGHT, help="Concurrent requests per worker.")
+    parser.add_argument("--output-dir", type=str, default="eval_results/sweep")
+    parser.add_argument("--no-resume", action="store_true", help="Discard checkpointed rows of every cell instead of continuing after them.")
+    parser.add_argument("--early-stop", action="store_true", help="Stop each cell once its rates' confidence intervals are narrow enough.")
+    parser.add_argument("--early-stop-ci-width", type=float, default=EARLY_STOPPING_CI_WIDTH, help="Confidence interval width that ends a cell with --early-stop.")
+    parser.add_argument("--baseline-strategy", type=str, default=None,
+                        help="Strategy label (e.g. DirectResponseStrategy) run first; other cells stop once a sequential test against it decides.")
+    args = parser.parse_args(argv)
+
+    grid = {"datasets": args.datasets, "models": args.models, "strategies": args.strategies, "thresholds": args.thresholds, "seeds": args.seeds}
+    rate_limits = None
+    if args.grid:
+        with open(args.grid) as f:
+            grid_file = json.load(f)
+        rate_limits = grid_file.pop("rate_limits", None)
+        grid.update(grid_file)
+
+    run_sweep(grid, workers=args.workers, prompt_limit=args.prompt_limit, output_dir=args.output_dir,
+              requests_per_second=args.requests_per_second, tokens_per_minute=args.tokens_per_minute, rate_limits=rate_limits,
+              max_in_flight=args.max_in_flight, resume=not args.no_resume,
+              early_stopping={"ci_width": args.early_stop_ci_width} if args.early_stop else None, baseline_strategy=args.baseline_strategy)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import json
+import os
+import random
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, List
+
+# Upper bounds in seconds, roughly log-spaced from 100us (in-process stages) to 2 minutes (network).
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class Histogram:
+    __slots__ = ("bounds", "counts", "count", "sum")
+
+    def __init__(self, bounds: tuple = DEFAULT_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1) # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Bucket-resolution estimate (upper bound of the bucket holding the q-th observation)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, bucket_count in zip(self.bounds, self.counts):
+            seen += bucket_count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "p50": self.quantile(0.5),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "buckets": dict(zip([str(b) for b in self.bounds] + ["+Inf"], self.counts))
+        }
+
+class Telemetry:
+    """
+    In-process counters and latency histograms for the hot path.
+
+    Recording is a dict lookup plus a few additions under a lock; nothing is
+    serialized or written until export_jsonl / export_prometheus is called.
+    """
+    def __init__(self, log_sample_rate: float = 0.05):
+        self.log_sample_rate = log_sample_rate
+        self.counters: Dict[str, float] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self._lock = threading.Lock()
+        self._sampler = random.Random() # separate from the seeded global RNG used by runs
+        self._last_export = time.monotonic()
+
+    def increment(self, name: str, value: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float):
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(f"stage_seconds:{name}", time.perf_counter() - start)
+
+    def should_log(self) -> bool:
+        return self._sampler.random() < self.log_sample_rate
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "timestamp": time.time(),
+                "counters": dict(self.counters),
+                "histograms": {name: histogram.snapshot() for name, histogram in self.histograms.items()}
+            }
+
+    def export_jsonl(self, path: str, **labels):
+        snapshot = self.snapshot()
+        snapshot.update(labels)
+        _ensure_parent_dir(path)
+        with open(path, "a") as f:
+            f.write(json.dumps(snapshot) + "\n")
+
+    def export_prometheus(self, path: str, prefix: str = "symbolburn", **labels):
+        """Writes the Prometheus text exposition format, e.g. for node_exporter's textfile collector."""
+        base_labels = ",".join(f'{key}="{value}"' for key, value in sorted(labels.items()))
+        lines: List[str] = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                metric = f"{prefix}_{name}_total"
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric}{_labels(base_labels)} {value}")
+            previous_metric = None
+            for name, histogram in sorted(self.histograms.items()):
+                # "stage_seconds:network" becomes metric stage_seconds with label stage="network"
+                metric_name, _, stage = name.partition(":")
+                metric = f"{prefix}_{metric_name}"
+                series_labels = base_labels + ("," if base_labels and stage else "") + (f'stage="{stage}"' if stage else "")
+                if metric != previous_metric:
+                    lines.append(f"# TYPE {metric} histogram")
+                    previous_metric = metric
+                cumulative = 0
+                for bound, bucket_count in zip(list(histogram.bounds) + ["+Inf"], histogram.counts):
+                    cumulative += bucket_count
+                    bucket_labels = series_labels + ("," if series_labels else "") + f'le="{bound}"'
+                    lines.append(f"{metric}_bucket{{{bucket_labels}}} {cumulative}")
+                lines.append(f"{metric}_sum{_labels(series_labels)} {histogram.sum}")
+                lines.append(f"{metric}_count{_labels(series_labels)} {histogram.count}")
+        _ensure_parent_dir(path)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path) # scrapers never see a half-written file
+
+    def maybe_export(self, jsonl_path: str, prometheus_path: str, interval_seconds: float, **labels):
+        """Exports at most once per interval_seconds; cheap to call after every result."""
+        now = time.monotonic()
+        if now - self._last_export < interval_seconds:
+            return
+        self._last_export = now
+        if jsonl_path:
+            self.export_jsonl(jsonl_path, **labels)
+        if prometheus_path:
+            self.export_prometheus(prometheus_path, **labels)
+
+def _labels(label_string: str) -> str:
+    return f"{{{label_string}}}" if label_string else ""
+
+def _ensure_parent_dir(path: str):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+telemetry = Telemetry()
+
+_logging_configured = False
+
+def setup_logging(level: str = "INFO", log_sample_rate: float = None):
+    """
+    Configures loguru once per process. enqueue=True hands records to a background
+    writer thread, so logging never blocks the request path on terminal I/O.
+    """
+    global _logging_configured
+    if log_sample_rate is not None:
+        telemetry.log_sample_rate = log_sample_rate
+    if _logging_configured:
+        return
+    from loguru import logger
+    logger.remove()
+    logger.add(sys.stderr, level=level, enqueue=True, format="<green>{time:HH:mm:ss}</green> | <level>{level}</level> | <cyan>{message}</cyan>", colorize=True)
+    _logging_configured = True
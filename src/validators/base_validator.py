@@ -5,6 +5,14 @@ class BaseValidator(ABC):
     def validate(self, output: dict) -> dict:
         pass
 
+    def prepare(self, outputs: list):
+        """
+        Called once outputs are known to be headed for validation but their answers
+        are still streaming, so work that needs only the prompt can start early.
+        Does nothing by default.
+        """
+        pass
+
 
 
 
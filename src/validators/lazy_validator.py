@@ -0,0 +1,41 @@
+import threading
+from typing import Callable
+from .base_validator import BaseValidator
+from ..startup_profiler import startup_profiler
+
+class LazyValidator(BaseValidator):
+    """
+    Defers building a validator (and importing its model libraries) until the
+    first call. Runs that never route to validation never pay for the model load.
+    """
+    def __init__(self, factory: Callable[[], BaseValidator], name: str = "validator"):
+        self.factory = factory
+        self.name = name
+        self._validator = None
+        self._lock = threading.Lock() # prepare() may load the model from another thread than validate()
+
+    @property
+    def loaded(self) -> bool:
+        return self._validator is not None
+
+    @property
+    def validator(self) -> BaseValidator:
+        if self._validator is None:
+            with self._lock:
+                if self._validator is None:
+                    with startup_profiler.measure(self.name):
+                        self._validator = self.factory()
+        return self._validator
+
+    def validate(self, output: dict) -> dict:
+        return self.validator.validate(output)
+
+    def prepare(self, outputs: list):
+        # An output headed for validation is worth the model load, which then happens before the answer is complete.
+        self.validator.prepare(outputs)
+
+    def __getattr__(self, name):
+        # Forward everything else (validate_batch, ...) to the real validator.
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self.validator, name)
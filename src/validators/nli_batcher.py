@@ -0,0 +1,86 @@
+import threading
+import time
+from concurrent.futures import Future
+from typing import List, Tuple
+
+from .nli_contradiction_validator import NLIContradictionValidator
+
+class NLIBatcher:
+    """
+    Dynamic batching in front of NLIContradictionValidator.validate_batch.
+
+    Callers submit single outputs from any thread and get a Future back. A worker
+    thread flushes the pending items as one batch as soon as max_batch_size are
+    waiting, or max_wait_seconds after the oldest pending item arrived.
+    """
+    def __init__(self, validator: NLIContradictionValidator, max_batch_size: int = 16, max_wait_seconds: float = 0.05):
+        self.validator = validator
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.batches_flushed = 0
+        self.items_validated = 0
+        self._pending: List[Tuple[dict, Future, float]] = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="nli-batcher", daemon=True)
+        self._worker.start()
+
+    def submit(self, output: dict) -> Future:
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("NLIBatcher is closed.")
+            self._pending.append((output, future, time.monotonic()))
+            self._condition.notify()
+        return future
+
+    def validate(self, output: dict) -> dict:
+        return self.submit(output).result()
+
+    def _next_batch(self) -> List[Tuple[dict, Future, float]]:
+        with self._condition:
+            while True:
+                if self._pending:
+                    wait_left = self._pending[0][2] + self.max_wait_seconds - time.monotonic()
+                    if len(self._pending) >= self.max_batch_size or wait_left <= 0 or self._closed:
+                        batch = self._pending[:self.max_batch_size]
+                        del self._pending[:self.max_batch_size]
+                        return batch
+                    self._condition.wait(wait_left)
+                elif self._closed:
+                    return []
+                else:
+                    self._condition.wait()
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                results = self.validator.validate_batch([output for output, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future, _), result in zip(batch, results):
+                future.set_result(result)
+            self.batches_flushed += 1
+            self.items_validated += len(batch)
+
+    def stats(self) -> dict:
+        with self._condition:
+            pending = len(self._pending)
+        return {
+            "pending": pending,
+            "batches_flushed": self.batches_flushed,
+            "items_validated": self.items_validated,
+            "mean_batch_size": self.items_validated / self.batches_flushed if self.batches_flushed else 0.0
+        }
+
+    def close(self):
+        """Flushes everything still pending, then stops the worker thread."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._worker.join()
@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from .base_validator import BaseValidator
+
+NLI_CACHE_MODES = ("off", "read_write")
+_TABLES = ("nli_results", "premise_tokens")
+
+# Least recently used rows read per table and eviction round.
+_EVICT_BATCH = 64
+
+class NLICache:
+    """
+    Two-level cache of NLI results and tokenized premises.
+
+    Results are keyed by a hash of (model, premise, hypothesis); premise token ids
+    by a hash of (model, premise). Both live in a bounded in-memory LRU in front of
+    a SQLite database in WAL mode, so sweep workers share one file. Once the
+    stored payloads exceed max_bytes the least recently used rows are evicted.
+    """
+    def __init__(self, path: str, max_bytes: int = 256 << 20, memory_entries: int = 10_000, mode: str = "read_write"):
+        if mode not in NLI_CACHE_MODES:
+            raise ValueError(f"Unknown NLI cache mode: {mode}. Expected one of {NLI_CACHE_MODES}.")
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_entries = memory_entries
+        self.mode = mode
+        self.stats_counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "premise_token_hits": 0, "premise_token_misses": 0}
+        self._results: "OrderedDict[str, dict]" = OrderedDict()
+        self._premise_tokens: "OrderedDict[str, List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        self._pid = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    def _connection(self) -> sqlite3.Connection:
+        # SQLite connections must not be shared across fork, so reopen per process.
+        if self._conn is None or self._pid != os.getpid():
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            for table, column in zip(_TABLES, ("result TEXT", "input_ids BLOB")):
+                self._conn.execute(f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, {column} NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL)")
+                self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_last_access ON {table} (last_access)")
+            # Running total of the stored payload sizes, so writes never sum the whole tables.
+            self._conn.execute("CREATE TABLE IF NOT EXISTS cache_meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._conn.execute("INSERT OR IGNORE INTO cache_meta (name, value) "
+                               "SELECT 'bytes', (SELECT COALESCE(SUM(size), 0) FROM nli_results) + (SELECT COALESCE(SUM(size), 0) FROM premise_tokens)")
+            self._pid = os.getpid()
+        return self._conn
+
+    @staticmethod
+    def make_key(model: str, premise: str, hypothesis: str = None) -> str:
+        return hashlib.sha256(json.dumps([model, premise, hypothesis], separators=(",", ":")).encode()).hexdigest()
+
+    def _remember(self, memory: OrderedDict, key: str, value):
+        memory[key] = value
+        memory.move_to_end(key)
+        while len(memory) > self.memory_entries:
+            memory.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, dict]:
+        """Cached results for the keys that have one."""
+        if not self.enabled or not keys:
+            return {}
+        found = {}
+        with self._lock:
+            for key in keys:
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    found[key] = self._results[key]
+                    self.stats_counts["memory_hits"] += 1
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            rows = []
+            if missing:
+                conn = self._connection()
+                for start in range(0, len(missing), 500): # stay under SQLite's bound-parameter limit
+                    chunk = missing[start:start + 500]
+                    rows += conn.execute(f"SELECT key, result FROM nli_results WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                if rows:
+                    conn.executemany("UPDATE nli_results SET last_access = ? WHERE key = ?", [(time.time(), key) for key, _ in rows])
+                for key, payload in rows:
+                    found[key] = json.loads(payload)
+                    self._remember(self._results, key, found[key])
+            disk_keys = {key for key, _ in rows}
+            self.stats_counts["disk_hits"] += sum(1 for key in keys if key in disk_keys)
+            self.stats_counts["misses"] += sum(1 for key in keys if key not in found)
+        return found
+
+    def put_many(self, items: List[Tuple[str, dict]]):
+        if not self.enabled or not items:
+            return
+        now = time.time()
+        payloads = [(key, json.dumps(result, separators=(",", ":"))) for key, result in items]
+        with self._lock:
+            for key, result in items:
+                self._remember(self._results, key, result)
+            self._write("nli_results", "result", [(key, payload, len(payload), now) for key, payload in payloads])
+
+    def get_premise_tokens_many(self, model: str, premises: List[str]) -> Dict[str, List[int]]:
+        """Cached token ids for the premises that have them."""
+        if not self.enabled or not premises:
+            return {}
+        keys = {self.make_key(model, premise): premise for premise in premises}
+        found = {}
+        with self._lock:
+            for key, premise in keys.items():
+                if key in self._premise_tokens:
+                    self._premise_tokens.move_to_end(key)
+                    found[premise] = self._premise_tokens[key]
+            missing = [key for key, premise in keys.items() if premise not in found]
+            if missing:
+                conn = self._connection()
+                rows = []
+                for start in range(0, len(missing), 500): # stay under SQLite's bound-parameter limit
+                    chunk = missing[start:start + 500]
+                    rows += conn.execute(f"SELECT key, input_ids FROM premise_tokens WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+                if rows:
+                    conn.executemany("UPDATE premise_tokens SET last_access = ? WHERE key = ?", [(time.time(), key) for key, _ in rows])
+                for key, payload in rows:
+                    input_ids = array("i")
+                    input_ids.frombytes(payload)
+                    found[keys[key]] = input_ids.tolist()
+                    self._remember(self._premise_tokens, key, found[keys[key]])
+            self.stats_counts["premise_token_hits"] += len(found)
+            self.stats_counts["premise_token_misses"] += len(keys) - len(found)
+        return found
+
+    def put_premise_tokens_many(self, model: str, items: List[Tuple[str, List[int]]]):
+        if not self.enabled or not items:
+            return
+        now = time.time()
+        rows = []
+        with self._lock:
+            for premise, input_ids in items:
+                key = self.make_key(model, premise)
+                payload = array("i", input_ids).tobytes()
+                self._remember(self._premise_tokens, key, list(input_ids))
+                rows.append((key, payload, len(payload), now))
+            self._write("premise_tokens", "input_ids", rows)
+
+    def _write(self, table: str, column: str, rows: list):
+        rows = list({row[0]: row for row in rows}.values()) # one row per key, so the size delta below is exact
+        conn = self._connection()
+        # One write transaction, so eviction sees a consistent total across processes.
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            replaced = 0
+            for start in range(0, len(rows), 500): # stay under SQLite's bound-parameter limit
+                chunk = [row[0] for row in rows[start:start + 500]]
+                replaced += conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table} WHERE key IN ({','.join('?' * len(chunk))})", chunk).fetchone()[0]
+            conn.executemany(f"INSERT OR REPLACE INTO {table} (key, {column}, size, last_access) VALUES (?, ?, ?, ?)", rows)
+            self._evict(conn, sum(row[2] for row in rows) - replaced)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _evict(self, conn: sqlite3.Connection, added_bytes: int):
+        total = conn.execute("SELECT value FROM cache_meta WHERE name = 'bytes'").fetchone()[0] + added_bytes
+        while total > self.max_bytes:
+            # The oldest rows of each table, merged; both reads use the last_access indexes.
+            rows = sorted(
+                (last_access, table, key, size) for table in _TABLES
+                for key, size, last_access in conn.execute(f"SELECT key, size, last_access FROM {table} ORDER BY last_access ASC LIMIT ?", (_EVICT_BATCH,))
+            )
+            if not rows:
+                break
+            for _, table, key, size in rows[:_EVICT_BATCH]:
+                if total <= self.max_bytes:
+                    break
+                conn.execute(f"DELETE FROM {table} WHERE key = ?", (key,))
+                total -= size
+        conn.execute("UPDATE cache_meta SET value = ? WHERE name = 'bytes'", (total,))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.stats_counts)
+            entries, total = (0, 0)
+            if self.enabled:
+                conn = self._connection()
+                entries = sum(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in _TABLES)
+                total = conn.execute("SELECT value FROM cache_meta WHERE name = 'bytes'").fetchone()[0]
+        lookups = counts["memory_hits"] + counts["disk_hits"] + counts["misses"]
+        return {**counts, "hit_rate": (counts["memory_hits"] + counts["disk_hits"]) / lookups if lookups else 0.0, "entries": entries, "bytes": total}
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+class CachedNLIValidator(BaseValidator):
+    """
+    NLICache in front of an NLI validator. Only cache misses reach the wrapped
+    validator, so with a LazyValidator a fully cached run never loads the model.
+    model identifies the scores in the cache (model name and backend).
+    """
+    def __init__(self, validator: BaseValidator, cache: NLICache, model: str):
+        self.validator = validator
+        self.cache = cache
+        self.model = model
+
+    def _key(self, output: dict) -> Optional[str]:
+        from .nli_contradiction_validator import NLIContradictionValidator
+        pair = NLIContradictionValidator.nli_pair(output)
+        return None if pair is None else self.cache.make_key(self.model, *pair)
+
+    def validate(self, output: dict) -> dict:
+        return self.validate_batch([output])[0]
+
+    def prepare(self, outputs: List[dict]):
+        # Scores are keyed on the complete answer, so whether they are cached is not known yet.
+        self.validator.prepare(outputs)
+
+    def validate_batch(self, outputs: List[dict]) -> List[dict]:
+        keys = [self._key(output) for output in outputs]
+        cached = self.cache.get_many([key for key in keys if key is not None])
+        results = [cached.get(key) if key is not None else {"contradiction_flag": False, "nli_scores": {}} for key in keys]
+        missing = [i for i, result in enumerate(results) if result is None]
+        if missing:
+            fresh = self.validator.validate_batch([outputs[i] for i in missing])
+            for i, result in zip(missing, fresh):
+                results[i] = result
+            self.cache.put_many([(keys[i], results[i]) for i in missing])
+        return results
@@ -1,33 +1,177 @@
-from transformers import pipeline
+import os
+import threading
+from typing import Dict, List
 from .base_validator import BaseValidator
+from .lazy_validator import LazyValidator
+from .nli_cache import CachedNLIValidator, NLICache
+from .nli_daemon import NLIDaemonClient
+from ..startup_profiler import lazy_import
+
+DEFAULT_NLI_MODEL = "MoritzLaurer/DeBERTa-v3-large-mnli-fever-anli-ling-wanli"
+NLI_BACKENDS = ("transformers", "torch_int8", "onnx")
+NLI_LABELS = ("contradiction", "entailment", "neutral")
 
 class NLIContradictionValidator(BaseValidator):
-    def __init__(self):
-        self.nli_pipeline = pipeline(
-            "text-classification",
-            model="MoritzLaurer/DeBERTa-v3-large-mnli-fever-anli-ling-wanli",
-            truncation=True
-        )
+    """
+    Backends (all CPU):
+        transformers: the fp32 HuggingFace model.
+        torch_int8:   the same model with its Linear layers dynamically quantized to int8.
+        onnx:         an int8-quantized ONNX Runtime export (requires optimum[onnxruntime]).
+                      The export is built once and reused from onnx_cache_dir.
+    """
+    _tokenizer_lock = threading.Lock() # prepare() and validate_batch() run on different threads
 
-    def validate(self, output: dict) -> dict:
+    def __init__(self, model_name: str = DEFAULT_NLI_MODEL, backend: str = "transformers", batch_size: int = 16, onnx_cache_dir: str = ".cache/nli_onnx",
+                 cache: NLICache = None):
+        if backend not in NLI_BACKENDS:
+            raise ValueError(f"Unknown NLI backend: {backend}. Expected one of {NLI_BACKENDS}.")
+        self.model_name = model_name
+        self.backend = backend
+        self.batch_size = batch_size
+        self.cache = cache # premise token ids are reused from here instead of tokenizing the question again
+
+        if backend == "transformers":
+            self.nli_pipeline = lazy_import("transformers").pipeline(
+                "text-classification",
+                model=model_name,
+                truncation=True
+            )
+        elif backend == "torch_int8":
+            self.nli_pipeline = self._build_torch_int8_pipeline(model_name)
+        else:
+            self.nli_pipeline = self._build_onnx_pipeline(model_name, onnx_cache_dir)
+
+    @staticmethod
+    def _build_torch_int8_pipeline(model_name: str):
+        torch = lazy_import("torch")
+        transformers = lazy_import("transformers")
+
+        model = transformers.AutoModelForSequenceClassification.from_pretrained(model_name)
+        model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        tokenizer = transformers.AutoTokenizer.from_pretrained(model_name)
+        return transformers.pipeline("text-classification", model=model, tokenizer=tokenizer, truncation=True, device=-1)
+
+    @staticmethod
+    def _build_onnx_pipeline(model_name: str, onnx_cache_dir: str):
+        try:
+            from optimum.onnxruntime import ORTModelForSequenceClassification, ORTQuantizer
+            from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        except ImportError as e:
+            raise ImportError("The onnx NLI backend requires optimum[onnxruntime]: pip install 'optimum[onnxruntime]'") from e
+        transformers = lazy_import("transformers")
+        AutoTokenizer = transformers.AutoTokenizer
+
+        export_dir = os.path.join(onnx_cache_dir, model_name.replace("/", "--"))
+        quantized_dir = export_dir + "-int8"
+        if not os.path.isdir(quantized_dir):
+            ORTModelForSequenceClassification.from_pretrained(model_name, export=True).save_pretrained(export_dir)
+            quantizer = ORTQuantizer.from_pretrained(export_dir)
+            quantizer.quantize(save_dir=quantized_dir, quantization_config=AutoQuantizationConfig.avx2(is_static=False, per_channel=False))
+            AutoTokenizer.from_pretrained(model_name).save_pretrained(quantized_dir)
+
+        model = ORTModelForSequenceClassification.from_pretrained(quantized_dir, file_name="model_quantized.onnx")
+        tokenizer = AutoTokenizer.from_pretrained(quantized_dir)
+        return transformers.pipeline("text-classification", model=model, tokenizer=tokenizer, truncation=True, device=-1)
+
+    @staticmethod
+    def nli_pair(output: dict) -> tuple or None:
         premise = output.get("messages", [{}])[0].get("content", "") # Assuming the first message is the prompt
         hypothesis = output.get("text", "")
 
         if not premise or not hypothesis:
-            return {"contradiction_flag": False, "nli_scores": {}}
-
-        nli_results = self.nli_pipeline([f"{premise} [SEP] {hypothesis}"])
-        
-        # Extract scores and determine contradiction_flag
-        nli_scores_list = nli_results[0] # Get the single dictionary from the list
-        nli_scores = {nli_scores_list["label"]: nli_scores_list["score"]}
-        
+            return None
+        return premise, hypothesis
+
+    def _premise_ids(self, premises: List[str]) -> Dict[str, List[int]]:
+        """Token ids of each premise with the special tokens ([CLS] premise [SEP]); cached ones are not tokenized again."""
+        caching = self.cache is not None and self.cache.enabled
+        premise_ids = self.cache.get_premise_tokens_many(self.model_name, premises) if caching else {}
+        missing = [premise for premise in premises if premise not in premise_ids]
+        if missing:
+            with self._tokenizer_lock:
+                fresh = [list(input_ids) for input_ids in self.nli_pipeline.tokenizer(missing, truncation=True)["input_ids"]]
+            premise_ids.update(zip(missing, fresh))
+            if caching:
+                self.cache.put_premise_tokens_many(self.model_name, list(zip(missing, fresh)))
+        return premise_ids
+
+    def _encode(self, pairs: List[tuple]) -> List[List[int]]:
+        """Model input ids of each pair: the premise ids, then the hypothesis and a closing [SEP], truncated to the model's maximum length."""
+        tokenizer = self.nli_pipeline.tokenizer
+        premise_ids = self._premise_ids(list(dict.fromkeys(premise for premise, _ in pairs)))
+        with self._tokenizer_lock:
+            hypothesis_ids = tokenizer([hypothesis for _, hypothesis in pairs], add_special_tokens=False, truncation=True)["input_ids"]
+        max_length = tokenizer.model_max_length
+        return [(premise_ids[premise] + list(input_ids))[:max_length - 1] + [tokenizer.sep_token_id] for (premise, _), input_ids in zip(pairs, hypothesis_ids)]
+
+    def _classify(self, batch_ids: List[List[int]]) -> List[list]:
+        """One forward pass over a batch of input ids; label scores per input, in the shape the pipeline returns with top_k=None."""
+        torch = lazy_import("torch")
+        model = self.nli_pipeline.model
+        inputs = self.nli_pipeline.tokenizer.pad({"input_ids": batch_ids}, return_tensors="pt")
+        with torch.no_grad():
+            probabilities = model(**inputs).logits.softmax(dim=-1).tolist()
+        labels = model.config.id2label
+        return [[{"label": labels[k], "score": score} for k, score in enumerate(row)] for row in probabilities]
+
+    @staticmethod
+    def _to_result(label_scores: list) -> dict:
+        # label_scores holds every label of the model (pipeline called with top_k=None)
+        nli_scores = {entry["label"].lower(): entry["score"] for entry in label_scores}
+
         # Initialize default scores for labels if not present
-        nli_scores.setdefault("contradiction", 0.0)
-        nli_scores.setdefault("entailment", 0.0)
-        nli_scores.setdefault("neutral", 0.0)
+        for label in NLI_LABELS:
+            nli_scores.setdefault(label, 0.0)
 
         contradiction_flag = nli_scores["contradiction"] > nli_scores["entailment"] and \
                              nli_scores["contradiction"] > nli_scores["neutral"]
 
         return {"contradiction_flag": contradiction_flag, "nli_scores": nli_scores}
+
+    def validate(self, output: dict) -> dict:
+        return self.validate_batch([output])[0]
+
+    def prepare(self, outputs: List[dict]):
+        """Tokenizes the premises (the prompts) into the cache, so validate_batch only has to encode the answers."""
+        if self.cache is None or not self.cache.enabled:
+            return
+        premises = [output.get("messages", [{}])[0].get("content", "") for output in outputs]
+        self._premise_ids(list(dict.fromkeys(premise for premise in premises if premise)))
+
+    def validate_batch(self, outputs: List[dict]) -> List[dict]:
+        """
+        Validates many outputs with as few forward passes as possible. Inputs are
+        encoded once (see _encode) and sorted by token length before being cut into
+        batches, so each batch is padded to a similar length. Results keep the order of outputs.
+        """
+        results = [{"contradiction_flag": False, "nli_scores": {}} for _ in outputs]
+        pending = [(i, pair) for i, pair in enumerate(map(self.nli_pair, outputs)) if pair is not None]
+        if not pending:
+            return results
+
+        input_ids = self._encode([pair for _, pair in pending])
+        order = sorted(range(len(pending)), key=lambda j: len(input_ids[j]))
+
+        for start in range(0, len(order), self.batch_size):
+            chunk = order[start:start + self.batch_size]
+            nli_results = self._classify([input_ids[j] for j in chunk])
+            for j, label_scores in zip(chunk, nli_results):
+                results[pending[j][0]] = self._to_result(label_scores)
+        return results
+
+def build_nli_validator(backend: str = "transformers", batch_size: int = 16, cache: NLICache = None, model_name: str = DEFAULT_NLI_MODEL,
+                        daemon_socket: str = None) -> BaseValidator:
+    """
+    The NLI validator as the pipeline uses it: the model is loaded on first use and,
+    with an enabled cache, only for results the cache does not already hold. With
+    daemon_socket, cache misses go to a running NLI daemon (src/validators/nli_daemon.py)
+    serving the same model and backend, and the model is loaded in-process only without one.
+    """
+    # Scores differ slightly between backends, so the backend is part of the cache key.
+    model = f"{model_name}:{backend}"
+    validator = LazyValidator(lambda: NLIContradictionValidator(model_name=model_name, backend=backend, batch_size=batch_size, cache=cache), name="NLIContradictionValidator")
+    if daemon_socket:
+        validator = NLIDaemonClient(daemon_socket, fallback=validator, model=model)
+    if cache is None or not cache.enabled:
+        return validator
+    return CachedNLIValidator(validator, cache, model=model)
@@ -0,0 +1,283 @@
+import argparse
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .base_validator import BaseValidator
+
+# Protocol: one JSON object per line in each direction over a Unix stream socket.
+#   {"op": "hello"}                          -> {"model": "<name>:<backend>"}
+#   {"op": "validate", "pairs": [[p, h], ..]} -> {"results": [{"contradiction_flag": .., "nli_scores": {..}}, ..]}
+#   {"op": "stats"}                          -> {"stats": {..}}
+# Errors are answered with {"error": "<message>"}.
+
+class NLIDaemonError(RuntimeError):
+    pass
+
+def _output(premise: str, hypothesis: str) -> dict:
+    # The shape NLIContradictionValidator.nli_pair reads.
+    return {"messages": [{"role": "user", "content": premise}], "text": hypothesis}
+
+def _socket_in_use(socket_path: str) -> bool:
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon = self.server.nli_daemon
+        daemon._count("connections")
+        daemon._count("active_connections")
+        try:
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    reply = daemon.handle(json.loads(line))
+                except Exception as e:
+                    reply = {"error": f"{type(e).__name__}: {e}"}
+                self.wfile.write(json.dumps(reply).encode() + b"\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            daemon._count("active_connections", -1)
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+class NLIDaemon:
+    """
+    Long-lived NLI server holding one copy of the model. Clients connect over a
+    Unix socket (see NLIDaemonClient); the pairs of every connected client go
+    through one NLIBatcher, so concurrent sweep workers share forward passes.
+    The model is loaded when the daemon starts, not on the first request.
+    """
+    def __init__(self, socket_path: str, validator_factory: Callable[[], BaseValidator], model: str,
+                 max_batch_size: int = 16, max_wait_seconds: float = 0.05):
+        from .nli_batcher import NLIBatcher
+
+        # Checked before the model is loaded: a socket something still listens on belongs to a running daemon.
+        if os.path.exists(socket_path):
+            if _socket_in_use(socket_path):
+                raise NLIDaemonError(f"An NLI daemon is already serving {socket_path}.")
+            os.unlink(socket_path) # left behind by a daemon that did not shut down cleanly
+        self.socket_path = socket_path
+        self.model = model
+        self.counts = {"connections": 0, "active_connections": 0, "requests": 0, "items": 0}
+        self._lock = threading.Lock()
+        self._started_at = time.time()
+        start = time.perf_counter()
+        self.validator = validator_factory()
+        self.load_seconds = time.perf_counter() - start
+        self.batcher = NLIBatcher(self.validator, max_batch_size=max_batch_size, max_wait_seconds=max_wait_seconds)
+
+        directory = os.path.dirname(socket_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._server = _Server(socket_path, _Handler)
+        self._server.nli_daemon = self
+        self._thread = None
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counts[name] += n
+
+    def handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        if op == "hello":
+            return {"model": self.model}
+        if op == "stats":
+            return {"stats": self.stats()}
+        if op == "validate":
+            pairs = request["pairs"]
+            self._count("requests")
+            self._count("items", len(pairs))
+            futures = [self.batcher.submit(_output(premise, hypothesis)) for premise, hypothesis in pairs]
+            return {"results": [future.result() for future in futures]}
+        raise ValueError(f"Unknown op: {op}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            counts = dict(self.counts)
+        return {"model": self.model, "pid": os.getpid(), "load_seconds": self.load_seconds, "uptime_seconds": time.time() - self._started_at,
+                **counts, **self.batcher.stats()}
+
+    def serve_forever(self):
+        self._server.serve_forever()
+
+    def start(self) -> "NLIDaemon":
+        """Serves from a background thread (tests, or a daemon embedded in another process)."""
+        self._thread = threading.Thread(target=self.serve_forever, name="nli-daemon", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+        self._server.server_close()
+        self.batcher.close()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _request(sock_file, request: Dict[str, Any]) -> Dict[str, Any]:
+    sock_file.write(json.dumps(request).encode() + b"\n")
+    sock_file.flush()
+    line = sock_file.readline()
+    if not line:
+        raise ConnectionError("NLI daemon closed the connection")
+    reply = json.loads(line)
+    if "error" in reply:
+        raise NLIDaemonError(reply["error"])
+    return reply
+
+def daemon_stats(socket_path: str, timeout: float = 5.0) -> Dict[str, Any]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        with sock.makefile("rwb") as sock_file:
+            return _request(sock_file, {"op": "stats"})["stats"]
+
+class NLIDaemonClient(BaseValidator):
+    """
+    Sends NLI pairs to an NLIDaemon and falls back to the in-process validator
+    (normally a LazyValidator, so the model is only loaded if actually needed)
+    when no daemon is listening, it serves a different model, or the connection
+    breaks. The daemon is tried again after retry_seconds.
+    """
+    def __init__(self, socket_path: str, fallback: BaseValidator, model: str, timeout: float = 300.0, retry_seconds: float = 30.0):
+        self.socket_path = socket_path
+        self.fallback = fallback
+        self.model = model
+        self.timeout = timeout
+        self.retry_seconds = retry_seconds
+        self.counts = {"daemon_items": 0, "fallback_items": 0, "daemon_errors": 0}
+        self._sock = None
+        self._sock_file = None
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self) -> bool:
+        if self._sock_file is not None:
+            return True
+        if time.monotonic() < self._retry_at or not os.path.exists(self.socket_path):
+            return False
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        try:
+            sock.connect(self.socket_path)
+            sock_file = sock.makefile("rwb")
+            daemon_model = _request(sock_file, {"op": "hello"})["model"]
+        except (OSError, ValueError, NLIDaemonError) as e:
+            sock.close()
+            self._unavailable(f"NLI daemon at {self.socket_path} not reachable ({e}); running NLI in-process.")
+            return False
+        if daemon_model != self.model:
+            sock_file.close()
+            sock.close()
+            self._unavailable(f"NLI daemon at {self.socket_path} serves {daemon_model}, not {self.model}; running NLI in-process.")
+            return False
+        self._sock, self._sock_file = sock, sock_file
+        return True
+
+    def _unavailable(self, message: str):
+        print(message)
+        self._retry_at = time.monotonic() + self.retry_seconds
+
+    def _disconnect(self):
+        if self._sock_file is not None:
+            self._sock_file.close()
+            self._sock.close()
+        self._sock = self._sock_file = None
+
+    def _validate_remote(self, pairs: List[tuple]) -> Optional[List[dict]]:
+        with self._lock:
+            if not self._connect():
+                return None
+            try:
+                results = _request(self._sock_file, {"op": "validate", "pairs": [list(pair) for pair in pairs]})["results"]
+            except NLIDaemonError as e:
+                # The daemon answered with an error; the connection itself is still usable.
+                self.counts["daemon_errors"] += 1
+                print(f"NLI daemon could not validate a batch ({e}); running it in-process.")
+                return None
+            except (OSError, ValueError) as e:
+                self._disconnect()
+                self.counts["daemon_errors"] += 1
+                self._unavailable(f"NLI daemon connection failed ({e}); running NLI in-process.")
+                return None
+        self.counts["daemon_items"] += len(pairs)
+        return results
+
+    def validate(self, output: dict) -> dict:
+        return self.validate_batch([output])[0]
+
+    def validate_batch(self, outputs: List[dict]) -> List[dict]:
+        from .nli_contradiction_validator import NLIContradictionValidator
+        pairs = [NLIContradictionValidator.nli_pair(output) for output in outputs]
+        pending = [i for i, pair in enumerate(pairs) if pair is not None]
+        results = [{"contradiction_flag": False, "nli_scores": {}} for _ in outputs]
+        if not pending:
+            return results
+        remote = self._validate_remote([pairs[i] for i in pending])
+        if remote is None:
+            remote = self.fallback.validate_batch([outputs[i] for i in pending])
+            self.counts["fallback_items"] += len(pending)
+        for i, result in zip(pending, remote):
+            results[i] = result
+        return results
+
+    def stats(self) -> Dict[str, Any]:
+        return dict(self.counts)
+
+    def close(self):
+        with self._lock:
+            self._disconnect()
+
+def main():
+    from ..config import NLI_BACKEND, NLI_BATCH_SIZE, NLI_DAEMON_SOCKET, PIPELINE_NLI_MAX_WAIT_SECONDS
+    from .nli_contradiction_validator import DEFAULT_NLI_MODEL, NLIContradictionValidator
+
+    parser = argparse.ArgumentParser(description="Serve the NLI model over a Unix socket, so pipeline runs and sweep workers skip loading it.")
+    parser.add_argument("command", nargs="?", choices=("serve", "stats"), default="serve")
+    parser.add_argument("--socket", default=NLI_DAEMON_SOCKET)
+    parser.add_argument("--model", default=DEFAULT_NLI_MODEL)
+    parser.add_argument("--backend", default=NLI_BACKEND)
+    parser.add_argument("--batch-size", type=int, default=NLI_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=PIPELINE_NLI_MAX_WAIT_SECONDS * 1000, help="Longest a pair waits for its batch to fill.")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        print(json.dumps(daemon_stats(args.socket), indent=2))
+        return
+
+    print(f"Loading {args.model} ({args.backend})...")
+    daemon = NLIDaemon(args.socket, lambda: NLIContradictionValidator(model_name=args.model, backend=args.backend, batch_size=args.batch_size),
+                       model=f"{args.model}:{args.backend}", max_batch_size=args.batch_size, max_wait_seconds=args.max_wait_ms / 1000)
+    print(f"NLI daemon on {args.socket} (model loaded in {daemon.load_seconds:.1f}s)")
+    try:
+        daemon.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served: {daemon.stats()}")
+        daemon.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+
+from src.async_engine import AsyncGenerationEngine
+from src.neural_generator import NeuralGenerator
+from src.rate_limiter import ModelRateLimiters, TokenBucket
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def create_chat_completion(self, model: str, messages: list, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(random.uniform(0.001, 0.02))
+        self.in_flight -= 1
+        content = messages[0]["content"]
+        return {
+            "choices": [{"message": {"content": f"answer to {content}"}, "logprobs": None}],
+            "usage": {"total_tokens": 10}
+        }
+
+def test_generate_all_preserves_order_and_bounds_concurrency():
+    client = FakeAsyncClient()
+    engine = AsyncGenerationEngine(
+        generator=NeuralGenerator(langdb_client=client),
+        rate_limiters=ModelRateLimiters(requests_per_second=1000, tokens_per_minute=None),
+        max_in_flight=4
+    )
+    requests = [{"model": "m", "messages": [{"role": "user", "content": str(i)}], "temperature": 0.8, "max_tokens": 16} for i in range(20)]
+
+    results = asyncio.run(engine.generate_all(requests))
+
+    assert [r.output["text"] for r in results] == [f"answer to {i}" for i in range(20)]
+    assert all(r.error is None and r.latency > 0 for r in results)
+    assert client.max_in_flight <= 4
+
+def test_token_bucket_throttles_to_rate():
+    async def _run():
+        bucket = TokenBucket(rate=50, capacity=1)
+        start = time.monotonic()
+        for _ in range(6):
+            await bucket.acquire(1)
+        return time.monotonic() - start
+
+    # The first acquire is free, the remaining five wait ~20ms each.
+    assert asyncio.run(_run()) >= 0.09
+
+def test_shared_budget_spans_limiters():
+    from src.rate_limiter import create_shared_rate_states
+    states = create_shared_rate_states(["m"], requests_per_second=50, tokens_per_minute=None)
+
+    async def _run():
+        # Two limiters built from the same state, as two sweep workers would.
+        first = ModelRateLimiters(50, None, shared_states=states).for_model("m")
+        second = ModelRateLimiters(50, None, shared_states=states).for_model("m")
+        start = time.monotonic()
+        for _ in range(50):
+            await first.acquire()
+        for _ in range(5):
+            await second.acquire()
+        return time.monotonic() - start
+
+    # The full bucket covers the first 50; the second limiter has to wait for refills.
+    assert asyncio.run(_run()) >= 0.09
+
+class StragglerClient(FakeAsyncClient):
+    """Every call to the model "slow" takes 1s; everything else is fast."""
+    async def create_chat_completion(self, model: str, messages: list, **kwargs):
+        if model == "slow":
+            await asyncio.sleep(1.0)
+        return await super().create_chat_completion(model, messages, **kwargs)
+
+def test_stragglers_are_hedged_to_backup_model():
+    engine = AsyncGenerationEngine(
+        generator=NeuralGenerator(langdb_client=StragglerClient()),
+        rate_limiters=ModelRateLimiters(requests_per_second=1000, tokens_per_minute=None),
+        max_in_flight=4, hedge_quantile=0.9, hedge_min_samples=5, hedge_backups={"slow": "fast"}
+    )
+    for _ in range(10):
+        engine.latency_tracker.observe("slow", 0.01)
+    requests = [{"model": "slow", "messages": [{"role": "user", "content": str(i)}], "temperature": 0.8, "max_tokens": 16} for i in range(4)]
+
+    start = time.monotonic()
+    results = asyncio.run(engine.generate_all(requests))
+
+    assert time.monotonic() - start < 0.5
+    assert all(r.error is None and r.hedged_model == "fast" for r in results)
+    assert [r.output["text"] for r in results] == [f"answer to {i}" for i in range(4)]
+
+def test_rate_limited_requests_are_retried_and_shrink_concurrency():
+    from src.langdb_client import AsyncLangDBClient
+    from src.http_transport import HTTPPool
+    from src.mock_langdb_server import MockLangDBServer
+
+    async def _run(server):
+        client = AsyncLangDBClient("key", "project", base_url=server.base_url, pool=HTTPPool())
+        engine = AsyncGenerationEngine(NeuralGenerator(langdb_client=client), ModelRateLimiters(1000, None), max_in_flight=8, max_rate_limit_retries=5)
+        try:
+            return await engine.generate_all([{"model": "m", "messages": [{"role": "user", "content": str(i)}], "temperature": 0.8, "max_tokens": 16} for i in range(12)]), engine
+        finally:
+            await client.close()
+
+    with MockLangDBServer(rate_limit_every=3, retry_after_seconds=0.01) as server:
+        results, engine = asyncio.run(_run(server))
+
+    assert all(r.error is None for r in results)
+    assert sum(r.rate_limit_retries for r in results) == server.stats["rate_limited"] > 0
+    assert engine.concurrency.limit < 8
@@ -0,0 +1,75 @@
+import json
+
+import pytest
+
+from src.batch_jobs import BatchJobError, BatchJobRunner, LocalBatchBackend
+from src.http_transport import HTTPPool
+from src.langdb_client import LangDBClient
+from src.mock_langdb_server import MockLangDBServer
+from src.neural_generator import NeuralGenerator
+from src.response_cache import ResponseCache
+
+def _request(i):
+    return {"model": "mock", "messages": [{"role": "user", "content": f"question {i}"}], "temperature": 0.8, "max_tokens": 32, "seed": 42,
+            "prompt_cache_key": f"key-{i}"}
+
+def _generator(cache=None, base_url="http://127.0.0.1:9", features=()):
+    return NeuralGenerator(LangDBClient("key", "project", cache=cache, base_url=base_url, pool=HTTPPool()), features=features)
+
+def test_one_submission_matches_live_generation(tmp_path):
+    backend = LocalBatchBackend(str(tmp_path / "jobs"))
+    runner = BatchJobRunner(backend, _generator(features=("varentropy",)), str(tmp_path / "inputs"), poll_interval=0.01)
+    results = sorted(runner.run([_request(i) for i in range(30)]), key=lambda result: result[0])
+
+    assert len(runner.jobs) == 1 and runner.jobs[0]["requests"] == 30 and runner.jobs[0]["status"] == "completed"
+    with open(runner.jobs[0]["input_path"]) as f:
+        line = json.loads(f.readline())
+    assert line["url"] == "/v1/chat/completions" and "prompt_cache_key" not in line["body"] and line["body"]["logprobs"]
+
+    with MockLangDBServer() as server:
+        live = _generator(base_url=server.base_url, features=("varentropy",))
+        for i, output, error, _ in results:
+            assert error is None
+            expected = live.generate(**_request(i))
+            assert output["text"] == expected["text"]
+            assert output["entropy"] == expected["entropy"] and output["varentropy"] == expected["varentropy"]
+            assert output["messages"] == _request(i)["messages"]
+
+def test_results_are_cached_for_the_next_run(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    backend = LocalBatchBackend(str(tmp_path / "jobs"))
+    first = BatchJobRunner(backend, _generator(cache), str(tmp_path / "inputs"), poll_interval=0.01)
+    first_texts = {i: output["text"] for i, output, _, _ in first.run([_request(i) for i in range(5)])}
+
+    second = BatchJobRunner(backend, _generator(cache), str(tmp_path / "inputs"), poll_interval=0.01)
+    second_texts = {i: output["text"] for i, output, _, _ in second.run([_request(i) for i in range(6)])}
+
+    assert len(second.jobs) == 1 and second.jobs[0]["requests"] == 1 # only the new prompt was submitted
+    assert second_texts == {**first_texts, 5: second_texts[5]}
+    cache.close()
+
+def test_local_results_do_not_answer_live_requests(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+    backend = LocalBatchBackend(str(tmp_path / "jobs"))
+    generator = _generator(cache)
+    list(BatchJobRunner(backend, generator, str(tmp_path / "inputs"), poll_interval=0.01).run([_request(i) for i in range(3)]))
+
+    assert cache.stats()["entries"] == 3
+    assert not any(generator.is_cached(**_request(i)) for i in range(3))
+    cache.close()
+
+def test_failed_lines_become_errors(tmp_path):
+    backend = LocalBatchBackend(str(tmp_path / "jobs"), fail_every=3)
+    runner = BatchJobRunner(backend, _generator(), str(tmp_path / "inputs"), poll_interval=0.01)
+    results = list(runner.run([_request(i) for i in range(9)]))
+
+    errors = sorted(i for i, output, error, _ in results if error is not None)
+    assert errors == [2, 5, 8]
+    assert all(isinstance(error, BatchJobError) for _, _, error, _ in results if error is not None)
+    assert len(results) == 9
+
+def test_timeout_cancels_the_job(tmp_path):
+    backend = LocalBatchBackend(str(tmp_path / "jobs"), seconds_per_request=0.05)
+    runner = BatchJobRunner(backend, _generator(), str(tmp_path / "inputs"), poll_interval=0.01, timeout=0.05)
+    with pytest.raises(BatchJobError, match="cancelled"):
+        list(runner.run([_request(i) for i in range(50)]))
@@ -0,0 +1,16 @@
+from benchmarks.pipeline_benchmark import build_workload, regressions, run_suite
+
+def test_suite_reports_every_stage():
+    workload = build_workload(n_responses=40, tokens=32, token_jitter=0.5, top_k=5, spread_min=0.2, spread_max=3.0, tool_call_rate=0.1, seed=0)
+    results = run_suite(workload, threshold=0.3, batch_size=16)
+
+    stages = [result["stage"] for result in results]
+    assert stages == ["tool_intent", "entropy", "entropy_batch[16]", "completion.from_dict", "entropy[completion]", "entropy_batch[16,completion]", "feature_plan[all,completion]", "neural_generator", "scheduler.route", "scheduler.route_batch", "end_to_end"]
+    assert all(result["throughput_per_s"] > 0 and result["p50_ms"] <= result["p99_ms"] for result in results)
+    # 40 responses in batches of 16: the last batch holds 8, and is counted as 8.
+    assert all(result["items"] == 40 for result in results)
+    # The spread range yields a mix of low- and high-entropy responses.
+    assert 0 < results[0]["fallback_share"] < 1
+
+    baseline = {result["stage"]: {**result, "throughput_per_s": result["throughput_per_s"] * 2} for result in results}
+    assert len(regressions(results, baseline, tolerance=0.1)) == len(results)
@@ -0,0 +1,93 @@
+import math
+import time
+
+from src.cascade import CascadeBudget, CascadeExecutor
+from src.neural_generator import NeuralGenerator
+from src.scheduler import Scheduler
+from src.strategies.direct_response_strategy import DirectResponseStrategy
+from src.strategies.high_entropy_strategy import HighEntropyStrategy
+
+HIGH, LOW = math.log(0.4), math.log(0.99) # -p*log(p) ~= 0.37 and ~= 0.01 per token
+
+class CascadeClient:
+    """The small model is unsure about prompts containing "hard"; the big model answers after fallback_delay seconds."""
+    def __init__(self, fallback_delay: float = 0.0, chunk_delay: float = 0.0, recovers_after: int = None):
+        self.fallback_delay = fallback_delay
+        self.chunk_delay = chunk_delay
+        self.recovers_after = recovers_after # streamed tokens after which the small model becomes confident
+        self.calls = []
+        self.cache = None
+
+    def _logprobs(self, model: str, prompt: str, n_tokens: int):
+        if model == "big" or "hard" not in prompt:
+            return [LOW] * n_tokens
+        return [HIGH if self.recovers_after is None or i < self.recovers_after else LOW for i in range(n_tokens)]
+
+    def create_chat_completion(self, model: str, messages: list, **kwargs):
+        self.calls.append(model)
+        if model == "big":
+            time.sleep(self.fallback_delay)
+        content = [{"token": "x", "logprob": logprob, "top_logprobs": []} for logprob in self._logprobs(model, messages[0]["content"], 20)]
+        return {"model": model, "choices": [{"message": {"content": f"{model} answer"}, "logprobs": {"content": content}}],
+                "usage": {"prompt_tokens": 5, "completion_tokens": 20, "total_tokens": 25 if model == "small" else 100}}
+
+    def stream_chat_completion(self, model: str, messages: list, **kwargs):
+        self.calls.append(model)
+        for i, logprob in enumerate(self._logprobs(model, messages[0]["content"], 200)):
+            time.sleep(self.chunk_delay)
+            yield {"choices": [{"delta": {"content": "x" if i else f"{model} answer "}, "logprobs": {"content": [{"token": "x", "logprob": logprob}]}}]}
+
+def _executor(client, budget=None, speculative=False, prices=None):
+    scheduler = Scheduler(strategies=[HighEntropyStrategy(threshold=0.2, fallback_model_id="big", early_margin=0.05, early_min_tokens=10), DirectResponseStrategy()])
+    return CascadeExecutor(NeuralGenerator(langdb_client=client), scheduler, budget, speculative=speculative, prices=prices)
+
+def _request(prompt):
+    return {"model": "small", "messages": [{"role": "user", "content": prompt}], "temperature": 0.8, "max_tokens": 64, "seed": 1}
+
+def test_routed_prompts_escalate_until_the_budget_runs_out():
+    client = CascadeClient()
+    executor = _executor(client, CascadeBudget(max_fallback_tokens=150))
+
+    easy = executor.run(_request("easy question"))
+    hard = executor.run(_request("hard question"))
+    over_budget = executor.run(_request("another hard question"))
+
+    assert easy["output"]["text"] == "small answer" and not easy["accounting"]["escalated"]
+    assert hard["output"]["text"] == "big answer" and hard["accounting"]["fallback_tokens"] == 100
+    assert over_budget["output"]["text"] == "small answer" and over_budget["accounting"]["skipped"] == "token_budget"
+    assert client.calls == ["small", "small", "big", "small"]
+    summary = executor.summary()
+    assert (summary["escalations"], summary["skipped_escalations"]) == (1, 1)
+    assert summary["saved_fallback_tokens"] == 3 * 100 - 100
+
+def test_speculative_fallback_wins_and_closes_the_primary_stream():
+    client = CascadeClient(chunk_delay=0.005)
+    result = _executor(client, speculative=True).run(_request("hard question"))
+
+    assert result["output"]["text"] == "big answer"
+    assert result["accounting"]["speculative"] and result["accounting"]["winner"] == "fallback"
+    assert result["primary_output"]["stream_abandoned"]
+
+def test_speculative_fallback_is_dropped_when_the_primary_recovers():
+    client = CascadeClient(fallback_delay=0.5, recovers_after=12)
+    executor = _executor(client, speculative=True)
+    result = executor.run(_request("hard question"))
+    executor.close()
+
+    assert result["output"]["text"].startswith("small answer")
+    assert result["routing"]["routing_decision"] == "direct_response"
+    assert result["accounting"]["speculative"] and result["accounting"]["winner"] == "primary"
+    # The dropped call still counts against the budget once it finishes, as waste rather than as the row's fallback.
+    assert executor.budget.spent_tokens == 100
+    row = executor.accounting()[0]
+    assert (row["fallback_tokens"], row["fallback_latency"], row["wasted_fallback_tokens"]) == (0, None, 100)
+    assert result["accounting"]["fallback_tokens"] == 0
+
+def test_baseline_is_priced_at_the_fallback_model_before_any_fallback_call():
+    executor = _executor(CascadeClient(), prices={"small": (1.0, 1.0), "big": (10.0, 10.0)})
+    executor.run(_request("easy question"))
+
+    row = executor.accounting()[0]
+    # 25 primary tokens at the big model's prices, against 25 at the small model's.
+    assert row["baseline_cost"] == 25 * 10.0 / 1_000_000
+    assert row["saved_cost"] > 0
@@ -0,0 +1,60 @@
+import math
+import random
+import sys
+
+import numpy as np
+
+from benchmarks.pipeline_benchmark import synthetic_response
+from src.completion import Completion
+from src.feature_extraction.entropy_extractor import EntropyExtractor
+from src.feature_extraction.tool_intent_extractor import ToolIntentExtractor
+from src.http_transport import HTTPPool
+from src.langdb_client import LangDBClient
+from src.mock_langdb_server import MockLangDBServer
+from src.response_cache import ResponseCache
+
+def _deep_size(value) -> int:
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(_deep_size(k) + _deep_size(v) for k, v in value.items())
+    elif isinstance(value, list):
+        size += sum(_deep_size(item) for item in value)
+    return size
+
+def test_completion_matches_dict_features_and_is_much_smaller():
+    rng = random.Random(0)
+    responses = [synthetic_response(rng, 256, 5, spread, tool_call=(spread == 3.0)) for spread in (0.5, 1.5, 3.0)]
+    completions = [Completion.from_dict(response) for response in responses]
+    extractor = EntropyExtractor()
+
+    for response, completion in zip(responses, completions):
+        assert completion.tokens == [token_data["token"] for token_data in response["choices"][0]["logprobs"]["content"]]
+        assert math.isclose(extractor.compute_entropy(completion), extractor.compute_entropy(response))
+        assert ToolIntentExtractor().extract_tool_flag(completion) == ToolIntentExtractor().extract_tool_flag(response)
+        assert _deep_size(response) > 10 * completion.nbytes
+    from_dicts = extractor.compute_entropy_batch(responses)
+    from_completions = extractor.compute_entropy_batch(completions)
+    for name in ("entropy", "topk_entropy", "varentropy", "max_token_entropy"):
+        np.testing.assert_allclose(from_completions[name], from_dicts[name])
+
+    round_trip = Completion.from_dict(completions[0].to_dict())
+    assert round_trip.text == completions[0].text and round_trip.tokens == completions[0].tokens
+    np.testing.assert_array_equal(round_trip.top_logprobs, completions[0].top_logprobs)
+
+def test_client_caches_compact_completion_and_keeps_raw_only_on_request(tmp_path):
+    request = {"model": "mock", "messages": [{"role": "user", "content": "q"}], "seed": 1, "logprobs": True, "top_logprobs": 5}
+    with MockLangDBServer() as server:
+        pool = HTTPPool()
+        cache = ResponseCache(str(tmp_path / "responses.sqlite"))
+        client = LangDBClient("key", "project", cache=cache, base_url=server.base_url, pool=pool)
+        fresh = client.create_chat_completion(**request)
+        cached = client.create_chat_completion(**request)
+        with_raw = LangDBClient("key", "project", base_url=server.base_url, pool=pool, keep_raw=True).create_chat_completion(**request)
+        pool.close()
+
+    assert server.stats["requests"] == 2
+    assert fresh.raw is None and fresh.top_logprobs.shape == (fresh.n_tokens, 5)
+    assert cached.text == fresh.text
+    np.testing.assert_array_equal(cached.logprobs, fresh.logprobs)
+    np.testing.assert_array_equal(cached.top_logprobs, fresh.top_logprobs)
+    assert with_raw.raw["choices"][0]["message"]["content"] == fresh.text
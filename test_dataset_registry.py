@@ -0,0 +1,15 @@
+from eval.datasets.registry import open_source, prompt_id
+
+def test_shards_are_disjoint_and_ids_stable(tmp_path):
+    source = tmp_path / "prompts.jsonl"
+    source.write_text("".join(f'{{"Question": "question {i}"}}\n' for i in range(10)))
+    dataset = open_source(str(source), cache_dir=str(tmp_path / "cache"))
+    assert len(dataset) == 10
+
+    rows = [row for shard in range(3) for row in dataset.iter_shard(shard, 3, batch_size=2)]
+    assert [row for row, _, _ in rows] == list(range(10))
+    assert all(pid == prompt_id(prompt) for _, pid, prompt in rows)
+    assert dataset.prompts(limit=2) == ["question 0", "question 1"]
+
+    # A second open reuses the converted file instead of parsing the source again.
+    assert open_source(str(source), cache_dir=str(tmp_path / "cache")).arrow_path == dataset.arrow_path
@@ -0,0 +1,53 @@
+import random
+
+from eval.early_stopping import EarlyStopping, wilson_interval
+from src.sweep import with_baselines
+
+def _row(fallback=False, contradiction=False):
+    return {"routing_decision": "fallback_validation" if fallback else "direct_response", "contradiction_flag": contradiction}
+
+def test_wilson_interval():
+    low, high = wilson_interval(50, 100)
+    assert low < 0.5 < high and abs((high - low) - 0.192) < 0.005
+    assert wilson_interval(0, 0) == (0.0, 1.0)
+    assert wilson_interval(0, 20)[0] < 1e-12 and wilson_interval(20, 20)[1] > 1 - 1e-12
+
+def test_stops_once_intervals_are_narrow():
+    rng = random.Random(0)
+    stopper = EarlyStopping(ci_width=0.2, min_samples=30)
+    while not stopper.stopped:
+        stopper.update(_row(fallback=rng.random() < 0.3, contradiction=rng.random() < 0.1), correct=rng.random() < 0.5)
+    # The widest interval (accuracy near 0.5) needs roughly (2 * 1.96 / 0.2)^2 / 4 = 96 samples.
+    assert stopper.stop_reason == "ci_width" and 80 <= stopper.counts["n"] <= 110
+    summary = stopper.summary()
+    assert summary["accuracy_ci_high"] - summary["accuracy_ci_low"] <= 0.2
+
+def test_min_samples_hold_back_a_decision():
+    stopper = EarlyStopping(ci_width=0.9, min_samples=10)
+    for _ in range(9):
+        stopper.update(_row(), correct=True)
+    assert not stopper.stopped
+    stopper.update(_row(), correct=True)
+    assert stopper.stop_reason == "ci_width"
+
+def test_sequential_test_against_baseline():
+    rng = random.Random(1)
+    worse = EarlyStopping(baseline_accuracy=0.6, margin=0.15)
+    while not worse.stopped:
+        worse.update(_row(), correct=rng.random() < 0.3)
+    assert worse.stop_reason == "worse_than_baseline"
+
+    as_good = EarlyStopping(baseline_accuracy=0.6, margin=0.15)
+    while not as_good.stopped:
+        as_good.update(_row(), correct=rng.random() < 0.65)
+    assert as_good.stop_reason == "not_worse_than_baseline"
+    assert as_good.summary()["baseline_accuracy"] == 0.6
+
+def test_sweep_cells_get_the_baseline_of_their_seed():
+    cells = [{"dataset_name": "TruthfulQA", "model_id": "m", "strategy_config": {"HighEntropyStrategy": {"threshold": 0.5}}, "seed": seed} for seed in (1, 2, 3)]
+    baselines = [{"dataset": "TruthfulQA", "model": "m", "seed": 1, "accuracy": 0.4, "error": None},
+                 {"dataset": "TruthfulQA", "model": "m", "seed": 2, "error": "RuntimeError: quota"}]
+    result = with_baselines(cells, baselines, {"ci_width": 0.1})
+    assert result[0]["early_stopping"] == {"ci_width": 0.1, "baseline_accuracy": 0.4}
+    assert result[1]["early_stopping"] == {"ci_width": 0.1}
+    assert with_baselines(cells[2:], baselines)[0]["early_stopping"] is None
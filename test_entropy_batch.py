@@ -0,0 +1,32 @@
+import math
+
+import numpy as np
+
+from src.feature_extraction.entropy_extractor import EntropyExtractor
+
+def _response(tokens):
+    content = [{"token": f"t{i}", "logprob": math.log(probs[0]), "top_logprobs": [{"token": f"c{j}", "logprob": math.log(p)} for j, p in enumerate(probs)]} for i, probs in enumerate(tokens)]
+    return {"choices": [{"message": {"content": "x"}, "logprobs": {"content": content}}]}
+
+def test_batch_matches_scalar_entropy_and_topk_moments():
+    responses = [
+        _response([[0.5, 0.25, 0.25], [0.9, 0.1]]),
+        _response([[0.6, 0.2, 0.1, 0.05, 0.05]]),
+        {"choices": [{"message": {"content": "no logprobs"}, "logprobs": None}]}
+    ]
+    extractor = EntropyExtractor()
+
+    features = extractor.compute_entropy_batch(responses)
+
+    for i in range(2):
+        assert math.isclose(features["entropy"][i], extractor.compute_entropy(responses[i]))
+    assert np.isnan(features["entropy"][2]) and np.isnan(features["topk_entropy"][2])
+    assert list(features["n_tokens"]) == [2, 1, 0]
+
+    h_first = -(0.5 * math.log(0.5) + 2 * 0.25 * math.log(0.25))
+    h_second = -(0.9 * math.log(0.9) + 0.1 * math.log(0.1))
+    assert math.isclose(features["topk_entropy"][0], (h_first + h_second) / 2)
+    assert math.isclose(features["max_token_entropy"][0], h_first)
+    varentropy_first = 0.5 * math.log(0.5) ** 2 + 2 * 0.25 * math.log(0.25) ** 2 - h_first ** 2
+    varentropy_second = 0.9 * math.log(0.9) ** 2 + 0.1 * math.log(0.1) ** 2 - h_second ** 2
+    assert math.isclose(features["varentropy"][0], (varentropy_first + varentropy_second) / 2)
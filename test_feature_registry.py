@@ -0,0 +1,69 @@
+import math
+
+import pytest
+
+from src.feature_extraction.entropy_extractor import EntropyExtractor
+from src.feature_extraction.registry import FEATURES, FeaturePlan, register_feature
+from src.neural_generator import NeuralGenerator
+from src.scheduler import build_scheduler
+from test_entropy_batch import _response
+
+RESPONSES = [
+    _response([[0.5, 0.25, 0.25], [0.9, 0.1], [0.7, 0.3], [0.99]]),
+    _response([[0.6, 0.2, 0.1, 0.05, 0.05]]),
+    {"choices": [{"message": {"content": "no logprobs"}, "logprobs": None}]}
+]
+
+def test_one_plan_matches_the_separate_extractors():
+    plan = FeaturePlan(FEATURES)
+    batch = EntropyExtractor().compute_entropy_batch(RESPONSES)
+
+    for i, response in enumerate(RESPONSES):
+        features = plan.extract(response)
+        assert features["entropy"] == EntropyExtractor().compute_entropy(response)
+        assert features["n_tokens"] == batch["n_tokens"][i]
+        for name in ("topk_entropy", "varentropy", "max_token_entropy"):
+            assert (features[name] is None and math.isnan(batch[name][i])) or math.isclose(features[name], batch[name][i])
+
+    first = plan.extract(RESPONSES[0])
+    assert math.isclose(first["top_margin"], (0.25 + 0.8 + 0.4 + 0.99) / 4)
+    terms = [-p * math.log(p) for p in (0.5, 0.9, 0.7, 0.99)]
+    assert first["segment_entropy"] == pytest.approx(terms) and first["max_segment_entropy"] == pytest.approx(max(terms))
+    assert plan.extract(RESPONSES[1])["segment_entropy"][1:] == [None, None, None]
+    assert plan.extract(RESPONSES[2])["tool_flag"] is False and plan.extract(RESPONSES[2])["top_margin"] is None
+
+def test_only_features_declared_by_strategies_are_computed():
+    calls = []
+
+    @register_feature("test_counting", inputs=["logprobs"])
+    def _counting(view):
+        calls.append(view.n_tokens)
+        return 1.0
+
+    class CountingStrategy:
+        features = ("test_counting",)
+
+        def decide(self, output):
+            return "fallback_validation" if output["test_counting"] else None
+
+    class Client:
+        cache = None
+
+        def create_chat_completion(self, model, messages, **kwargs):
+            return RESPONSES[0]
+
+    request = {"model": "m", "messages": [{"role": "user", "content": "q"}], "temperature": 0.8, "max_tokens": 16}
+    try:
+        plain = NeuralGenerator(langdb_client=Client(), features=build_scheduler({"HighEntropyStrategy": {"threshold": 0.5}}).required_features())
+        assert set(plain.generate(**request)) == {"text", "completion", "entropy", "tool_flag", "messages"} and calls == []
+
+        scheduler = build_scheduler({"HighEntropyStrategy": {"threshold": 0.5}})
+        scheduler.strategies.insert(0, CountingStrategy())
+        assert scheduler.required_features() == ("test_counting", "entropy")
+        output = NeuralGenerator(langdb_client=Client(), features=scheduler.required_features()).generate(**request)
+        assert scheduler.route(output)["routing_decision"] == "fallback_validation" and calls == [4]
+    finally:
+        del FEATURES["test_counting"]
+
+    with pytest.raises(ValueError):
+        FeaturePlan(["no_such_feature"])
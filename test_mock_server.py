@@ -0,0 +1,61 @@
+import asyncio
+
+import openai
+import pytest
+
+from src.async_engine import AsyncGenerationEngine
+from src.http_transport import HTTPPool
+from src.langdb_client import AsyncLangDBClient, LangDBClient
+from src.mock_langdb_server import MockLangDBServer
+from src.neural_generator import NeuralGenerator
+from src.rate_limiter import ModelRateLimiters
+
+def _request(i):
+    return {"model": "mock", "messages": [{"role": "user", "content": f"question {i}"}], "temperature": 0.8, "max_tokens": 32, "seed": 42}
+
+def test_sync_client_reuses_pooled_connection():
+    with MockLangDBServer() as server:
+        pool = HTTPPool()
+        generator = NeuralGenerator(langdb_client=LangDBClient("key", "project", base_url=server.base_url, pool=pool))
+        outputs = [generator.generate(**_request(i)) for i in range(10)]
+        pool.close()
+
+    assert all(output["text"] and output["entropy"] is not None for output in outputs)
+    assert server.stats["requests"] == 10
+    assert server.stats["connections"] == 1
+    # Deterministic in (model, messages, seed)
+    assert outputs[0]["completion"].text == server.completion(_request(0))["choices"][0]["message"]["content"]
+
+def test_async_engine_bounded_by_pool_and_in_flight():
+    async def _run(server):
+        client = AsyncLangDBClient("key", "project", base_url=server.base_url, pool=HTTPPool(max_connections=4))
+        engine = AsyncGenerationEngine(NeuralGenerator(langdb_client=client), ModelRateLimiters(1000, None), max_in_flight=8)
+        try:
+            return await engine.generate_all([_request(i) for i in range(24)])
+        finally:
+            await client.close()
+
+    with MockLangDBServer(latency_seconds=0.01) as server:
+        results = asyncio.run(_run(server))
+
+    assert all(result.error is None for result in results)
+    assert server.stats["connections"] <= 4
+
+def test_rate_limited_requests_raise_rate_limit_error():
+    with MockLangDBServer(rate_limit_every=2) as server:
+        pool = HTTPPool()
+        client = LangDBClient("key", "project", base_url=server.base_url, pool=pool)
+        client.create_chat_completion(**_request(0))
+        with pytest.raises(openai.RateLimitError):
+            client.create_chat_completion(**_request(1))
+        pool.close()
+    assert server.stats["rate_limited"] == 1
+
+def test_streaming_matches_shape():
+    with MockLangDBServer() as server:
+        pool = HTTPPool()
+        client = LangDBClient("key", "project", base_url=server.base_url, pool=pool)
+        chunks = list(client.stream_chat_completion(**_request(3), logprobs=True, top_logprobs=5))
+        pool.close()
+
+    assert chunks[-1]["usage"]["completion_tokens"] == sum(1 for chunk in chunks if chunk["choices"] and chunk["choices"][0]["delta"].get("content"))
@@ -0,0 +1,70 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from src.validators.nli_batcher import NLIBatcher
+from src.validators.nli_contradiction_validator import NLIContradictionValidator
+
+class FakeTokenizer:
+    """One "id" per word; no special tokens except the closing separator."""
+    sep_token_id = "[SEP]"
+    model_max_length = 512
+
+    def __call__(self, texts, truncation=True, add_special_tokens=True):
+        return {"input_ids": [text.split() for text in texts]}
+
+class FakeNLIPipeline:
+    """Labels an answer as contradiction when it contains 'not'."""
+    def __init__(self):
+        self.tokenizer = FakeTokenizer()
+        self.batches = []
+
+    def classify(self, batch_ids):
+        self.batches.append([len(input_ids) for input_ids in batch_ids])
+        results = []
+        for input_ids in batch_ids:
+            contradiction = 0.8 if "not" in input_ids else 0.1
+            results.append([
+                {"label": "contradiction", "score": contradiction},
+                {"label": "entailment", "score": 0.9 - contradiction},
+                {"label": "neutral", "score": 0.1}
+            ])
+        return results
+
+def _validator(batch_size: int) -> NLIContradictionValidator:
+    validator = NLIContradictionValidator.__new__(NLIContradictionValidator)
+    validator.batch_size = batch_size
+    validator.cache = None
+    validator.nli_pipeline = FakeNLIPipeline()
+    validator._classify = validator.nli_pipeline.classify # no model forward pass
+    return validator
+
+def _output(question: str, answer: str) -> dict:
+    return {"messages": [{"role": "user", "content": question}], "text": answer}
+
+def test_validate_batch_keeps_order_and_groups_by_length():
+    validator = _validator(batch_size=2)
+    outputs = [
+        _output("q", "it is not " + "long " * 10),
+        _output("q", "yes"),
+        _output("q", ""),
+        _output("q", "it is not"),
+        _output("q", "short answer here")
+    ]
+
+    results = validator.validate_batch(outputs)
+
+    assert [r["contradiction_flag"] for r in results] == [True, False, False, True, False]
+    assert results[2] == {"contradiction_flag": False, "nli_scores": {}}
+    assert set(results[0]["nli_scores"]) == {"contradiction", "entailment", "neutral"}
+    assert [sorted(batch) for batch in validator.nli_pipeline.batches] == [[3, 5], [5, 15]]
+
+def test_batcher_flushes_on_size_and_timeout():
+    validator = _validator(batch_size=8)
+    batcher = NLIBatcher(validator, max_batch_size=4, max_wait_seconds=0.05)
+
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        results = list(pool.map(batcher.validate, [_output("q", f"answer {i} is not right") for i in range(6)]))
+    batcher.close()
+
+    assert all(r["contradiction_flag"] for r in results)
+    assert batcher.stats()["items_validated"] == 6
+    assert batcher.stats()["batches_flushed"] < 6
@@ -0,0 +1,84 @@
+from src.validators.nli_cache import CachedNLIValidator, NLICache
+from src.validators.nli_contradiction_validator import NLIContradictionValidator
+from test_nli_batching import FakeNLIPipeline, FakeTokenizer, _output
+
+class IdTokenizer(FakeTokenizer):
+    """Integer ids (word lengths), so premise ids can be stored."""
+    sep_token_id = 0
+
+    def __call__(self, texts, truncation=True, add_special_tokens=True):
+        return {"input_ids": [[len(word) for word in text.split()] for text in texts]}
+
+def _validator(cache: NLICache) -> NLIContradictionValidator:
+    validator = NLIContradictionValidator.__new__(NLIContradictionValidator)
+    validator.model_name = "fake-nli"
+    validator.batch_size = 4
+    validator.cache = cache
+    validator.nli_pipeline = FakeNLIPipeline()
+    validator.nli_pipeline.tokenizer = IdTokenizer()
+    validator._classify = validator.nli_pipeline.classify
+    return validator
+
+def test_repeated_pairs_skip_the_model_across_processes(tmp_path):
+    path = str(tmp_path / "nli.sqlite")
+    outputs = [_output("q one", "it is not so"), _output("q one", "yes it is"), _output("q two", ""), _output("q two", "maybe")]
+
+    cache = NLICache(path)
+    inner = _validator(cache)
+    validator = CachedNLIValidator(inner, cache, model="fake-nli:test")
+    first = validator.validate_batch(outputs)
+    assert validator.validate_batch(outputs) == first
+    assert len(inner.nli_pipeline.batches) == 1
+    assert cache.stats()["memory_hits"] == 3 and cache.stats()["premise_token_misses"] == 2
+    cache.close()
+
+    # A new cache on the same file (another sweep worker) reads the results and premise tokens from disk.
+    reopened = NLICache(path)
+    fresh = _validator(reopened)
+    assert CachedNLIValidator(fresh, reopened, model="fake-nli:test").validate_batch(outputs) == first
+    assert fresh.nli_pipeline.batches == []
+    fresh.validate_batch([_output("q one", "a new answer")])
+    assert reopened.stats()["disk_hits"] == 3 and reopened.stats()["premise_token_hits"] == 1
+
+    # Other model identities do not share results.
+    other = _validator(reopened)
+    CachedNLIValidator(other, reopened, model="fake-nli:onnx").validate_batch(outputs)
+    assert len(other.nli_pipeline.batches) == 1
+
+def test_cached_premise_ids_are_fed_to_the_model(tmp_path):
+    cache = NLICache(str(tmp_path / "nli.sqlite"))
+    cache.put_premise_tokens_many("fake-nli", [("q one", [7, 7, 7])])
+    validator = _validator(cache)
+    received = []
+    validator._classify = lambda batch_ids: received.extend(batch_ids) or validator.nli_pipeline.classify(batch_ids)
+
+    validator.validate_batch([_output("q one", "it is"), _output("q two", "yes")])
+    assert sorted(received) == [[1, 3, 3, 0], [7, 7, 7, 2, 2, 0]]
+    assert cache.get_premise_tokens_many("fake-nli", ["q two"]) == {"q two": [1, 3]}
+    cache.close()
+
+def test_prepare_tokenizes_premises_before_the_answer_is_complete(tmp_path):
+    cache = NLICache(str(tmp_path / "nli.sqlite"))
+    validator = CachedNLIValidator(_validator(cache), cache, model="fake-nli:test")
+    validator.prepare([_output("q one", "it")])
+    validator.validate_batch([_output("q one", "it is not so")])
+    # Tokenized once, by prepare; validate_batch found the premise in the cache.
+    assert (cache.stats()["premise_token_misses"], cache.stats()["premise_token_hits"]) == (1, 1)
+    cache.close()
+
+def test_eviction_keeps_the_database_under_max_bytes(tmp_path):
+    cache = NLICache(str(tmp_path / "nli.sqlite"), max_bytes=1000, memory_entries=2)
+    result = {"contradiction_flag": False, "nli_scores": {"contradiction": 0.1, "entailment": 0.8, "neutral": 0.1}}
+    for i in range(50):
+        cache.put_many([(cache.make_key("m", f"premise {i}", "hypothesis"), result)])
+
+    stats = cache.stats()
+    assert 0 < stats["bytes"] <= 1000 and stats["entries"] < 50
+    newest = cache.make_key("m", "premise 49", "hypothesis")
+    assert cache.get_many([cache.make_key("m", "premise 0", "hypothesis"), newest]) == {newest: result}
+
+def test_off_mode_stores_nothing(tmp_path):
+    path = tmp_path / "nli.sqlite"
+    cache = NLICache(str(path), mode="off")
+    cache.put_many([(cache.make_key("m", "p", "h"), {"contradiction_flag": True, "nli_scores": {}})])
+    assert cache.get_many([cache.make_key("m", "p", "h")]) == {} and not path.exists()
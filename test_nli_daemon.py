@@ -0,0 +1,89 @@
+import socket
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.validators.nli_contradiction_validator import build_nli_validator
+from src.validators.nli_daemon import NLIDaemon, NLIDaemonClient, NLIDaemonError, daemon_stats
+
+class FakeNLIValidator:
+    """Labels an answer as contradiction when it contains 'not'; records the batch sizes it was called with."""
+    def __init__(self):
+        self.batches = []
+
+    def validate_batch(self, outputs):
+        self.batches.append(len(outputs))
+        results = []
+        for output in outputs:
+            contradiction = " not " in f" {output['text']} "
+            results.append({"contradiction_flag": contradiction, "nli_scores": {"contradiction": 0.8 if contradiction else 0.1}})
+        return results
+
+class FailingValidator:
+    def validate_batch(self, outputs):
+        raise AssertionError("the in-process fallback should not be used")
+
+def _output(question: str, answer: str) -> dict:
+    return {"messages": [{"role": "user", "content": question}], "text": answer}
+
+def test_clients_share_the_daemon_batches(tmp_path):
+    socket_path = str(tmp_path / "nli.sock")
+    validator = FakeNLIValidator()
+    with NLIDaemon(socket_path, lambda: validator, model="fake:transformers", max_batch_size=8, max_wait_seconds=0.2):
+        clients = [NLIDaemonClient(socket_path, fallback=FailingValidator(), model="fake:transformers") for _ in range(4)]
+        with ThreadPoolExecutor(4) as pool:
+            results = list(pool.map(lambda client: client.validate_batch([_output("q", "it is not"), _output("q", "it is"), _output("", "empty")]), clients))
+        stats = daemon_stats(socket_path)
+        for client in clients:
+            client.close()
+
+    for result in results:
+        assert [r["contradiction_flag"] for r in result] == [True, False, False]
+        assert result[2]["nli_scores"] == {} # no premise: answered by the client, not sent
+    assert stats["items"] == 8 and stats["connections"] == 5 # 4 clients and the stats query
+    assert sum(validator.batches) == 8 and len(validator.batches) < 4 # pairs of different clients were batched together
+    assert clients[0].stats()["daemon_items"] == 2 and clients[0].stats()["fallback_items"] == 0
+
+def test_falls_back_without_a_daemon(tmp_path):
+    fallback = FakeNLIValidator()
+    client = NLIDaemonClient(str(tmp_path / "missing.sock"), fallback=fallback, model="fake:transformers")
+    assert client.validate(_output("q", "it is not"))["contradiction_flag"]
+    assert fallback.batches == [1] and client.stats()["fallback_items"] == 1
+
+def test_falls_back_when_the_daemon_serves_another_model(tmp_path):
+    socket_path = str(tmp_path / "nli.sock")
+    fallback = FakeNLIValidator()
+    with NLIDaemon(socket_path, FakeNLIValidator, model="fake:onnx"):
+        client = NLIDaemonClient(socket_path, fallback=fallback, model="fake:transformers")
+        client.validate_batch([_output("q", "a"), _output("q", "b")])
+    assert fallback.batches == [2]
+
+def test_falls_back_when_the_daemon_fails_a_batch(tmp_path):
+    socket_path = str(tmp_path / "nli.sock")
+    fallback = FakeNLIValidator()
+    with NLIDaemon(socket_path, FailingValidator, model="fake:transformers"):
+        client = NLIDaemonClient(socket_path, fallback=fallback, model="fake:transformers")
+        assert client.validate(_output("q", "it is not"))["contradiction_flag"]
+        client.close()
+    assert fallback.batches == [1] and client.stats()["daemon_errors"] == 1
+
+def test_a_live_socket_is_not_taken_over(tmp_path):
+    socket_path = str(tmp_path / "nli.sock")
+    with NLIDaemon(socket_path, FakeNLIValidator, model="fake:transformers"):
+        with pytest.raises(NLIDaemonError, match="already serving"):
+            NLIDaemon(socket_path, FakeNLIValidator, model="fake:transformers")
+        assert daemon_stats(socket_path)["model"] == "fake:transformers"
+
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(socket_path) # a socket file nothing listens on, as after a crash
+    stale.close()
+    with NLIDaemon(socket_path, FakeNLIValidator, model="fake:transformers"):
+        assert daemon_stats(socket_path)["model"] == "fake:transformers"
+
+def test_build_nli_validator_uses_the_daemon(tmp_path):
+    socket_path = str(tmp_path / "nli.sock")
+    with NLIDaemon(socket_path, FakeNLIValidator, model="fake-model:transformers"):
+        validator = build_nli_validator(model_name="fake-model", daemon_socket=socket_path)
+        assert validator.validate(_output("q", "it is not"))["contradiction_flag"]
+        assert not validator.fallback.loaded
+        validator.close()
@@ -0,0 +1,62 @@
+import math
+import random
+
+import numpy as np
+import pandas as pd
+
+from eval.metrics import compute_all_metrics
+from eval.online_metrics import OnlineMetrics, TDigest, latest_snapshots, merge_snapshots
+
+def _rows(n: int, seed: int):
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        error = rng.random() < 0.05
+        rows.append({
+            "routing_decision": "Error" if error else rng.choice(["direct_response", "fallback_validation"]),
+            "contradiction_flag": not error and rng.random() < 0.2,
+            "entropy": None if error else rng.random() * 2,
+            "latency": rng.lognormvariate(0, 0.8)
+        })
+    return rows
+
+def test_matches_dataframe_metrics_and_tracks_the_latency_tail():
+    rows = _rows(20_000, seed=1)
+    online_metrics = OnlineMetrics()
+    online_metrics.update_many(rows)
+    metrics = online_metrics.metrics()
+
+    for name, value in compute_all_metrics(pd.DataFrame(rows)).items():
+        assert math.isclose(metrics[name], value, rel_tol=1e-9)
+    latencies = np.array([row["latency"] for row in rows])
+    for q in (50, 95, 99):
+        assert abs(metrics[f"latency_p{q}"] - np.percentile(latencies, q)) / np.percentile(latencies, q) < 0.02
+    assert len(online_metrics.latency_digest.centroids) < 200
+
+def test_worker_snapshots_merge_like_one_stream(tmp_path):
+    path = str(tmp_path / "online_metrics.jsonl")
+    whole = OnlineMetrics()
+    for seed in range(3):
+        rows = _rows(5_000, seed)
+        whole.update_many(rows)
+        worker = OnlineMetrics()
+        worker.update_many(rows[:100])
+        worker.flush(path, model="m", seed=seed)
+        worker.update_many(rows[100:])
+        assert not worker.maybe_flush(path, interval_seconds=60, model="m", seed=seed)
+        worker.flush(path, model="m", seed=seed)
+
+    snapshots = latest_snapshots(path, label_keys=("model", "seed"))
+    assert len(snapshots) == 3 and all(snapshot["state"]["rows"] == 5_000 for snapshot in snapshots.values())
+    merged, expected = merge_snapshots(snapshots.values()).metrics(), whole.metrics()
+    for name in ("fallback_rate", "contradiction_rate", "avg_entropy", "avg_latency", "entropy_std"):
+        assert math.isclose(merged[name], expected[name], rel_tol=1e-9)
+    for name in ("latency_p50", "latency_p95", "latency_p99"):
+        assert math.isclose(merged[name], expected[name], rel_tol=0.02)
+
+def test_empty_and_single_value_digests():
+    assert math.isnan(TDigest().quantile(0.5))
+    digest = TDigest()
+    digest.add(3.0)
+    assert digest.quantile(0.01) == digest.quantile(0.99) == 3.0
+    assert OnlineMetrics().snapshot()["metrics"]["latency_p99"] is None
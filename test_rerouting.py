@@ -0,0 +1,37 @@
+import math
+
+from src.rerouting import reroute
+from src.results_store import ResultsStore
+
+class FakeNLIValidator:
+    def __init__(self):
+        self.calls = []
+
+    def validate_batch(self, outputs):
+        self.calls.append(len(outputs))
+        return [{"contradiction_flag": True, "nli_scores": {"contradiction": 0.8, "entailment": 0.1, "neutral": 0.1}} for _ in outputs]
+
+def _store(tmp_path):
+    store = ResultsStore(str(tmp_path), "TruthfulQA", "m", "HighEntropyStrategy_t1.0", 42, row_group_size=10)
+    for i, entropy in enumerate([0.1, 0.4, 0.7, 1.2]):
+        routed = entropy > 1.0
+        store.append({
+            "prompt_index": i, "Question": f"q{i}", "Model": "m", "ModelAnswer": f"a{i}", "entropy": entropy,
+            "routing_decision": "fallback_validation" if routed else "direct_response", "contradiction_flag": routed,
+            "nli_scores": {"contradiction": 0.9, "entailment": 0.05, "neutral": 0.05} if routed else {},
+            "factual_flag": False, "factual_score": None, "latency": 1.0,
+            "token_logprobs": [math.log(0.5)] * 3, "top_logprobs": [[math.log(0.5), math.log(0.5)]] * 3
+        })
+    store.close()
+    return store
+
+def test_reroute_many_thresholds_with_one_nli_pass(tmp_path):
+    validator = FakeNLIValidator()
+    configs = [{"HighEntropyStrategy": {"threshold": t}} for t in (0.05, 0.3, 0.5, 2.0)] + [{"DirectResponseStrategy": {}}]
+    summary, decisions = reroute(_store(tmp_path).read_table(), configs, validator)
+
+    # Rows 0-2 are newly routed by some threshold; row 3 reuses its stored NLI scores.
+    assert validator.calls == [3]
+    assert summary["n_fallback"].tolist() == [4, 3, 2, 0, 0]
+    assert summary["contradiction_rate"].tolist() == [1.0, 0.75, 0.5, 0.0, 0.0]
+    assert decisions["HighEntropyStrategy_t0.5"].tolist() == ["direct_response", "direct_response", "fallback_validation", "fallback_validation"]
@@ -0,0 +1,48 @@
+import pytest
+
+from src.langdb_client import LangDBClient
+from src.response_cache import ResponseCache, CacheMissError
+
+def test_key_covers_full_request():
+    messages = [{"role": "user", "content": "Where did fortune cookies originate?"}]
+    base = ResponseCache.make_key(model="gpt-4.1-nano", messages=messages, seed=42, temperature=0.8, max_tokens=256, logprobs=True, top_logprobs=5)
+
+    assert base == ResponseCache.make_key(model="gpt-4.1-nano", messages=messages, seed=42, temperature=0.8, max_tokens=256, logprobs=True, top_logprobs=5, prompt_cache_key="ignored")
+    assert base != ResponseCache.make_key(model="gpt-4.1-nano", messages=messages, seed=43, temperature=0.8, max_tokens=256, logprobs=True, top_logprobs=5)
+    assert base != ResponseCache.make_key(model="gpt-4.1-nano", messages=messages, seed=42, temperature=0.8, max_tokens=256, logprobs=True, top_logprobs=3)
+
+def test_key_separates_endpoints():
+    messages = [{"role": "user", "content": "hi"}]
+    real = ResponseCache.make_key(model="m", messages=messages, seed=1, endpoint="https://api.us-east-1.langdb.ai")
+    assert real == ResponseCache.make_key(model="m", messages=messages, seed=1, endpoint="https://api.us-east-1.langdb.ai/")
+    assert real != ResponseCache.make_key(model="m", messages=messages, seed=1, endpoint="http://127.0.0.1:8765/v1")
+
+def test_lru_eviction_keeps_recently_used_entries(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=250)
+    payload = {"text": "x" * 80}
+    cache.put("a", payload)
+    cache.put("b", payload)
+    assert cache.get("a") == payload # "a" is now more recent than "b"
+    cache.put("c", payload)
+
+    assert cache.contains("a")
+    assert not cache.contains("b")
+    assert cache.contains("c")
+
+def test_replay_mode_serves_hits_and_fails_on_miss(tmp_path):
+    path = str(tmp_path / "responses.sqlite")
+    messages = [{"role": "user", "content": "hi"}]
+    client = LangDBClient(api_key="unused", project_id="unused", cache=ResponseCache(path, mode="replay"))
+    ResponseCache(path).put(ResponseCache.make_key(model="m", messages=messages, seed=1, endpoint=client.base_url), {"choices": [{"message": {"content": "cached"}}]})
+
+    assert client.create_chat_completion(model="m", messages=messages, seed=1).text == "cached"
+    with pytest.raises(CacheMissError):
+        client.create_chat_completion(model="m", messages=messages, seed=2)
+
+def test_byte_total_tracks_replacements_and_evictions(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.sqlite"), max_bytes=250)
+    payload = {"text": "x" * 80}
+    for key in ("a", "a", "b", "c", "d"):
+        cache.put(key, payload)
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["bytes"] == 2 * len('{"text":"' + "x" * 80 + '"}')
@@ -0,0 +1,65 @@
+import pytest
+
+from src.results_store import ResultsStore, logprob_columns, strategy_label
+
+def _row(i):
+    raw = {"choices": [{"logprobs": {"content": [{"logprob": -0.1, "top_logprobs": [{"logprob": -0.1}, {"logprob": -2.3}]}]}}]}
+    return {"prompt_index": i, "prompt_id": f"id{i}", "Question": f"q{i}", "Model": "m", "ModelAnswer": f"a{i}", "entropy": 0.1 * i,
+            "routing_decision": "direct_response", "contradiction_flag": False, "nli_scores": {"contradiction": 0.2},
+            "factual_flag": True, "factual_score": 1.0, "latency": 0.5, **logprob_columns(raw)}
+
+def test_append_resume_and_read(tmp_path):
+    label = strategy_label({"HighEntropyStrategy": {"threshold": 0.5}})
+    assert label == "HighEntropyStrategy_t0.5"
+
+    store = ResultsStore(str(tmp_path), "TruthfulQA", "m", label, 42, row_group_size=2)
+    for i in (2, 0, 1):
+        store.append(_row(i))
+    # One full row group is on disk; the third row is still buffered.
+    assert ResultsStore(str(tmp_path), "TruthfulQA", "m", label, 42).completed_ids() == {"id0", "id2"}
+    store.close()
+    assert store.completed_ids() == {"id0", "id1", "id2"}
+
+    table = store.read_table()
+    assert table.column("prompt_index").to_pylist() == [0, 1, 2]
+    assert table.column("nli_contradiction").to_pylist() == [0.2, 0.2, 0.2]
+    assert table.column("top_logprobs").to_pylist()[0][0] == pytest.approx([-0.1, -2.3])
+
+    store.clear()
+    assert store.completed_ids() == set()
+
+def test_parts_without_newer_columns_read_as_nulls(tmp_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    store = ResultsStore(str(tmp_path), "TruthfulQA", "m", "s", 42)
+    pq.write_table(pa.table({"prompt_index": [0], "Question": ["q0"], "ModelAnswer": ["a0"]}), f"{store.partition_dir}/part-00000.parquet")
+    store.append({**_row(1), "answered_by": "big"})
+    store.close()
+
+    assert store.read_table(columns=["prompt_index", "answered_by"]).to_pylist() == [{"prompt_index": 0, "answered_by": None}, {"prompt_index": 1, "answered_by": "big"}]
+
+def test_error_rows_are_retried_and_superseded(tmp_path):
+    store = ResultsStore(str(tmp_path), "TruthfulQA", "m", "s", 42)
+    store.append(_row(0))
+    store.append({**_row(1), "ModelAnswer": "Error", "routing_decision": "Error"})
+    store.close()
+    assert store.completed_ids() == {"id0"}
+
+    store.append(_row(1))
+    store.close()
+    assert store.completed_ids() == {"id0", "id1"}
+    assert store.read_table(columns=["ModelAnswer"]).column("ModelAnswer").to_pylist() == ["a0", "a1"]
+
+def test_resume_follows_prompt_ids_when_the_source_is_reordered(tmp_path):
+    store = ResultsStore(str(tmp_path), "TruthfulQA", "m", "s", 42)
+    store.append({**_row(0), "prompt_id": "b", "ModelAnswer": "Error", "routing_decision": "Error"})
+    store.append({**_row(1), "prompt_id": "a"})
+    store.close()
+    # "b" moved to row 1 of the source and is retried there
+    store.append({**_row(1), "prompt_id": "b"})
+    store.close()
+
+    assert store.completed_ids() == {"a", "b"}
+    assert sorted(store.read_table(columns=["prompt_id", "routing_decision"]).to_pylist(), key=lambda row: row["prompt_id"]) == \
+        [{"prompt_id": "a", "routing_decision": "direct_response"}, {"prompt_id": "b", "routing_decision": "direct_response"}]
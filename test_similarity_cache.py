@@ -0,0 +1,54 @@
+import math
+
+from src.neural_generator import NeuralGenerator
+from src.similarity_cache import SimilarityCache
+
+class CountingClient:
+    def __init__(self, logprob: float = math.log(0.5)):
+        self.calls = 0
+        self.logprob = logprob
+        self.cache = None
+
+    def create_chat_completion(self, model: str, messages: list, **kwargs):
+        self.calls += 1
+        content = [{"token": "a", "logprob": self.logprob, "top_logprobs": []}]
+        return {"model": model, "choices": [{"message": {"content": f"answer {self.calls}"}, "logprobs": {"content": content}}]}
+
+def _generate(generator, prompt, model="m"):
+    return generator.generate(model=model, messages=[{"role": "user", "content": prompt}], temperature=0.8, max_tokens=64, seed=1)
+
+def test_near_duplicates_reuse_the_stored_completion():
+    client = CountingClient()
+    cache = SimilarityCache(threshold=0.7)
+    generator = NeuralGenerator(langdb_client=client, similarity_cache=cache)
+    original = _generate(generator, "What happens if you eat watermelon seeds, and why do people worry about it?")
+
+    for variant in ["what happens if you eat watermelon seeds and why do people worry about it",
+                    "  What happens if you EAT watermelon seeds,   and why do people worry about it?!"]:
+        reused = _generate(generator, variant)
+        assert reused["text"] == original["text"] and reused["entropy"] == original["entropy"]
+        assert reused["messages"][0]["content"] == variant
+        assert reused["similarity_cache"]["similarity"] >= 0.7
+    reordered = _generate(generator, "Why do people worry about it, and what happens if you eat watermelon seeds?")
+    assert reordered["text"] == original["text"]
+    assert client.calls == 1
+
+    _generate(generator, "Where did fortune cookies originate?")
+    _generate(generator, "What happens if you eat watermelon seeds, and why do people worry about it?", model="other")
+    assert client.calls == 3
+    stats = cache.summary()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (3, 3, 3)
+    assert [record["event"] for record in cache.audit_log] == ["hit"] * 3
+
+def test_audited_hits_are_generated_live_and_counted():
+    client = CountingClient()
+    cache = SimilarityCache(threshold=0.7, audit_rate=1.0, entropy_tolerance=0.01)
+    generator = NeuralGenerator(langdb_client=client, similarity_cache=cache)
+    _generate(generator, "Is it true that the Great Wall of China is visible from space?")
+    client.logprob = math.log(0.05) # the live answer now has a different entropy
+
+    assert not generator.is_cached(model="m", messages=[{"role": "user", "content": "is it true that the great wall of china is visible from space"}], temperature=0.8, max_tokens=64, seed=1)
+    live = _generate(generator, "is it true that the great wall of china is visible from space")
+
+    assert client.calls == 2 and live["text"] == "answer 2"
+    assert cache.summary()["audited"] == 1 and cache.summary()["false_reuse_rate"] == 1.0
@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import pytest
+
+from src.async_engine import AsyncGenerationEngine
+from src.neural_generator import NeuralGenerator
+from src.rate_limiter import ModelRateLimiters
+from src.staged_pipeline import StagedPipeline
+from test_async_engine import FakeAsyncClient
+
+STAGE_SECONDS = 0.02
+
+def _validate(items):
+    time.sleep(STAGE_SECONDS * len(items))
+    for item in items:
+        item["validated"] = True
+
+def test_stages_overlap_and_every_item_is_written():
+    written = []
+
+    def _write(item):
+        time.sleep(STAGE_SECONDS)
+        written.append(item)
+
+    pipeline = StagedPipeline(route=lambda item: item["index"] % 2 == 0, validate_batch=_validate, write=_write, batch_size=4)
+    for index in range(20):
+        time.sleep(STAGE_SECONDS) # generation
+        pipeline.submit({"index": index})
+    pipeline.close()
+
+    assert sorted(item["index"] for item in written) == list(range(20))
+    assert all(bool(item.get("validated")) == (item["index"] % 2 == 0) for item in written)
+    # 10 validations and 20 writes ran in the stage threads; the producer's thread only routed.
+    stats = pipeline.stats()
+    busy = stats["busy_seconds"]
+    assert busy["validate"] >= 10 * STAGE_SECONDS and busy["write"] >= 20 * STAGE_SECONDS
+    assert busy["route"] < STAGE_SECONDS
+    assert stats["queues"]["validate"]["items"] == 10 and stats["queues"]["write"]["items"] == 20
+
+def test_a_slow_writer_blocks_the_producer():
+    pipeline = StagedPipeline(route=lambda item: False, validate_batch=_validate, write=lambda item: time.sleep(0.01), queue_size=2)
+    for index in range(10):
+        pipeline.submit({"index": index})
+    pipeline.close()
+
+    queue_stats = pipeline.stats()["queues"]["write"]
+    assert queue_stats["max_depth"] <= 2 and queue_stats["blocked_seconds"] > 0
+
+def test_a_failing_stage_stops_the_pipeline():
+    def _fail(items):
+        raise ValueError("nli failed")
+
+    pipeline = StagedPipeline(route=lambda item: True, validate_batch=_fail, write=lambda item: None, queue_size=1, max_wait_seconds=0)
+    with pytest.raises(ValueError, match="nli failed"):
+        for index in range(100):
+            pipeline.submit({"index": index})
+            time.sleep(0.01)
+    pipeline.close(abort=True)
+
+class CountingClient(FakeAsyncClient):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    async def create_chat_completion(self, model: str, messages: list, **kwargs):
+        self.calls += 1
+        return await super().create_chat_completion(model, messages, **kwargs)
+
+def test_generate_each_stops_sending_while_results_are_not_taken():
+    client = CountingClient()
+    engine = AsyncGenerationEngine(generator=NeuralGenerator(langdb_client=client),
+                                   rate_limiters=ModelRateLimiters(requests_per_second=1000, tokens_per_minute=None), max_in_flight=4)
+    requests = [{"model": "m", "messages": [{"role": "user", "content": str(i)}], "temperature": 0.8, "max_tokens": 16} for i in range(12)]
+    handed_off = []
+
+    async def _slow_consumer(result):
+        assert client.calls - len(handed_off) <= 3
+        await asyncio.sleep(0.02)
+        handed_off.append(result.index)
+
+    asyncio.run(engine.generate_each(requests, _slow_consumer, window=3))
+    assert sorted(handed_off) == list(range(12))
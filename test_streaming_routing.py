@@ -0,0 +1,49 @@
+import math
+
+from src.neural_generator import NeuralGenerator
+from src.scheduler import Scheduler
+from src.strategies.direct_response_strategy import DirectResponseStrategy
+from src.strategies.high_entropy_strategy import HighEntropyStrategy
+
+class FakeStreamingClient:
+    def __init__(self, logprob: float, n_tokens: int):
+        self.logprob = logprob
+        self.n_tokens = n_tokens
+        self.chunks_sent = 0
+
+    def stream_chat_completion(self, model: str, messages: list, **kwargs):
+        for i in range(self.n_tokens):
+            self.chunks_sent += 1
+            yield {"choices": [{"delta": {"content": f"t{i} "}, "logprobs": {"content": [{"token": f"t{i}", "logprob": self.logprob}]}}]}
+        yield {"choices": [], "usage": {"total_tokens": self.n_tokens}}
+
+def _scheduler():
+    return Scheduler(strategies=[HighEntropyStrategy(threshold=0.2, early_margin=0.05, early_min_tokens=10), DirectResponseStrategy()])
+
+def test_high_entropy_stream_is_abandoned_early():
+    client = FakeStreamingClient(logprob=math.log(0.4), n_tokens=200) # -p*log(p) ~= 0.37 per token
+    output = NeuralGenerator(langdb_client=client).generate_stream(model="m", messages=[{"role": "user", "content": "q"}], temperature=0.8, max_tokens=256, scheduler=_scheduler(),
+                                                                   abandon_on_early_routing=True)
+
+    assert output["stream_abandoned"]
+    assert output["early_routing"]["routing_decision"] == "fallback_validation"
+    assert output["routing_tokens"] == 10
+    assert client.chunks_sent == 10
+
+def test_early_routing_keeps_the_full_answer_by_default():
+    client = FakeStreamingClient(logprob=math.log(0.4), n_tokens=200)
+    output = NeuralGenerator(langdb_client=client).generate_stream(model="m", messages=[{"role": "user", "content": "q"}], temperature=0.8, max_tokens=256, scheduler=_scheduler())
+
+    assert not output["stream_abandoned"]
+    assert output["early_routing"]["routing_decision"] == "fallback_validation" and output["routing_tokens"] == 10
+    assert output["time_to_routing"] is not None
+    assert output["text"].count("t") == 200
+
+def test_low_entropy_stream_runs_to_completion():
+    client = FakeStreamingClient(logprob=math.log(0.99), n_tokens=50)
+    output = NeuralGenerator(langdb_client=client).generate_stream(model="m", messages=[{"role": "user", "content": "q"}], temperature=0.8, max_tokens=256, scheduler=_scheduler())
+
+    assert not output["stream_abandoned"]
+    assert output["early_routing"] is None
+    assert output["text"].count("t") == 50
+    assert output["completion"].usage == {"total_tokens": 50}